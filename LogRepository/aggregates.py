@@ -0,0 +1,180 @@
+"""
+モジュール: storage/aggregates.py
+保存のたびに差分で更新する、トラック別・アーティスト別の集計。
+track_ranking / artist_distribution ビューと同じ形式の結果を、ログ全体を読まずに返す。
+"""
+
+import heapq
+import json
+import os
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, List
+from .play_record import PlayRecord
+
+
+def percentage(count: int, total: int) -> float:
+    """SQLの ROUND(count * 100.0 / total, 2) と同じ丸め（0から遠い方へ）で割合を返す"""
+    return float((Decimal(count) * 100 / Decimal(total)).quantize(Decimal("0.01"), ROUND_HALF_UP))
+
+
+def _iso(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).isoformat()
+
+
+class RunningAggregates:
+    """トラック別・アーティスト別の再生数、合計再生時間、最終再生日時"""
+
+    def __init__(self):
+        # (track_name, artist_name, album_name, external_urls) ->
+        #     [play_count, popularity_sum, popularity_count, total_duration_ms, last_played_ms]
+        self.tracks: Dict[tuple, List[int]] = {}
+        # (artist_name, artist_id) -> [play_count, total_duration_ms, last_played_ms]
+        self.artists: Dict[tuple, List[int]] = {}
+        # (artist_name, artist_id) -> 再生されたtrack_idの集合
+        self.artist_tracks: Dict[tuple, set] = {}
+        self.total_plays = 0
+        self.total_duration_ms = 0
+        # 集計済みのログのバイト数（CSVで差分の読み込み位置に使う）
+        self.size = 0
+
+    def add_rows(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        CSV形式の行を集計に加える
+
+        Args:
+            rows: FIELDNAMES（csv_storage）をキーに持つ行
+        """
+        self.add_records(PlayRecord.from_row(row) for row in rows)
+
+    def add_records(self, records: Iterable[PlayRecord]) -> None:
+        """
+        再生レコードを集計に加える
+
+        Args:
+            records: 再生レコード
+        """
+        for record in records:
+            played = record.played_at_ms
+            duration = record.duration_ms
+
+            track = self.tracks.setdefault(
+                (record.track_name, record.artist_name, record.album_name, record.external_urls), [0, 0, 0, 0, played]
+            )
+            track[0] += 1
+            if record.popularity is not None:
+                track[1] += record.popularity
+                track[2] += 1
+            track[3] += duration
+            track[4] = max(track[4], played)
+
+            key = (record.artist_name, record.artist_id)
+            artist = self.artists.setdefault(key, [0, 0, played])
+            artist[0] += 1
+            artist[1] += duration
+            artist[2] = max(artist[2], played)
+            self.artist_tracks.setdefault(key, set()).add(record.track_id)
+
+            self.total_plays += 1
+            self.total_duration_ms += duration
+
+    def track_ranking(self, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        再生数の多いトラックを track_ranking ビューと同じ形式で返す
+
+        Args:
+            limit: 返す最大件数（省略時はすべて）
+
+        Returns:
+            トラックごとの集計のリスト
+        """
+        items = self.tracks.items()
+        top = heapq.nlargest(limit, items, key=lambda item: item[1][0]) if limit else sorted(
+            items, key=lambda item: item[1][0], reverse=True
+        )
+        return [
+            {
+                "track_name": key[0],
+                "artist_name": key[1],
+                "album_name": key[2],
+                "play_count": plays,
+                "avg_popularity": popularity_sum / popularity_count if popularity_count else None,
+                "total_duration_ms": duration,
+                "last_played": _iso(last),
+                "external_urls": key[3],
+            }
+            for key, (plays, popularity_sum, popularity_count, duration, last) in top
+        ]
+
+    def artist_distribution(self, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        再生数の多いアーティストを artist_distribution ビューの列と last_played で返す
+
+        Args:
+            limit: 返す最大件数（省略時はすべて）
+
+        Returns:
+            アーティストごとの集計のリスト
+        """
+        items = self.artists.items()
+        top = heapq.nlargest(limit, items, key=lambda item: item[1][0]) if limit else sorted(
+            items, key=lambda item: item[1][0], reverse=True
+        )
+        return [
+            {
+                "artist_name": key[0],
+                "artist_id": key[1],
+                "play_count": plays,
+                "percentage": percentage(plays, self.total_plays),
+                "unique_tracks": len(self.artist_tracks[key]),
+                "total_duration_ms": duration,
+                "last_played": _iso(last),
+            }
+            for key, (plays, duration, last) in top
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSONに保存できる形に変換する"""
+        return {
+            "version": 1,
+            "size": self.size,
+            "total_plays": self.total_plays,
+            "total_duration_ms": self.total_duration_ms,
+            "tracks": [list(key) + values for key, values in self.tracks.items()],
+            "artists": [
+                list(key) + values + [sorted(self.artist_tracks[key])] for key, values in self.artists.items()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RunningAggregates":
+        """to_dict() の出力から復元する"""
+        aggregates = cls()
+        aggregates.size = data["size"]
+        aggregates.total_plays = data["total_plays"]
+        aggregates.total_duration_ms = data["total_duration_ms"]
+        for entry in data["tracks"]:
+            aggregates.tracks[tuple(entry[:4])] = entry[4:]
+        for entry in data["artists"]:
+            key = tuple(entry[:2])
+            aggregates.artists[key] = entry[2:5]
+            aggregates.artist_tracks[key] = set(entry[5])
+        return aggregates
+
+    @classmethod
+    def load(cls, path: str) -> "RunningAggregates | None":
+        """集計ファイルを読み込む（存在しないか壊れている場合はNone）"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, path: str) -> None:
+        """集計ファイルを一時ファイル経由で原子的に置き換える"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
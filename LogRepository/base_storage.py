@@ -4,20 +4,25 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
-from datetime import datetime
+from typing import Iterator, List, Dict, Any
+from datetime import datetime, timezone
+from .play_record import PlayRecord, parse_played_at
 
 
 class BaseStorage(ABC):
     """データストレージ実装の抽象ベースクラス"""
 
+    # 保存済みの (track_id, played_at) をもう一度保存しても行が増えない（一意制約・upsertを持つ）場合はTrue
+    idempotent_writes = False
+
     @abstractmethod
-    def save_tracks(self, tracks: List[Dict[str, Any]]) -> None:
+    def save_tracks(self, tracks: List[PlayRecord | Dict[str, Any]]) -> None:
         """
         ストレージシステムにトラックを保存する
 
         Args:
-            tracks: 保存するトラックデータのリスト
+            tracks: 保存する再生レコード。recently-playedのアイテムを渡した場合は
+                play_record.as_records で変換してから保存する
         """
         pass
 
@@ -31,6 +36,20 @@ class BaseStorage(ABC):
         """
         pass
 
+    def get_first_saved_timestamp(self) -> datetime | None:
+        """
+        最も古いトラックのタイムスタンプを取得する
+
+        デフォルトでは query() で全行を読んで求める。played_at の範囲を保持しているバックエンドは上書きする。
+
+        Returns:
+            最も古いトラックの日時、またはトラックが保存されていない場合はNone
+        """
+        first_ms = min((parse_played_at(row["played_at"])[1] for row in self.query()), default=None)
+        if first_ms is None:
+            return None
+        return datetime.fromtimestamp(first_ms / 1000, tz=timezone.utc)
+
     @abstractmethod
     def is_available(self) -> bool:
         """
@@ -41,3 +60,67 @@ class BaseStorage(ABC):
         """
         pass
 
+    def query(self, start: datetime | None = None, end: datetime | None = None) -> Iterator[Dict[str, Any]]:
+        """
+        played_at が [start, end) の範囲の保存済みの行を古い順に返す
+
+        すべてのバックエンドは played_at の昇順で返す。デフォルトでは読み出しに対応していない。
+
+        Args:
+            start: 範囲の開始（含む、省略時は最初から）
+            end: 範囲の終了（含まない、省略時は最後まで）
+
+        Yields:
+            FIELDNAMES（csv_storage）をキーに持つ行
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not support reading tracks")
+
+    def track_ranking(self, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        保存のたびに更新される集計から、再生数の多いトラックを返す
+
+        Args:
+            limit: 返す最大件数（省略時はすべて）
+
+        Returns:
+            track_ranking ビューと同じ形式の行のリスト
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not maintain aggregates")
+
+    def artist_distribution(self, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        保存のたびに更新される集計から、再生数の多いアーティストを返す
+
+        Args:
+            limit: 返す最大件数（省略時はすべて）
+
+        Returns:
+            artist_distribution ビューの列と last_played を持つ行のリスト
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not maintain aggregates")
+
+    def rebuild_aggregates(self) -> None:
+        """
+        保存済みのログ全体から集計を作り直す（集計が壊れた・欠けた場合の復旧用）
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not maintain aggregates")
+
+    def deduplicate(self, batch_size: int = 100_000) -> Dict[str, Any]:
+        """
+        (track_id, played_at) が同じ行を1行にまとめる（再実行や取得範囲の重なりで保存された重複の除去用）
+
+        Args:
+            batch_size: 一度に処理する行数（ファイルは並べ替える行数、データベースは削除する行数）
+
+        Returns:
+            少なくとも duplicates（除いた行数）を含む統計情報
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not support deduplication")
+
+    def close(self) -> None:
+        """
+        保留中の書き込みをフラッシュし、リソースを解放する
+
+        デーモンモードの終了時に呼ばれる。デフォルトでは何もしない。
+        """
+        pass
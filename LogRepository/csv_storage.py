@@ -3,78 +3,123 @@
 Spotifyトラックデータ用のCSVファイルストレージ実装。
 """
 
+import bisect
 import csv
+import heapq
+import io
 import os
 import json
 from datetime import datetime, timezone
-from typing import List, Dict, Any
+from typing import Iterator, List, Dict, Any, Tuple
 from .base_storage import BaseStorage
+from .play_record import PlayRecord, as_records
+from .aggregates import RunningAggregates
+from .external_sort import sort_unique
+
+
+FIELDNAMES = [
+    "track_name", "artist_name", "played_at", "saved_at", "track_id", "artist_id",
+    "album_name", "album_id", "duration_ms", "popularity", "external_urls",
+]
+
+
+def played_at_to_ms(played_at: str) -> int:
+    """ISO形式の played_at をミリ秒Unixタイムスタンプに変換する"""
+    return int(datetime.fromisoformat(played_at.replace("Z", "+00:00")).timestamp() * 1000)
 
 
 class CSVStorage(BaseStorage):
     """Spotifyトラックデータ用のCSVファイルストレージ"""
 
-    def __init__(self, file_path: str = "spotify_logs.csv"):
+    def __init__(self, file_path: str = "spotify_logs.csv", tail_bytes: int = 256 * 1024, index_stride: int = 1024):
         """
         CSVストレージを初期化する
 
         Args:
             file_path: ログを保存するCSVファイルのパス
+            tail_bytes: メタデータがない場合に末尾から読み戻す最大バイト数
+            index_stride: 疎インデックスの1ブロックあたりの最大行数
         """
         self.file_path = file_path
-        self.timestamp_file = f"{file_path}.timestamp"
+        self.meta_file = f"{file_path}.meta"
+        self.aggregates_file = f"{file_path}.aggregates.json"
+        self.index_file = f"{file_path}.idx"
+        self.tail_bytes = tail_bytes
+        self.index_stride = index_stride
+        # 読み込んだ疎インデックス（インデックスファイルのサイズが変わったら読み直す）
+        self._index: Dict[str, Any] | None = None
+        # 読み込んだ集計と、そのときの集計ファイルの (mtime_ns, size)（ファイルが変わったら読み直す）
+        self._aggregates: Tuple[Tuple[int, int], RunningAggregates] | None = None
 
-    def save_tracks(self, tracks: List[Dict[str, Any]]) -> None:
+    def save_tracks(self, tracks: List[PlayRecord | Dict[str, Any]]) -> None:
         """
         CSVファイルにトラックを保存する
 
+        追記後にfsyncし、行数・played_atの範囲・最終行のバイトオフセットを持つ
+        メタデータファイルを原子的に置き換え、トラック別・アーティスト別の集計も差分で更新する。
+        追記した行は index_stride 行ごとのブロックとして疎インデックスにも追加する。
+
         Args:
-            tracks: 保存するトラックデータのリスト
+            tracks: 保存する再生レコード（APIのアイテムも可）
         """
         if not tracks:
             return
 
         # CSV用のデータを準備
-        csv_data = []
-        for item in tracks:
-            track = item["track"]
-            played_at = datetime.fromisoformat(item["played_at"].replace("Z", "+00:00"))
-            saved_at = datetime.now(timezone.utc)
-
-            csv_data.append({
-                "track_name": track["name"],
-                "artist_name": track["artists"][0]["name"],
-                "played_at": played_at.isoformat(),
-                "saved_at": saved_at.isoformat(),
-                "track_id": track["id"],
-                "artist_id": track["artists"][0]["id"],
-                "album_name": track["album"]["name"],
-                "album_id": track["album"]["id"],
-                "duration_ms": track["duration_ms"],
-                "popularity": track.get("popularity", ""),
-                "external_urls": json.dumps(track["external_urls"])
-            })
+        records = as_records(tracks)
+        saved_at = datetime.now(timezone.utc).isoformat()
+        csv_data = [record.to_row(saved_at) for record in records]
+        played_ms = [record.played_at_ms for record in records]
 
-        # CSVファイルに書き込み
-        file_exists = os.path.exists(self.file_path)
-        with open(self.file_path, mode='a', newline='', encoding='utf-8') as file:
-            fieldnames = csv_data[0].keys()
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
+        meta = self._load_meta()
+        file_exists = os.path.exists(self.file_path) and os.path.getsize(self.file_path) > 0
 
+        # 追記するバイト列を index_stride 行ごとのブロックに分けて組み立てる
+        header = b""
+        if not file_exists:
             # ファイルが存在しない場合のみヘッダーを書き込み
-            if not file_exists:
-                writer.writeheader()
+            buffer = io.StringIO(newline="")
+            csv.DictWriter(buffer, fieldnames=FIELDNAMES).writeheader()
+            header = buffer.getvalue().encode("utf-8")
+        blocks = []
+        for i in range(0, len(csv_data), self.index_stride):
+            buffer = io.StringIO(newline="")
+            csv.DictWriter(buffer, fieldnames=FIELDNAMES).writerows(csv_data[i:i + self.index_stride])
+            block_ms = played_ms[i:i + self.index_stride]
+            blocks.append((buffer.getvalue().encode("utf-8"), min(block_ms), max(block_ms)))
+        payload = header + b"".join(block for block, _, _ in blocks)
+
+        # 最終行の開始位置
+        buffer = io.StringIO(newline="")
+        csv.DictWriter(buffer, fieldnames=FIELDNAMES).writerow(csv_data[-1])
+        head = payload[:len(payload) - len(buffer.getvalue().encode("utf-8"))]
 
-            # データを書き込み
-            writer.writerows(csv_data)
+        # CSVファイルに書き込み
+        with open(self.file_path, mode="ab") as file:
+            start = file.tell()
+            file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+
+        batch_min, batch_max = min(played_ms), max(played_ms)
+        if meta["rows"]:
+            batch_min = min(batch_min, meta["min_played_at_ms"])
+            batch_max = max(batch_max, meta["max_played_at_ms"])
+        self._write_meta({
+            "rows": meta["rows"] + len(csv_data),
+            "size": start + len(payload),
+            "min_played_at_ms": batch_min,
+            "max_played_at_ms": batch_max,
+            "last_row_offset": start + len(head),
+        })
+        self._update_aggregates(records, start, start + len(payload))
 
-        # 最新のplayed_atタイムスタンプでタイムスタンプファイルを更新（ミリ秒Unixタイムスタンプ）
-        latest_timestamp = max(
-            datetime.fromisoformat(item["played_at"].replace("Z", "+00:00"))
-            for item in tracks
-        )
-        with open(self.timestamp_file, 'w') as f:
-            f.write(str(int(latest_timestamp.timestamp() * 1000)))
+        entries = []
+        offset = start + len(header)
+        for block, block_min, block_max in blocks:
+            entries.append((offset, offset + len(block), block_min, block_max))
+            offset += len(block)
+        self._update_index(entries, start)
 
         print(f"✅ : {len(tracks)} tracks saved to {self.file_path}")
 
@@ -82,20 +127,42 @@ class CSVStorage(BaseStorage):
         """
         最後に保存されたトラックのタイムスタンプを取得する
 
+        メタデータから定数時間で返す。メタデータがない場合はファイル末尾から読み戻して復元する。
+
         Returns:
             最後に保存されたトラックの日時、またはトラックが保存されていない場合はNone
         """
-        if not os.path.exists(self.timestamp_file):
+        if not os.path.exists(self.file_path):
             return None
 
-        try:
-            with open(self.timestamp_file, 'r') as f:
-                timestamp_str = f.read().strip()
-                # ミリ秒Unixタイムスタンプからdatetimeに変換
-                unix_timestamp_ms = int(timestamp_str)
-                return datetime.fromtimestamp(unix_timestamp_ms / 1000, tz=timezone.utc)
-        except (ValueError, IOError):
+        meta = self._read_meta()
+        if meta is not None and meta["size"] <= os.path.getsize(self.file_path):
+            meta = self._load_meta()
+            max_ms = meta["max_played_at_ms"] if meta["rows"] else None
+        else:
+            max_ms = self._tail_max_played_at()
+
+        if max_ms is None:
             return None
+        return datetime.fromtimestamp(max_ms / 1000, tz=timezone.utc)
+
+    def get_first_saved_timestamp(self) -> datetime | None:
+        """
+        最も古いトラックのタイムスタンプをメタデータから取得する（メタデータがない場合は全行を読む）
+
+        Returns:
+            最も古いトラックの日時、またはトラックが保存されていない場合はNone
+        """
+        if not os.path.exists(self.file_path):
+            return None
+
+        meta = self._read_meta()
+        if meta is None or meta["size"] > os.path.getsize(self.file_path):
+            return super().get_first_saved_timestamp()
+        meta = self._load_meta()
+        if not meta["rows"]:
+            return None
+        return datetime.fromtimestamp(meta["min_played_at_ms"] / 1000, tz=timezone.utc)
 
     def is_available(self) -> bool:
         """
@@ -116,7 +183,7 @@ class CSVStorage(BaseStorage):
 
     def get_stats(self) -> Dict[str, Any]:
         """
-        CSVファイルの統計情報を取得する
+        CSVファイルの統計情報をメタデータから取得する
 
         Returns:
             ファイル統計情報の辞書
@@ -125,16 +192,429 @@ class CSVStorage(BaseStorage):
             return {"exists": False, "size": 0, "lines": 0}
 
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as file:
-                lines = sum(1 for _ in file)
-
-            size = os.path.getsize(self.file_path)
+            meta = self._load_meta()
+            rows = meta["rows"]
             return {
                 "exists": True,
-                "size": size,
-                "lines": lines,
+                "size": meta["size"],
+                "lines": rows + 1 if meta["size"] else 0,
+                "rows": rows,
+                "first_played_at": self._iso(meta["min_played_at_ms"]) if rows else None,
+                "last_played_at": self._iso(meta["max_played_at_ms"]) if rows else None,
                 "file_path": self.file_path
             }
         except IOError:
             return {"exists": False, "error": "Cannot read file"}
 
+    def query(self, start: datetime | None = None, end: datetime | None = None) -> Iterator[Dict[str, Any]]:
+        """
+        played_at が [start, end) の範囲の行を古い順に返す
+
+        疎インデックスを二分探索して範囲と重なるブロックだけをシークして読み、played_at の最小値の順に
+        ブロックを読み進めながらヒープでマージする。メモリに載るのは互いに重なるブロックの行だけで、
+        追記が played_at 順ならほぼ1ブロック分になる。played_at が同じ行はファイルの追記順に返す。
+
+        Args:
+            start: 範囲の開始（含む、省略時は最初から）
+            end: 範囲の終了（含まない、省略時は最後まで）
+
+        Yields:
+            FIELDNAMES をキーに持つ行
+        """
+        if not os.path.exists(self.file_path):
+            return
+        start_ms = int(start.timestamp() * 1000) if start else None
+        end_ms = int(end.timestamp() * 1000) if end else None
+
+        blocks = sorted(self._index_blocks(start_ms, end_ms), key=lambda entry: (entry[2], entry[0]))
+        pending: List[Tuple[int, int, Dict[str, Any]]] = []
+        sequence = 0
+        with open(self.file_path, "rb") as file:
+            i = 0
+            while i < len(blocks) or pending:
+                # 最も古い未出力の行より前に始まるブロックをすべて読み込んでから出力する
+                while i < len(blocks) and (not pending or blocks[i][2] <= pending[0][0]):
+                    offset, end_offset = blocks[i][0], blocks[i][1]
+                    i += 1
+                    file.seek(offset)
+                    text = file.read(end_offset - offset).decode("utf-8")
+                    for values in csv.reader(io.StringIO(text, newline="")):
+                        if not values:
+                            continue
+                        row = dict(zip(FIELDNAMES, values))
+                        ms = played_at_to_ms(row["played_at"])
+                        if (start_ms is not None and ms < start_ms) or (end_ms is not None and ms >= end_ms):
+                            continue
+                        heapq.heappush(pending, (ms, sequence, row))
+                        sequence += 1
+                if pending:
+                    yield heapq.heappop(pending)[2]
+
+    def track_ranking(self, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        集計ファイルから再生数の多いトラックを返す
+
+        CSVストレージの集計は1つのJSONファイルのため、読み込みと保存のたびの書き直しは
+        ユニークなトラック・アーティスト数に比例する（ログの行数には比例しない）。読み込んだ集計は
+        ファイルが変わるまで再利用する。上位N件だけを読むのはSQLite・Supabaseの集計テーブル。
+
+        Args:
+            limit: 返す最大件数（省略時はすべて）
+
+        Returns:
+            track_ranking ビューと同じ形式の行のリスト
+        """
+        return self._load_aggregates().track_ranking(limit)
+
+    def artist_distribution(self, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        集計ファイルから再生数の多いアーティストを返す
+
+        Args:
+            limit: 返す最大件数（省略時はすべて）
+
+        Returns:
+            artist_distribution ビューの列と last_played を持つ行のリスト
+        """
+        return self._load_aggregates().artist_distribution(limit)
+
+    def rebuild_aggregates(self) -> None:
+        """CSVファイル全体を読み直して集計ファイルを作り直す"""
+        aggregates = self._catch_up_aggregates(RunningAggregates())
+        self._save_aggregates(aggregates)
+        print(f"✅ : Aggregates rebuilt from {aggregates.total_plays} rows in {self.file_path}")
+
+    def deduplicate(self, batch_size: int = 100_000) -> Dict[str, Any]:
+        """
+        ログを played_at 順に並べ替え、(track_id, played_at) が同じ行を1行にまとめて原子的に書き直す
+
+        batch_size 行ずつ並べた一時ファイルをマージする外部ソートのため、メモリ使用量はファイルの大きさによらない。
+        書き直したファイルに合わせて、メタデータ・疎インデックス・集計も同じ走査で作り直す。
+        保存と同時には実行しないこと。
+
+        Args:
+            batch_size: 一度にメモリ上で並べる最大行数
+
+        Returns:
+            残した行数、除いた重複数、ソートの一時ファイル数、書き直す前後のバイト数
+        """
+        if not os.path.exists(self.file_path):
+            return {"rows": 0, "duplicates": 0, "runs": 0, "size_before": 0, "size_after": 0}
+
+        size_before = os.path.getsize(self.file_path)
+        played_at = FIELDNAMES.index("played_at")
+        track_id = FIELDNAMES.index("track_id")
+
+        def key(values: List[str]) -> tuple:
+            return played_at_to_ms(values[played_at]), values[track_id]
+
+        buffer = io.StringIO(newline="")
+        writer = csv.writer(buffer)
+        writer.writerow(FIELDNAMES)
+        header = buffer.getvalue().encode("utf-8")
+
+        meta = {"rows": 0, "size": 0, "min_played_at_ms": None, "max_played_at_ms": None, "last_row_offset": 0}
+        entries = []
+        aggregates = RunningAggregates()
+        stats: Dict[str, Any] = {}
+        tmp_path = f"{self.file_path}.compact.tmp"
+        with open(self.file_path, "r", encoding="utf-8", newline="") as source, open(tmp_path, "wb") as target:
+            reader = csv.reader(source)
+            next(reader, None)
+            target.write(header)
+            offset = len(header)
+            block = []
+            directory = os.path.dirname(os.path.abspath(self.file_path))
+            for values in sort_unique((v for v in reader if v), key, batch_size, directory, stats):
+                block.append(values)
+                if len(block) >= self.index_stride:
+                    offset = self._write_sorted_block(target, block, offset, key, meta, entries, aggregates)
+                    block = []
+            if block:
+                offset = self._write_sorted_block(target, block, offset, key, meta, entries, aggregates)
+            target.flush()
+            os.fsync(target.fileno())
+        meta["size"] = offset
+
+        # 古いファイルに合わせたメタデータ・インデックス・集計を先に消してから置き換える
+        # （置き換えの前後でクラッシュしても、次の読み込みで走査し直される）
+        for path in (self.meta_file, self.index_file, self.aggregates_file):
+            if os.path.exists(path):
+                os.remove(path)
+        os.replace(tmp_path, self.file_path)
+        self._index = None
+        self._write_meta(meta)
+        self._append_index(entries, truncate=True)
+        aggregates.size = offset
+        self._save_aggregates(aggregates)
+
+        stats.update({"rows": meta["rows"], "size_before": size_before, "size_after": offset})
+        print(f"✅ : {stats['duplicates']} duplicates removed from {self.file_path} ({meta['rows']} rows kept)")
+        return stats
+
+    @staticmethod
+    def _write_sorted_block(file, block: List[List[str]], offset: int, key, meta: Dict[str, Any],
+                            entries: List[tuple], aggregates: RunningAggregates) -> int:
+        """played_at 順の1ブロックを書き、メタデータ・インデックス・集計に反映して次のオフセットを返す"""
+        buffer = io.StringIO(newline="")
+        writer = csv.writer(buffer)
+        writer.writerows(block[:-1])
+        head = len(buffer.getvalue().encode("utf-8"))
+        writer.writerow(block[-1])
+        payload = buffer.getvalue().encode("utf-8")
+        file.write(payload)
+
+        low, high = key(block[0])[0], key(block[-1])[0]
+        entries.append((offset, offset + len(payload), low, high))
+        if meta["min_played_at_ms"] is None:
+            meta["min_played_at_ms"] = low
+        meta["max_played_at_ms"] = high
+        meta["rows"] += len(block)
+        meta["last_row_offset"] = offset + head
+        aggregates.add_rows(dict(zip(FIELDNAMES, values)) for values in block)
+        return offset + len(payload)
+
+    @staticmethod
+    def _iso(ms: int) -> str:
+        return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).isoformat()
+
+    def _read_meta(self) -> Dict[str, Any] | None:
+        """メタデータファイルを読み込む（存在しないか壊れている場合はNone）"""
+        try:
+            with open(self.meta_file, "r") as f:
+                meta = json.load(f)
+            return meta if {"rows", "size", "last_row_offset"} <= meta.keys() else None
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta: Dict[str, Any]) -> None:
+        """メタデータを一時ファイル経由で原子的に置き換える"""
+        tmp_path = f"{self.meta_file}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.meta_file)
+
+    def _load_meta(self) -> Dict[str, Any]:
+        """
+        CSVファイルと整合したメタデータを返す
+
+        追記後・メタデータ更新前にクラッシュした場合は、記録済みサイズ以降の差分だけを読んで追いつく。
+        メタデータがないかファイルが縮んでいる場合のみ、全体を走査して作り直す。
+        """
+        empty = {"rows": 0, "size": 0, "min_played_at_ms": None, "max_played_at_ms": None, "last_row_offset": 0}
+        if not os.path.exists(self.file_path):
+            return empty
+
+        size = os.path.getsize(self.file_path)
+        meta = self._read_meta()
+        if meta is not None and meta["size"] == size:
+            return meta
+
+        if meta is None or meta["size"] > size:
+            meta = dict(empty)
+        meta = self._scan_from(meta)
+        self._write_meta(meta)
+        return meta
+
+    def _scan_from(self, meta: Dict[str, Any]) -> Dict[str, Any]:
+        """meta["size"] 以降の行を読み、メタデータを更新したコピーを返す"""
+        meta = dict(meta)
+        with open(self.file_path, "rb") as file:
+            file.seek(meta["size"])
+            offset = meta["size"]
+            for line in file:
+                line_offset = offset
+                offset += len(line)
+                if line_offset == 0 or not line.strip():
+                    # 先頭行はヘッダー
+                    continue
+                row = next(csv.reader([line.decode("utf-8")]))
+                ms = played_at_to_ms(row[FIELDNAMES.index("played_at")])
+                meta["rows"] += 1
+                meta["last_row_offset"] = line_offset
+                meta["min_played_at_ms"] = ms if meta["min_played_at_ms"] is None else min(ms, meta["min_played_at_ms"])
+                meta["max_played_at_ms"] = ms if meta["max_played_at_ms"] is None else max(ms, meta["max_played_at_ms"])
+        meta["size"] = offset
+        return meta
+
+    def _read_index(self) -> List[Tuple[int, int, int, int]] | None:
+        """インデックスファイルの (開始オフセット, 終了オフセット, played_at の最小, 最大) を読む（壊れている場合はNone）"""
+        try:
+            with open(self.index_file, "r") as f:
+                entries = [tuple(int(value) for value in line.split(",")) for line in f]
+        except (OSError, ValueError):
+            return None
+        # ブロックはファイル内で隙間なく連続している
+        offset = entries[0][0] if entries else 0
+        for entry in entries:
+            if len(entry) != 4 or entry[0] != offset or entry[1] <= entry[0]:
+                return None
+            offset = entry[1]
+        return entries
+
+    def _append_index(self, entries: List[Tuple[int, int, int, int]], truncate: bool = False) -> None:
+        """インデックスファイルにブロックを追記する（truncate なら作り直す）"""
+        with open(self.index_file, "w" if truncate else "a") as f:
+            f.writelines(f"{offset},{end},{low},{high}\n" for offset, end, low, high in entries)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _update_index(self, entries: List[Tuple[int, int, int, int]], start: int) -> None:
+        """追記したブロックをインデックスに加える（インデックスが追記前のファイルと整合しない場合は作り直す）"""
+        existing = self._read_index()
+        covered = existing[-1][1] if existing else None
+        if existing is not None and (covered == start or (not existing and start == 0)):
+            self._append_index(entries)
+        else:
+            self._rebuild_index()
+
+    def _rebuild_index(self) -> List[Tuple[int, int, int, int]]:
+        """CSVファイル全体を走査して index_stride 行ごとのブロックのインデックスを作り直す"""
+        entries = []
+        column = FIELDNAMES.index("played_at")
+        with open(self.file_path, "rb") as file:
+            offset = 0
+            block_start = None
+            low = high = None
+            rows = 0
+            for line in file:
+                line_offset = offset
+                offset += len(line)
+                if line_offset == 0 or not line.strip():
+                    # 先頭行はヘッダー
+                    continue
+                ms = played_at_to_ms(next(csv.reader([line.decode("utf-8")]))[column])
+                if block_start is None:
+                    block_start, low, high, rows = line_offset, ms, ms, 0
+                low, high, rows = min(low, ms), max(high, ms), rows + 1
+                if rows >= self.index_stride:
+                    entries.append((block_start, offset, low, high))
+                    block_start = None
+            if block_start is not None:
+                entries.append((block_start, offset, low, high))
+        self._append_index(entries, truncate=True)
+        return entries
+
+    def _index_blocks(self, start_ms: int | None, end_ms: int | None) -> List[Tuple[int, int, int, int]]:
+        """
+        [start_ms, end_ms) と重なりうるブロックのインデックスのエントリを返す
+
+        ブロックの最大値の累積最大と、最小値の後方からの累積最小はどちらも単調なので、
+        範囲より前・後のブロックを二分探索で読み飛ばせる（追記が played_at 順ならほぼ結果の分だけ読む）。
+        """
+        size = os.path.getsize(self.file_path)
+        try:
+            index_size = os.path.getsize(self.index_file)
+        except OSError:
+            index_size = None
+        cached = self._index
+        if cached is None or cached["index_size"] != index_size or cached["size"] != size:
+            entries = self._read_index() if index_size is not None else None
+            if entries is None or (entries[-1][1] if entries else 0) != size:
+                entries = self._rebuild_index()
+            prefix_max, suffix_min = [], []
+            for entry in entries:
+                prefix_max.append(max(entry[3], prefix_max[-1]) if prefix_max else entry[3])
+            for entry in reversed(entries):
+                suffix_min.append(min(entry[2], suffix_min[-1]) if suffix_min else entry[2])
+            suffix_min.reverse()
+            cached = self._index = {
+                "entries": entries,
+                "prefix_max": prefix_max,
+                "suffix_min": suffix_min,
+                "size": size,
+                "index_size": os.path.getsize(self.index_file),
+            }
+
+        entries = cached["entries"]
+        first = 0 if start_ms is None else bisect.bisect_left(cached["prefix_max"], start_ms)
+        last = len(entries) if end_ms is None else bisect.bisect_left(cached["suffix_min"], end_ms)
+        return [
+            entry for entry in entries[first:last]
+            if not ((start_ms is not None and entry[3] < start_ms) or (end_ms is not None and entry[2] >= end_ms))
+        ]
+
+    def _update_aggregates(self, records: List[PlayRecord], start: int, end: int) -> None:
+        """追記したレコードを集計ファイルに反映する"""
+        aggregates = self._read_aggregates()
+        # 保存に失敗した場合に、書き換え途中の集計を再利用しない
+        self._aggregates = None
+        if aggregates is not None and aggregates.size == start:
+            aggregates.add_records(records)
+            aggregates.size = end
+        else:
+            # 集計ファイルがないか前回の更新が反映されていない場合は、追いついていない部分から読み直す
+            aggregates = self._catch_up_aggregates(aggregates or RunningAggregates())
+        self._save_aggregates(aggregates)
+
+    def _load_aggregates(self) -> RunningAggregates:
+        """CSVファイルと整合した集計を返す（ずれている場合は差分を読んで保存する）"""
+        aggregates = self._read_aggregates()
+        size = os.path.getsize(self.file_path) if os.path.exists(self.file_path) else 0
+        if aggregates is None or aggregates.size != size:
+            aggregates = self._catch_up_aggregates(aggregates or RunningAggregates())
+            if size:
+                self._save_aggregates(aggregates)
+        return aggregates
+
+    def _aggregates_stat(self) -> Tuple[int, int] | None:
+        try:
+            stat = os.stat(self.aggregates_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_aggregates(self) -> RunningAggregates | None:
+        """集計ファイルを読み込む（前回読み込んだ・保存したときから変わっていなければ再利用する）"""
+        stat = self._aggregates_stat()
+        if stat is None:
+            return None
+        if self._aggregates is not None and self._aggregates[0] == stat:
+            return self._aggregates[1]
+        aggregates = RunningAggregates.load(self.aggregates_file)
+        self._aggregates = (stat, aggregates) if aggregates is not None else None
+        return aggregates
+
+    def _save_aggregates(self, aggregates: RunningAggregates) -> None:
+        """集計ファイルを保存し、保存した集計を次の読み込みで再利用する"""
+        aggregates.save(self.aggregates_file)
+        stat = self._aggregates_stat()
+        self._aggregates = (stat, aggregates) if stat is not None else None
+
+    def _catch_up_aggregates(self, aggregates: RunningAggregates) -> RunningAggregates:
+        """aggregates.size 以降の行を集計に加える（ファイルが縮んでいる場合は最初から）"""
+        if not os.path.exists(self.file_path):
+            return RunningAggregates()
+        if aggregates.size > os.path.getsize(self.file_path):
+            aggregates = RunningAggregates()
+
+        with open(self.file_path, "rb") as file:
+            file.seek(aggregates.size)
+            text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+            reader = csv.DictReader(text, fieldnames=None if aggregates.size == 0 else FIELDNAMES)
+            aggregates.add_rows(reader)
+            aggregates.size = os.fstat(file.fileno()).st_size
+        return aggregates
+
+    def _tail_max_played_at(self) -> int | None:
+        """ファイル末尾の tail_bytes だけを読み、その範囲の played_at の最大値を返す"""
+        size = os.path.getsize(self.file_path)
+        start = max(0, size - self.tail_bytes)
+        with open(self.file_path, "rb") as file:
+            file.seek(start)
+            chunk = file.read()
+
+        # 先頭行は途中から読んだ不完全な行か、ファイル先頭のヘッダー
+        lines = chunk.split(b"\n")[1:]
+
+        column = FIELDNAMES.index("played_at")
+        latest = None
+        for row in csv.reader(line.decode("utf-8") for line in lines if line.strip()):
+            try:
+                ms = played_at_to_ms(row[column])
+            except (IndexError, ValueError):
+                continue
+            latest = ms if latest is None else max(latest, ms)
+        return latest
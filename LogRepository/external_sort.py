@@ -0,0 +1,109 @@
+"""
+モジュール: storage/external_sort.py
+メモリに載らない大きさのログを played_at 順に並べ、(track_id, played_at) の重複を除く外部マージソート。
+"""
+
+import csv
+import heapq
+import os
+import tempfile
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+# 行から (played_at, track_id) を取り出す関数
+SortKey = Callable[[Any], Tuple[Any, str]]
+
+
+def unique_by_key(rows: Iterable[Any], key: SortKey) -> Iterator[Any]:
+    """
+    played_at 順に並んだ行から、(track_id, played_at) が同じ2行目以降を除く
+
+    同じ played_at の行どうしは track_id 順に並んでいなくてもよい。
+
+    Args:
+        rows: played_at 順に並んだ行
+        key: 行から (played_at, track_id) を取り出す関数
+
+    Yields:
+        重複を除いた行
+    """
+    current = None
+    seen = set()
+    for row in rows:
+        played_at, track_id = key(row)
+        if played_at != current:
+            current = played_at
+            seen.clear()
+        elif track_id in seen:
+            continue
+        seen.add(track_id)
+        yield row
+
+
+def _write_run(rows: List[List[str]], directory: str) -> str:
+    """並べ替えた行を一時ファイルに書き、そのパスを返す"""
+    fd, path = tempfile.mkstemp(prefix="run-", suffix=".csv", dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+    return path
+
+
+def _read_run(path: str) -> Iterator[List[str]]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.reader(f)
+
+
+def sort_unique(
+    rows: Iterable[List[str]],
+    key: SortKey,
+    run_rows: int = 100_000,
+    tmp_dir: str | None = None,
+    stats: Dict[str, int] | None = None,
+) -> Iterator[List[str]]:
+    """
+    CSVの行（値のリスト）を played_at 順に並べ、(track_id, played_at) の重複を除いて返す
+
+    run_rows 行ずつメモリ上で並べて一時ファイルに書き、それらをマージする。
+    全体が run_rows 行に収まる場合は一時ファイルを作らない。
+    同じキーの行は入力で先に現れたものが残る。
+
+    Args:
+        rows: CSVの行（ヘッダーを除く）
+        key: 行から (played_at, track_id) を取り出す関数
+        run_rows: 一度にメモリ上で並べる最大行数
+        tmp_dir: 一時ファイルを置くディレクトリ（省略時はシステムの一時ディレクトリ）
+        stats: 読んだ行数（rows）・重複数（duplicates）・一時ファイル数（runs）を書き込む辞書
+
+    Yields:
+        played_at 順の重複のない行
+    """
+    stats = stats if stats is not None else {}
+    stats.update({"rows": 0, "duplicates": 0, "runs": 0})
+
+    with tempfile.TemporaryDirectory(prefix="spotify-sort-", dir=tmp_dir) as directory:
+        runs: List[str] = []
+        buffer: List[List[str]] = []
+        for values in rows:
+            stats["rows"] += 1
+            buffer.append(values)
+            if len(buffer) >= run_rows:
+                # 安定ソートなので同じキーの行は入力順のまま
+                buffer.sort(key=key)
+                runs.append(_write_run(buffer, directory))
+                buffer = []
+        buffer.sort(key=key)
+
+        if runs:
+            if buffer:
+                runs.append(_write_run(buffer, directory))
+            buffer = []
+            stats["runs"] = len(runs)
+            # heapq.merge は同じキーなら先の入力（先に書いた一時ファイル）を先に返す
+            merged = heapq.merge(*(_read_run(path) for path in runs), key=key)
+        else:
+            merged = iter(buffer)
+
+        kept = 0
+        for values in unique_by_key(merged, key):
+            kept += 1
+            yield values
+        stats["duplicates"] = stats["rows"] - kept
@@ -0,0 +1,205 @@
+"""
+モジュール: storage/normalized_sqlite_storage.py
+トラック・アーティスト・アルバムを重複のないディメンションテーブルに分けて保存するSQLiteストレージ。
+再生ごとの行（plays）は played_at とトラックのキーだけを持ち、曲名やURLは曲ごとに1回だけ保存する。
+spotify_logs ビューが従来と同じ列の行を組み立てるため、読み出しと集計は SQLiteStorage と共通。
+"""
+
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Tuple
+from .play_record import PlayRecord, as_records
+from .sqlite_storage import SQLiteStorage, AGGREGATE_TABLES
+
+
+NORMALIZED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artists (
+    artist_key INTEGER PRIMARY KEY,
+    artist_id TEXT NOT NULL,
+    artist_name TEXT NOT NULL,
+    UNIQUE (artist_id, artist_name)
+);
+
+CREATE TABLE IF NOT EXISTS albums (
+    album_key INTEGER PRIMARY KEY,
+    album_id TEXT NOT NULL,
+    album_name TEXT NOT NULL,
+    UNIQUE (album_id, album_name)
+);
+
+-- 曲名や長さが変わった場合は新しいキーを振り、過去の再生は当時の値のまま読める
+CREATE TABLE IF NOT EXISTS tracks (
+    track_key INTEGER PRIMARY KEY,
+    track_id TEXT NOT NULL,
+    track_name TEXT NOT NULL,
+    artist_key INTEGER NOT NULL REFERENCES artists(artist_key),
+    album_key INTEGER NOT NULL REFERENCES albums(album_key),
+    duration_ms INTEGER NOT NULL,
+    external_urls TEXT,
+    UNIQUE (track_id, track_name, artist_key, album_key, duration_ms, external_urls)
+);
+
+-- popularity は再生時点の値なので再生ごとに持つ
+CREATE TABLE IF NOT EXISTS plays (
+    id INTEGER PRIMARY KEY,
+    played_at INTEGER NOT NULL,
+    track_key INTEGER NOT NULL REFERENCES tracks(track_key),
+    saved_at INTEGER NOT NULL,
+    popularity INTEGER,
+    CONSTRAINT plays_track_played_key UNIQUE (track_key, played_at)
+);
+CREATE INDEX IF NOT EXISTS idx_plays_played_at ON plays(played_at);
+
+-- 従来と同じく (track_id, played_at) で重複を判定する（曲名などが変わってキーが違っても同じ再生は無視）
+CREATE TRIGGER IF NOT EXISTS plays_dedupe BEFORE INSERT ON plays
+BEGIN
+    SELECT RAISE(IGNORE) WHERE EXISTS (
+        SELECT 1 FROM plays p JOIN tracks t ON t.track_key = p.track_key
+        WHERE p.played_at = NEW.played_at
+          AND t.track_id = (SELECT track_id FROM tracks WHERE track_key = NEW.track_key)
+    );
+END;
+
+-- 従来の spotify_logs テーブルと同じ列を返す互換ビュー
+CREATE VIEW IF NOT EXISTS spotify_logs AS
+SELECT p.id, t.track_name, ar.artist_name, p.played_at, p.saved_at, t.track_id, ar.artist_id,
+       al.album_name, al.album_id, t.duration_ms, p.popularity, t.external_urls
+FROM plays p
+JOIN tracks t ON t.track_key = p.track_key
+JOIN artists ar ON ar.artist_key = t.artist_key
+JOIN albums al ON al.album_key = t.album_key;
+"""
+
+# ディメンションテーブルごとのキーの列と、重複を判定する列
+DIMENSIONS = {
+    "artists": ("artist_key", ["artist_id", "artist_name"]),
+    "albums": ("album_key", ["album_id", "album_name"]),
+    "tracks": ("track_key", ["track_id", "track_name", "artist_key", "album_key", "duration_ms", "external_urls"]),
+}
+
+# SQLiteStorage の集計トリガーと同じ更新を、ディメンションを引いて plays への挿入時に行う
+NORMALIZED_AGGREGATE_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS plays_aggregate AFTER INSERT ON plays
+BEGIN
+    INSERT INTO track_stats
+        SELECT t.track_name, ar.artist_name, al.album_name, COALESCE(t.external_urls, ''),
+               1, COALESCE(NEW.popularity, 0), NEW.popularity IS NOT NULL, t.duration_ms, NEW.played_at
+        FROM tracks t
+        JOIN artists ar ON ar.artist_key = t.artist_key
+        JOIN albums al ON al.album_key = t.album_key
+        WHERE t.track_key = NEW.track_key
+    ON CONFLICT (track_name, artist_name, album_name, external_urls) DO UPDATE SET
+        play_count = play_count + 1,
+        popularity_sum = popularity_sum + excluded.popularity_sum,
+        popularity_count = popularity_count + excluded.popularity_count,
+        total_duration_ms = total_duration_ms + excluded.total_duration_ms,
+        last_played = MAX(last_played, excluded.last_played);
+
+    INSERT OR IGNORE INTO artist_tracks
+        SELECT ar.artist_name, ar.artist_id, t.track_id
+        FROM tracks t JOIN artists ar ON ar.artist_key = t.artist_key
+        WHERE t.track_key = NEW.track_key;
+    INSERT INTO artist_stats
+        SELECT ar.artist_name, ar.artist_id, 1, 0, t.duration_ms, NEW.played_at
+        FROM tracks t JOIN artists ar ON ar.artist_key = t.artist_key
+        WHERE t.track_key = NEW.track_key
+    ON CONFLICT (artist_name, artist_id) DO UPDATE SET
+        play_count = play_count + 1,
+        total_duration_ms = total_duration_ms + excluded.total_duration_ms,
+        last_played = MAX(last_played, excluded.last_played);
+    UPDATE artist_stats SET unique_tracks = (
+        SELECT COUNT(*) FROM artist_tracks a
+        WHERE a.artist_name = artist_stats.artist_name AND a.artist_id = artist_stats.artist_id
+    ) WHERE (artist_name, artist_id) = (
+        SELECT ar.artist_name, ar.artist_id
+        FROM tracks t JOIN artists ar ON ar.artist_key = t.artist_key
+        WHERE t.track_key = NEW.track_key
+    );
+
+    INSERT INTO log_totals
+        SELECT 1, 1, duration_ms FROM tracks WHERE track_key = NEW.track_key
+    ON CONFLICT (id) DO UPDATE SET
+        total_plays = total_plays + 1,
+        total_duration_ms = total_duration_ms + excluded.total_duration_ms;
+END;
+"""
+
+
+class NormalizedSQLiteStorage(SQLiteStorage):
+    """トラック・アーティスト・アルバムを正規化して保存するSQLiteストレージ"""
+
+    schemas = (NORMALIZED_SCHEMA, AGGREGATE_TABLES, NORMALIZED_AGGREGATE_TRIGGER)
+    log_table = "plays"
+
+    def __init__(self, db_path: str = "spotify_logs_normalized.db"):
+        """
+        SQLiteストレージを初期化し、ディメンションのキーをメモリに読み込む
+
+        Args:
+            db_path: データベースファイルのパス（":memory:" でインメモリ）
+        """
+        super().__init__(db_path)
+        self._load_keys()
+
+    def _load_keys(self) -> None:
+        """ディメンションテーブルの ID（と名前）→キーをインターンキャッシュに読み込む"""
+        self._keys: Dict[str, Dict[Tuple, int]] = {}
+        for table, (key_column, columns) in DIMENSIONS.items():
+            self._keys[table] = {
+                tuple(values): key for *values, key in self.conn.execute(
+                    f"SELECT {', '.join(columns)}, {key_column} FROM {table}"
+                )
+            }
+
+    def _intern(self, table: str, values: Tuple) -> int:
+        """ディメンションの行のキーを返す（キャッシュになければ挿入する）"""
+        cache = self._keys[table]
+        key = cache.get(values)
+        if key is not None:
+            return key
+        key_column, columns = DIMENSIONS[table]
+        # 他のプロセスが同じ行を先に挿入していても既存のキーを使う
+        self.conn.execute(
+            f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            values,
+        )
+        (key,) = self.conn.execute(
+            f"SELECT {key_column} FROM {table} WHERE {' AND '.join(f'{c} IS ?' for c in columns)}",
+            values,
+        ).fetchone()
+        cache[values] = key
+        return key
+
+    def _track_key(self, r: PlayRecord) -> int:
+        artist_key = self._intern("artists", (r.artist_id, r.artist_name))
+        album_key = self._intern("albums", (r.album_id, r.album_name))
+        return self._intern(
+            "tracks", (r.track_id, r.track_name, artist_key, album_key, r.duration_ms, r.external_urls)
+        )
+
+    def save_tracks(self, tracks: List[PlayRecord | Dict[str, Any]]) -> None:
+        """
+        トラックを1トランザクションで一括挿入する（既存の (トラック, played_at) は無視）
+
+        初めての曲・アーティスト・アルバムだけがディメンションテーブルに書き込まれる。
+
+        Args:
+            tracks: 保存する再生レコード（APIのアイテムも可）
+        """
+        if not tracks:
+            return
+
+        saved_at = int(datetime.now(timezone.utc).timestamp() * 1000)
+        records = as_records(tracks)
+        try:
+            with self.conn:
+                rows = [(r.played_at_ms, self._track_key(r), saved_at, r.popularity) for r in records]
+                inserted = self.conn.executemany(
+                    "INSERT OR IGNORE INTO plays (played_at, track_key, saved_at, popularity) VALUES (?, ?, ?, ?)",
+                    rows,
+                ).rowcount
+        except Exception:
+            # ロールバックされたディメンションのキーをキャッシュに残さない
+            self._load_keys()
+            raise
+
+        print(f"✅ : {inserted} tracks saved to {self.db_path} ({len(rows) - inserted} duplicates skipped)")
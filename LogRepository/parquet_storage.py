@@ -0,0 +1,527 @@
+"""
+モジュール: storage/parquet_storage.py
+Spotifyトラックデータ用の列指向Parquetストレージ実装。
+保存ごとにplayed_at順のrow groupを持つファイルを書き、文字列列は辞書エンコードする。
+読み出しでは列の射影と played_at の述語プッシュダウンを使う。
+"""
+
+import heapq
+import json
+import math
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Iterator, List, Dict, Any
+from .base_storage import BaseStorage
+from .play_record import PlayRecord, as_records
+from .external_sort import unique_by_key
+from .spool import _fsync_directory
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrowはParquetストレージを使う場合のみ必要
+    pa = None
+
+
+# 値の種類が少なく繰り返しの多い列は辞書エンコードする
+DICTIONARY_COLUMNS = [
+    "track_id", "track_name", "artist_id", "artist_name", "album_id", "album_name", "external_urls",
+]
+
+# 行数が同じ桁（この倍率の範囲）のファイルどうしをまとめ、同じ行を何度も書き直さないようにする
+COMPACT_FANOUT = 8
+
+# まとめたファイルで置き換える元のファイルを記録するジャーナルの拡張子
+REPLACES_SUFFIX = ".replaces"
+
+
+def parquet_schema() -> "pa.Schema":
+    """spotify_logs と同じ列を持つArrowスキーマを返す"""
+    return pa.schema([
+        ("played_at", pa.timestamp("ms", tz="UTC")),
+        ("saved_at", pa.timestamp("ms", tz="UTC")),
+        ("track_id", pa.string()),
+        ("track_name", pa.string()),
+        ("artist_id", pa.string()),
+        ("artist_name", pa.string()),
+        ("album_id", pa.string()),
+        ("album_name", pa.string()),
+        ("duration_ms", pa.int32()),
+        ("popularity", pa.int16()),
+        ("external_urls", pa.string()),
+    ])
+
+
+class ParquetStorage(BaseStorage):
+    """Spotifyトラックデータ用のParquetファイルストレージ"""
+
+    def __init__(self, directory: str = "spotify_logs_parquet", compact_threshold: int = 64,
+                 row_group_size: int = 1_000_000):
+        """
+        Parquetストレージを初期化する
+
+        Args:
+            directory: Parquetファイルを置くディレクトリ
+            compact_threshold: 小さいファイルがこの数を超えたら1ファイルにまとめる
+            row_group_size: まとめたファイルのrow groupあたりの最大行数
+        """
+        if pa is None:
+            raise ImportError("Parquetストレージには pyarrow が必要です（pip install pyarrow）")
+
+        self.directory = directory
+        self.compact_threshold = compact_threshold
+        self.row_group_size = row_group_size
+
+    def save_tracks(self, tracks: List[PlayRecord | Dict[str, Any]]) -> None:
+        """
+        トラックを1つのrow groupとしてParquetファイルに保存する
+
+        Args:
+            tracks: 保存する再生レコード（APIのアイテムも可）
+        """
+        if not tracks:
+            return
+
+        records = as_records(tracks)
+        saved_at = int(datetime.now(timezone.utc).timestamp() * 1000)
+        table = pa.Table.from_pydict({
+            "played_at": [r.played_at_ms for r in records],
+            "saved_at": [saved_at] * len(records),
+            "track_id": [r.track_id for r in records],
+            "track_name": [r.track_name for r in records],
+            "artist_id": [r.artist_id for r in records],
+            "artist_name": [r.artist_name for r in records],
+            "album_id": [r.album_id for r in records],
+            "album_name": [r.album_name for r in records],
+            "duration_ms": [r.duration_ms for r in records],
+            "popularity": [r.popularity for r in records],
+            "external_urls": [r.external_urls for r in records],
+        }, schema=parquet_schema())
+
+        self._recover()
+        self.write_table(table)
+        if len(self._files()) > self.compact_threshold:
+            self.compact()
+        print(f"✅ : {len(tracks)} tracks saved to {self.directory}")
+
+    def write_table(self, table: "pa.Table", replaces: List[str] | None = None) -> str:
+        """
+        Arrowテーブルをplayed_at順に並べ、1ファイルとして原子的に書き込む
+
+        ファイル名に played_at の最小値と最大値を含めるため、最終時刻の取得や
+        範囲外ファイルの除外はファイルを開かずにできる。
+
+        Args:
+            table: parquet_schema() に従うテーブル
+            replaces: 書き込んだファイルで置き換えるファイル名（書き込み後に削除する）
+
+        Returns:
+            書き込んだファイルのパス
+        """
+        table = table.cast(parquet_schema()).sort_by("played_at")
+        played = table.column("played_at").cast(pa.int64())
+        min_ms, max_ms = pc.min(played).as_py(), pc.max(played).as_py()
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"part-{min_ms:013d}-{max_ms:013d}-{uuid.uuid4().hex[:8]}.parquet"
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp"
+        pq.write_table(
+            table,
+            tmp_path,
+            row_group_size=self.row_group_size,
+            use_dictionary=DICTIONARY_COLUMNS,
+            compression="zstd",
+            write_statistics=True,
+        )
+        self._commit(tmp_path, path, replaces or [])
+        return path
+
+    def _commit(self, tmp_path: str, path: str, replaces: List[str]) -> None:
+        """
+        一時ファイルを path に置き換え、replaces のファイルを削除する
+
+        置き換える前に replaces をジャーナルに記録するため、削除の途中で止まっても
+        読み出しでは置き換え済みのファイルを除き、次の書き込みで削除を再開する（_recover）。
+        一時ファイル・ジャーナル・ディレクトリをfsyncしてから次に進むため、電源断の後に
+        中身のないファイルが残ったまま元のファイルだけが消えることはない。
+        """
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        journal = f"{path}{REPLACES_SUFFIX}"
+        if replaces:
+            with open(f"{journal}.tmp", "w") as f:
+                json.dump(replaces, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(f"{journal}.tmp", journal)
+            _fsync_directory(self.directory)
+        os.replace(tmp_path, path)
+        # 元のファイルを消す前に、置き換えをディレクトリに永続化する
+        _fsync_directory(self.directory)
+        if replaces:
+            self._remove_replaced(journal, replaces)
+
+    def _remove_replaced(self, journal: str, replaces: List[str]) -> None:
+        for name in replaces:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+        os.remove(journal)
+
+    def _recover(self) -> None:
+        """途中で止まった置き換えを片付ける（置き換え後なら元のファイルを削除し、置き換え前ならジャーナルだけ消す）"""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if not name.endswith(REPLACES_SUFFIX):
+                continue
+            journal = os.path.join(self.directory, name)
+            if os.path.exists(journal[:-len(REPLACES_SUFFIX)]):
+                with open(journal, "r") as f:
+                    self._remove_replaced(journal, json.load(f))
+            else:
+                os.remove(journal)
+
+    def compact(self) -> str | None:
+        """
+        行数が同じ桁の小さいファイルどうしを played_at 順の1ファイルにまとめる
+
+        row_group_size 行に達したファイルはまとめない。行数を COMPACT_FANOUT 倍ごとの段に分け、
+        同じ段のファイルだけを合計 row_group_size 行まで1ファイルにまとめるため、
+        まとめたファイルを保存のたびに書き直すことはなく、各行が書き直される回数は段の数までになる。
+
+        Returns:
+            最後にまとめたファイルのパス（まとめる対象がない場合はNone）
+        """
+        self._recover()
+        tiers: Dict[int, List[tuple]] = {}
+        for name in self._files():
+            rows = pq.read_metadata(os.path.join(self.directory, name)).num_rows
+            if rows >= self.row_group_size:
+                continue
+            tiers.setdefault(int(math.log(max(rows, 1), COMPACT_FANOUT)), []).append((name, rows))
+
+        path = None
+        for tier in sorted(tiers):
+            group: List[str] = []
+            total = 0
+            for name, rows in tiers[tier] + [(None, self.row_group_size)]:
+                if group and total + rows > self.row_group_size:
+                    if len(group) > 1:
+                        table = pq.ParquetDataset([os.path.join(self.directory, f) for f in group]).read()
+                        path = self.write_table(table, replaces=group)
+                    group, total = [], 0
+                if name is not None:
+                    group.append(name)
+                    total += rows
+        return path
+
+    def deduplicate(self, batch_size: int = 100_000) -> Dict[str, Any]:
+        """
+        すべてのファイルを played_at 順にマージし、(track_id, played_at) が同じ行を1行にまとめた1ファイルに書き直す
+
+        各ファイルは played_at 順に並んでいるため、batch_size 行ずつ読みながらk-wayマージでき、
+        メモリに載るのはファイルごとの1バッチと書き込み中の1 row group だけになる。
+        新しいファイルを書き終えてから古いファイルを消すため、途中で失敗しても行は失われない。
+        保存と同時には実行しないこと。
+
+        Args:
+            batch_size: ファイルごとに一度に読む行数
+
+        Returns:
+            残した行数、除いた重複数、マージしたファイル数
+        """
+        self._recover()
+        names = self._files()
+        files = [os.path.join(self.directory, name) for name in names]
+        if not files:
+            return {"rows": 0, "duplicates": 0, "files": 0}
+
+        def rows(path: str) -> Iterator[Dict[str, Any]]:
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+                yield from batch.to_pylist()
+
+        def key(row: Dict[str, Any]) -> tuple:
+            return row["played_at"], row["track_id"]
+
+        schema = parquet_schema()
+        merged = heapq.merge(*(rows(path) for path in files), key=lambda row: row["played_at"])
+        total = sum(pq.read_metadata(path).num_rows for path in files)
+        tmp_path = os.path.join(self.directory, f"compact-{uuid.uuid4().hex[:8]}.parquet.tmp")
+        writer = pq.ParquetWriter(tmp_path, schema, use_dictionary=DICTIONARY_COLUMNS, compression="zstd",
+                                  write_statistics=True)
+        try:
+            pending: List[Dict[str, Any]] = []
+            tables: List["pa.Table"] = []
+            buffered = 0
+            for row in unique_by_key(merged, key):
+                pending.append(row)
+                if len(pending) >= batch_size:
+                    tables.append(pa.Table.from_pylist(pending, schema=schema))
+                    buffered += len(pending)
+                    pending = []
+                    if buffered >= self.row_group_size:
+                        # row_group_size 行ごとに1つの row group として書く
+                        writer.write_table(pa.concat_tables(tables), row_group_size=self.row_group_size)
+                        tables, buffered = [], 0
+            if pending:
+                tables.append(pa.Table.from_pylist(pending, schema=schema))
+            if tables:
+                writer.write_table(pa.concat_tables(tables), row_group_size=self.row_group_size)
+        finally:
+            writer.close()
+
+        kept = pq.read_metadata(tmp_path).num_rows
+        if kept:
+            played = pq.read_table(tmp_path, columns=["played_at"]).column("played_at").cast(pa.int64())
+            min_ms, max_ms = pc.min(played).as_py(), pc.max(played).as_py()
+            path = os.path.join(self.directory, f"part-{min_ms:013d}-{max_ms:013d}-{uuid.uuid4().hex[:8]}.parquet")
+            self._commit(tmp_path, path, names)
+        else:
+            os.remove(tmp_path)
+            for old in files:
+                os.remove(old)
+
+        stats = {"rows": kept, "duplicates": total - kept, "files": len(files)}
+        print(f"✅ : {stats['duplicates']} duplicates removed from {self.directory} ({kept} rows kept)")
+        return stats
+
+    def scan(
+        self,
+        columns: List[str] | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> "pa.Table":
+        """
+        必要な列と played_at の範囲だけを読み出す
+
+        Args:
+            columns: 読み出す列（省略時はすべて）
+            start: 範囲の開始（含む）
+            end: 範囲の終了（含まない）
+
+        Returns:
+            Arrowテーブル
+        """
+        dataset, expression = self._dataset(start, end)
+        if dataset is None:
+            return parquet_schema().empty_table().select(columns or parquet_schema().names)
+        return dataset.to_table(columns=columns, filter=expression)
+
+    def iter_batches(
+        self,
+        columns: List[str] | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        batch_size: int = 100_000,
+    ) -> Iterator["pa.RecordBatch"]:
+        """
+        scan() と同じ条件でレコードバッチを順に読み出す（全体をメモリに載せない）
+
+        Args:
+            columns: 読み出す列（省略時はすべて）
+            start: 範囲の開始（含む）
+            end: 範囲の終了（含まない）
+            batch_size: バッチあたりの最大行数
+
+        Yields:
+            Arrowのレコードバッチ
+        """
+        dataset, expression = self._dataset(start, end)
+        if dataset is None:
+            return
+        for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size,
+                                        batch_readahead=1, fragment_readahead=1):
+            if batch.num_rows:
+                yield batch
+
+    def _dataset(self, start: datetime | None, end: datetime | None) -> tuple:
+        """範囲に重なるファイルのデータセットと played_at のフィルタ式を返す"""
+        paths = [os.path.join(self.directory, f) for f in self._files(start, end)]
+        if not paths:
+            return None, None
+
+        expression = None
+        if start is not None:
+            expression = ds.field("played_at") >= pa.scalar(start, type=pa.timestamp("ms", tz="UTC"))
+        if end is not None:
+            upper = ds.field("played_at") < pa.scalar(end, type=pa.timestamp("ms", tz="UTC"))
+            expression = upper if expression is None else expression & upper
+        # 辞書エンコードした列は展開せずに辞書のまま読む
+        file_format = ds.ParquetFileFormat(read_options={"dictionary_columns": DICTIONARY_COLUMNS})
+        return ds.dataset(paths, format=file_format), expression
+
+    def query(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        batch_size: int = 10_000,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        played_at が [start, end) の範囲の行を古い順に返す
+
+        各ファイルは played_at 順に並んでいるため、範囲に重なる row group だけをファイルごとに
+        batch_size 行ずつ読み、k-wayマージする。メモリに載るのはファイルごとの1バッチだけになる。
+
+        Args:
+            start: 範囲の開始（含む、省略時は最初から）
+            end: 範囲の終了（含まない、省略時は最後まで）
+            batch_size: ファイルごとに一度に読む行数
+
+        Yields:
+            CSVと同じ列名を持つ行
+        """
+        paths = [os.path.join(self.directory, name) for name in self._files(start, end)]
+        merged = heapq.merge(
+            *(self._file_rows(path, start, end, batch_size) for path in paths),
+            key=lambda row: row["played_at"],
+        )
+        for row in merged:
+            row["played_at"] = row["played_at"].isoformat()
+            row["saved_at"] = row["saved_at"].isoformat()
+            yield row
+
+    @staticmethod
+    def _file_rows(
+        path: str,
+        start: datetime | None,
+        end: datetime | None,
+        batch_size: int,
+    ) -> Iterator[Dict[str, Any]]:
+        """1ファイルのうち played_at が [start, end) の行をファイル内の順に返す"""
+        parquet_file = pq.ParquetFile(path)
+        metadata = parquet_file.metadata
+        column = parquet_file.schema_arrow.get_field_index("played_at")
+        row_groups = []
+        for index in range(metadata.num_row_groups):
+            # row group の統計情報で範囲外の row group を読まずに飛ばす
+            statistics = metadata.row_group(index).column(column).statistics
+            if statistics is not None and statistics.has_min_max:
+                if start is not None and statistics.max < start:
+                    continue
+                if end is not None and statistics.min >= end:
+                    continue
+            row_groups.append(index)
+        if not row_groups:
+            return
+
+        bounds = pa.timestamp("ms", tz="UTC")
+        for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=row_groups):
+            if start is not None or end is not None:
+                played = batch.column("played_at")
+                mask = None
+                if start is not None:
+                    mask = pc.greater_equal(played, pa.scalar(start, type=bounds))
+                if end is not None:
+                    upper = pc.less(played, pa.scalar(end, type=bounds))
+                    mask = upper if mask is None else pc.and_(mask, upper)
+                batch = batch.filter(mask)
+            yield from batch.to_pylist()
+
+    def get_last_saved_timestamp(self) -> datetime | None:
+        """
+        最後に保存されたトラックのタイムスタンプをファイル名から取得する
+
+        Returns:
+            最後に保存されたトラックの日時、またはトラックが保存されていない場合はNone
+        """
+        bounds = [self._bounds(f) for f in self._files()]
+        if not bounds:
+            return None
+        return datetime.fromtimestamp(max(b[1] for b in bounds) / 1000, tz=timezone.utc)
+
+    def get_first_saved_timestamp(self) -> datetime | None:
+        """
+        最も古いトラックのタイムスタンプをファイル名から取得する
+
+        Returns:
+            最も古いトラックの日時、またはトラックが保存されていない場合はNone
+        """
+        bounds = [self._bounds(f) for f in self._files()]
+        if not bounds:
+            return None
+        return datetime.fromtimestamp(min(b[0] for b in bounds) / 1000, tz=timezone.utc)
+
+    def is_available(self) -> bool:
+        """
+        Parquetディレクトリに書き込めるかチェックする
+
+        Returns:
+            ストレージが利用可能な場合はTrue、そうでなければFalse
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            test_file = os.path.join(self.directory, ".write_test")
+            with open(test_file, "w") as f:
+                f.write("test")
+            os.remove(test_file)
+            return True
+        except OSError:
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        ファイルのフッターだけを読んで統計情報を取得する
+
+        Returns:
+            統計情報の辞書
+        """
+        files = self._files()
+        rows = 0
+        row_groups = 0
+        size = 0
+        for name in files:
+            path = os.path.join(self.directory, name)
+            metadata = pq.read_metadata(path)
+            rows += metadata.num_rows
+            row_groups += metadata.num_row_groups
+            size += os.path.getsize(path)
+        return {
+            "exists": bool(files),
+            "directory": self.directory,
+            "files": len(files),
+            "row_groups": row_groups,
+            "rows": rows,
+            "size": size,
+        }
+
+    @staticmethod
+    def _bounds(name: str) -> tuple[int, int]:
+        """ファイル名から played_at の最小値と最大値を取り出す"""
+        _, min_ms, max_ms, _ = name.split("-", 3)
+        return int(min_ms), int(max_ms)
+
+    def _files(self, start: datetime | None = None, end: datetime | None = None) -> List[str]:
+        """範囲に重なるParquetファイル名を古い順に返す"""
+        if not os.path.isdir(self.directory):
+            return []
+        start_ms = int(start.timestamp() * 1000) if start else None
+        end_ms = int(end.timestamp() * 1000) if end else None
+
+        names = sorted(os.listdir(self.directory))
+        # 置き換えが済んでいて削除が終わっていない元のファイルは読まない
+        replaced = set()
+        for name in names:
+            if name.endswith(REPLACES_SUFFIX) and name[:-len(REPLACES_SUFFIX)] in names:
+                try:
+                    with open(os.path.join(self.directory, name), "r") as f:
+                        replaced.update(json.load(f))
+                except (OSError, ValueError):
+                    pass
+
+        files = []
+        for name in names:
+            if not (name.startswith("part-") and name.endswith(".parquet")) or name in replaced:
+                continue
+            min_ms, max_ms = self._bounds(name)
+            if start_ms is not None and max_ms < start_ms:
+                continue
+            if end_ms is not None and min_ms >= end_ms:
+                continue
+            files.append(name)
+        return files
@@ -0,0 +1,492 @@
+"""
+モジュール: storage/partitioned_csv_storage.py
+月ごとのファイルに分割し、締まった月を圧縮するCSVストレージ実装。
+マニフェストに各パーティションの行数とplayed_atの範囲を持ち、範囲読み出しで必要なファイルだけを開く。
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import re
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Dict, Any
+from .base_storage import BaseStorage
+from .csv_storage import FIELDNAMES, played_at_to_ms
+from .external_sort import sort_unique
+from .play_record import PlayRecord, as_records
+
+try:
+    import zstandard
+except ImportError:  # zstdが使えない環境ではgzipで圧縮する
+    zstandard = None
+
+
+MANIFEST_NAME = "manifest.json"
+EXTENSIONS = {None: ".csv", "gzip": ".csv.gz", "zstd": ".csv.zst"}
+PARTITION_FILE = re.compile(r"^(\d{4}-\d{2})\.csv(\.gz|\.zst)?$")
+COMPRESSION_BY_SUFFIX = {None: None, ".gz": "gzip", ".zst": "zstd"}
+# 追記の途中で途切れたデータを解析したときに出る例外
+_TAIL_ERRORS = (OSError, EOFError, ValueError, IndexError, csv.Error) + (
+    (zstandard.ZstdError,) if zstandard is not None else ()
+)
+
+
+def _partition_key(played_ms: int) -> str:
+    """ミリ秒Unixタイムスタンプが属するパーティション名（YYYY-MM、UTC）を返す"""
+    return datetime.fromtimestamp(played_ms / 1000, tz=timezone.utc).strftime("%Y-%m")
+
+
+class PartitionedCSVStorage(BaseStorage):
+    """月単位でパーティション分割したCSVファイルストレージ"""
+
+    def __init__(self, directory: str = "spotify_logs", compression: str = "auto"):
+        """
+        パーティション分割CSVストレージを初期化する
+
+        Args:
+            directory: パーティションとマニフェストを置くディレクトリ
+            compression: 締まったパーティションの圧縮方式（"auto"、"zstd"、"gzip"、"none"）
+        """
+        if compression == "auto":
+            compression = "zstd" if zstandard is not None else "gzip"
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd圧縮には zstandard パッケージが必要です")
+        if compression not in ("zstd", "gzip", "none"):
+            raise ValueError(f"Unsupported compression: {compression}")
+
+        self.directory = directory
+        self.compression = None if compression == "none" else compression
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+
+    def save_tracks(self, tracks: List[PlayRecord | Dict[str, Any]]) -> None:
+        """
+        トラックをplayed_atの月ごとのパーティションに保存する
+
+        Args:
+            tracks: 保存する再生レコード（APIのアイテムも可）
+        """
+        if not tracks:
+            return
+
+        saved_at = datetime.now(timezone.utc).isoformat()
+        self._append((record.played_at_ms, record.to_row(saved_at)) for record in as_records(tracks))
+        self.compress_closed_partitions()
+        print(f"✅ : {len(tracks)} tracks saved to {self.directory}")
+
+    def append_rows(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        CSV形式の行をパーティションに追記し、マニフェストを更新する
+
+        Args:
+            rows: FIELDNAMES をキーに持つ行
+
+        Returns:
+            追記した行数
+        """
+        return self._append((played_at_to_ms(row["played_at"]), row) for row in rows)
+
+    def _append(self, rows: Iterable[tuple]) -> int:
+        """(played_atのミリ秒, 行) の組をパーティションごとにまとめて追記する"""
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        ranges: Dict[str, List[int]] = {}
+        for ms, row in rows:
+            key = _partition_key(ms)
+            grouped.setdefault(key, []).append(row)
+            bounds = ranges.setdefault(key, [ms, ms])
+            bounds[0] = min(bounds[0], ms)
+            bounds[1] = max(bounds[1], ms)
+
+        if not grouped:
+            return 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = self._read_manifest()
+        for key, part_rows in grouped.items():
+            entry = manifest["partitions"].get(key) or {
+                "file": f"{key}{EXTENSIONS[None]}",
+                "compression": None,
+                "rows": 0,
+                "min_played_at_ms": ranges[key][0],
+                "max_played_at_ms": ranges[key][1],
+                "size": 0,
+            }
+            entry["size"] = self._append_to_partition(entry, part_rows)
+            entry["rows"] += len(part_rows)
+            entry["min_played_at_ms"] = min(entry["min_played_at_ms"], ranges[key][0])
+            entry["max_played_at_ms"] = max(entry["max_played_at_ms"], ranges[key][1])
+            manifest["partitions"][key] = entry
+
+        self._write_manifest(manifest)
+        return sum(len(r) for r in grouped.values())
+
+    def _append_to_partition(self, entry: Dict[str, Any], rows: List[Dict[str, Any]]) -> int:
+        """
+        パーティションファイルに行を追記する（圧縮済みの場合は新しいgzipメンバー/zstdフレームとして追記）
+
+        Returns:
+            追記後のファイルサイズ（マニフェストに記録し、次に開いたときの整合性確認に使う）
+        """
+        path = os.path.join(self.directory, entry["file"])
+        buffer = io.StringIO(newline="")
+        writer = csv.DictWriter(buffer, fieldnames=FIELDNAMES)
+        if not os.path.exists(path):
+            writer.writeheader()
+        writer.writerows(rows)
+        payload = buffer.getvalue().encode("utf-8")
+
+        if entry["compression"] == "gzip":
+            payload = gzip.compress(payload)
+        elif entry["compression"] == "zstd":
+            payload = zstandard.ZstdCompressor().compress(payload)
+
+        with open(path, "ab") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    def compress_closed_partitions(self, now: datetime | None = None) -> List[str]:
+        """
+        現在の月より前の未圧縮パーティションを圧縮する
+
+        Args:
+            now: 現在時刻（省略時はUTCの現在時刻）
+
+        Returns:
+            圧縮したパーティション名のリスト
+        """
+        if self.compression is None:
+            return []
+
+        current = (now or datetime.now(timezone.utc)).strftime("%Y-%m")
+        manifest = self._read_manifest()
+        compressed = []
+        for key, entry in sorted(manifest["partitions"].items()):
+            if key >= current or entry["compression"] is not None:
+                continue
+
+            source = os.path.join(self.directory, entry["file"])
+            target_name = f"{key}{EXTENSIONS[self.compression]}"
+            target = os.path.join(self.directory, target_name)
+            tmp = f"{target}.tmp"
+            with open(source, "rb") as src, open(tmp, "wb") as dst:
+                if self.compression == "gzip":
+                    with gzip.GzipFile(fileobj=dst, mode="wb") as gz:
+                        gz.write(src.read())
+                else:
+                    zstandard.ZstdCompressor().copy_stream(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp, target)
+
+            entry["file"] = target_name
+            entry["compression"] = self.compression
+            entry["size"] = os.path.getsize(target)
+            # マニフェストを更新してから元ファイルを消す
+            self._write_manifest(manifest)
+            os.remove(source)
+            compressed.append(key)
+        return compressed
+
+    def query(self, start: datetime | None = None, end: datetime | None = None) -> Iterator[Dict[str, Any]]:
+        """
+        played_at が [start, end) の範囲の行を古い順に返す
+
+        マニフェストの範囲が重ならないパーティションは開かない。
+
+        Args:
+            start: 範囲の開始（含む、省略時は最初から）
+            end: 範囲の終了（含まない、省略時は最後まで）
+
+        Yields:
+            FIELDNAMES をキーに持つ行
+        """
+        start_ms = int(start.timestamp() * 1000) if start else None
+        end_ms = int(end.timestamp() * 1000) if end else None
+
+        manifest = self._read_manifest()
+        for key, entry in sorted(manifest["partitions"].items()):
+            if start_ms is not None and entry["max_played_at_ms"] < start_ms:
+                continue
+            if end_ms is not None and entry["min_played_at_ms"] >= end_ms:
+                continue
+
+            rows = []
+            for row in self._read_partition(entry):
+                ms = played_at_to_ms(row["played_at"])
+                if (start_ms is None or ms >= start_ms) and (end_ms is None or ms < end_ms):
+                    rows.append((ms, row))
+            rows.sort(key=lambda pair: pair[0])
+            for _, row in rows:
+                yield row
+
+    def _read_partition(self, entry: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """パーティションファイルを展開しながら行を読む"""
+        path = os.path.join(self.directory, entry["file"])
+        if entry["compression"] == "gzip":
+            text = gzip.open(path, "rt", encoding="utf-8", newline="")
+        elif entry["compression"] == "zstd":
+            reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True)
+            text = io.TextIOWrapper(reader, encoding="utf-8", newline="")
+        else:
+            text = open(path, "r", encoding="utf-8", newline="")
+
+        with text:
+            yield from csv.DictReader(text)
+
+    def deduplicate(self, batch_size: int = 100_000) -> Dict[str, Any]:
+        """
+        各パーティションを played_at 順に並べ替え、(track_id, played_at) が同じ行を1行にまとめて書き直す
+
+        played_at が同じ行は必ず同じパーティションにあるため、パーティションごとに外部ソートし、
+        同じ圧縮方式の一時ファイルから原子的に置き換える。保存と同時には実行しないこと。
+
+        Args:
+            batch_size: 一度にメモリ上で並べる最大行数
+
+        Returns:
+            残した行数、除いた重複数、書き直したパーティション数
+        """
+        played_at = FIELDNAMES.index("played_at")
+        track_id = FIELDNAMES.index("track_id")
+
+        def key(values: List[str]) -> tuple:
+            return played_at_to_ms(values[played_at]), values[track_id]
+
+        manifest = self._read_manifest()
+        totals = {"rows": 0, "duplicates": 0, "partitions": 0}
+        for name, entry in sorted(manifest["partitions"].items()):
+            path = os.path.join(self.directory, entry["file"])
+            tmp_path = f"{path}.compact.tmp"
+            stats: Dict[str, int] = {}
+            rows = ([row[column] for column in FIELDNAMES] for row in self._read_partition(entry))
+            with open(tmp_path, "wb") as raw:
+                if entry["compression"] == "gzip":
+                    stream = gzip.GzipFile(fileobj=raw, mode="wb")
+                elif entry["compression"] == "zstd":
+                    stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+                else:
+                    stream = None
+                text = io.TextIOWrapper(stream or raw, encoding="utf-8", newline="")
+                writer = csv.writer(text)
+                writer.writerow(FIELDNAMES)
+                writer.writerows(sort_unique(rows, key, batch_size, self.directory, stats))
+                text.flush()
+                text.detach()
+                if stream is not None:
+                    stream.close()
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(tmp_path, path)
+
+            entry["rows"] = stats["rows"] - stats["duplicates"]
+            entry["size"] = os.path.getsize(path)
+            self._write_manifest(manifest)
+            totals["rows"] += entry["rows"]
+            totals["duplicates"] += stats["duplicates"]
+            totals["partitions"] += 1
+            if stats["duplicates"]:
+                print(f"📊 {name}: {stats['duplicates']} duplicates removed")
+
+        print(f"✅ : {totals['duplicates']} duplicates removed from {self.directory} ({totals['rows']} rows kept)")
+        return totals
+
+    def get_last_saved_timestamp(self) -> datetime | None:
+        """
+        最後に保存されたトラックのタイムスタンプをマニフェストから取得する
+
+        Returns:
+            最後に保存されたトラックの日時、またはトラックが保存されていない場合はNone
+        """
+        partitions = self._read_manifest()["partitions"].values()
+        if not partitions:
+            return None
+        latest = max(entry["max_played_at_ms"] for entry in partitions)
+        return datetime.fromtimestamp(latest / 1000, tz=timezone.utc)
+
+    def get_first_saved_timestamp(self) -> datetime | None:
+        """
+        最も古いトラックのタイムスタンプをマニフェストから取得する
+
+        Returns:
+            最も古いトラックの日時、またはトラックが保存されていない場合はNone
+        """
+        partitions = self._read_manifest()["partitions"].values()
+        if not partitions:
+            return None
+        earliest = min(entry["min_played_at_ms"] for entry in partitions)
+        return datetime.fromtimestamp(earliest / 1000, tz=timezone.utc)
+
+    def is_available(self) -> bool:
+        """
+        パーティションディレクトリに書き込めるかチェックする
+
+        Returns:
+            ストレージが利用可能な場合はTrue、そうでなければFalse
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            test_file = os.path.join(self.directory, ".write_test")
+            with open(test_file, "w") as f:
+                f.write("test")
+            os.remove(test_file)
+            return True
+        except OSError:
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        マニフェストから統計情報を取得する
+
+        Returns:
+            統計情報の辞書
+        """
+        partitions = self._read_manifest()["partitions"]
+        size = 0
+        for entry in partitions.values():
+            path = os.path.join(self.directory, entry["file"])
+            if os.path.exists(path):
+                size += os.path.getsize(path)
+        return {
+            "exists": bool(partitions),
+            "directory": self.directory,
+            "partitions": len(partitions),
+            "compressed_partitions": sum(1 for e in partitions.values() if e["compression"]),
+            "rows": sum(e["rows"] for e in partitions.values()),
+            "size": size,
+        }
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        """
+        パーティションファイルと整合したマニフェストを返す
+
+        追記後・マニフェスト更新前にクラッシュした場合は、記録済みサイズ以降の差分だけを読んで追いつき、
+        差分が途中で途切れていれば記録済みサイズまで切り詰める（その再生は次の収集で取り直される）。
+        マニフェストが壊れている場合や、記録のないパーティションファイルは、ファイルを走査して作り直す。
+        """
+        manifest = {"version": 1, "partitions": {}}
+        changed = False
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            print(f"⚠️ : {self.manifest_path} is corrupt, rebuilding it from the partition files")
+            changed = True
+
+        files: Dict[str, List[str]] = {}
+        if os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                match = PARTITION_FILE.match(name)
+                if match:
+                    files.setdefault(match.group(1), []).append(name)
+
+        partitions = manifest["partitions"]
+        for key in [key for key, entry in partitions.items() if entry["file"] not in files.get(key, [])]:
+            del partitions[key]
+            changed = True
+
+        for key, names in files.items():
+            entry = partitions.get(key)
+            if entry is None:
+                # 圧縮の途中で残ったファイルがあれば、fsync してから置き換えた圧縮済みのほうを使う
+                name = max(names, key=lambda n: n != f"{key}{EXTENSIONS[None]}")
+                suffix = PARTITION_FILE.match(name).group(2)
+                entry = {"file": name, "compression": COMPRESSION_BY_SUFFIX[suffix], "size": None}
+                changed = True
+            for name in names:
+                if name != entry["file"]:
+                    # 圧縮の途中で残った元ファイル・圧縮後のファイル
+                    os.remove(os.path.join(self.directory, name))
+            if self._reconcile_partition(entry):
+                changed = True
+            if entry.get("rows"):
+                partitions[key] = entry
+            else:
+                partitions.pop(key, None)
+                os.remove(os.path.join(self.directory, entry["file"]))
+                changed = True
+
+        if changed:
+            self._write_manifest(manifest)
+        return manifest
+
+    def _reconcile_partition(self, entry: Dict[str, Any]) -> bool:
+        """
+        マニフェストのエントリをパーティションファイルの実際のサイズに合わせる
+
+        Returns:
+            エントリを更新した場合はTrue
+        """
+        path = os.path.join(self.directory, entry["file"])
+        size = os.path.getsize(path)
+        recorded = entry.get("size")
+        if recorded == size:
+            return False
+
+        if recorded is not None and recorded < size:
+            tail = self._scan_tail(entry, recorded)
+            if tail is None:
+                print(f"⚠️ : {entry['file']} has an incomplete append after {recorded} bytes, truncating")
+                os.truncate(path, recorded)
+                entry["size"] = recorded
+                return True
+            played = tail
+            rows = entry.get("rows", 0)
+        else:
+            # サイズの記録がない・ファイルが縮んでいる場合は全体を走査する
+            played = self._scan_tail(entry, 0)
+            if played is None:
+                raise ValueError(f"{path}: cannot be read")
+            rows = 0
+            entry["min_played_at_ms"] = entry["max_played_at_ms"] = None
+
+        if played:
+            low, high = min(played), max(played)
+            if entry.get("min_played_at_ms") is not None:
+                low = min(low, entry["min_played_at_ms"])
+                high = max(high, entry["max_played_at_ms"])
+            entry["min_played_at_ms"], entry["max_played_at_ms"] = low, high
+        entry["rows"] = rows + len(played)
+        entry["size"] = size
+        return True
+
+    def _scan_tail(self, entry: Dict[str, Any], offset: int) -> List[int] | None:
+        """
+        パーティションファイルの offset 以降の行の played_at（ミリ秒）を返す
+
+        Returns:
+            played_at のリスト。データが途中で途切れていて読めない場合はNone
+        """
+        path = os.path.join(self.directory, entry["file"])
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        try:
+            if entry["compression"] == "gzip":
+                data = gzip.decompress(data)
+            elif entry["compression"] == "zstd":
+                data = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True).read()
+            text = data.decode("utf-8")
+            if text and not text.endswith("\n"):
+                return None
+            rows = [values for values in csv.reader(io.StringIO(text, newline="")) if values]
+            if offset == 0:
+                # 先頭行はヘッダー
+                rows = rows[1:]
+            column = FIELDNAMES.index("played_at")
+            return [played_at_to_ms(values[column]) for values in rows]
+        except _TAIL_ERRORS:
+            return None
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        """マニフェストを一時ファイル経由で原子的に置き換える"""
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
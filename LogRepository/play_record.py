@@ -0,0 +1,147 @@
+"""
+モジュール: storage/play_record.py
+ストレージ層に渡す1回分の再生レコード。
+Spotify APIのアイテムから一度だけ変換し、played_at の解析結果（ISO文字列とミリ秒）を持ち回る。
+"""
+
+import json
+from datetime import datetime
+from json.encoder import encode_basestring_ascii
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+
+def parse_played_at(value: str) -> Tuple[str, int]:
+    """
+    APIの played_at を、保存に使うISO文字列とミリ秒Unixタイムスタンプに変換する
+
+    Args:
+        value: played_at（例: 2024-01-01T12:34:56.789Z）
+
+    Returns:
+        (datetime.isoformat() と同じ文字列, ミリ秒Unixタイムスタンプ)
+    """
+    if value.endswith("Z") and len(value) >= 20 and value[19] in ".Z":
+        # APIが返すUTCの形式は、isoformat() を呼ばずに文字列を組み立てる
+        played_at = datetime.fromisoformat(value[:-1] + "+00:00")
+        micro = played_at.microsecond
+        iso = f"{value[:19]}.{micro:06d}+00:00" if micro else f"{value[:19]}+00:00"
+    else:
+        played_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        iso = played_at.isoformat()
+    return iso, int(played_at.timestamp() * 1000)
+
+
+def dump_external_urls(urls: Dict[str, str]) -> str:
+    """external_urls を json.dumps と同じ文字列にする（{"spotify": ...} だけの場合は直接組み立てる）"""
+    if len(urls) == 1 and type(urls.get("spotify")) is str:
+        return '{"spotify": ' + encode_basestring_ascii(urls["spotify"]) + "}"
+    return json.dumps(urls)
+
+
+class PlayRecord(NamedTuple):
+    """1回分の再生（spotify_logs の1行から saved_at を除いたもの）"""
+
+    track_name: str
+    artist_name: str
+    played_at: str
+    played_at_ms: int
+    track_id: str
+    artist_id: str
+    album_name: str
+    album_id: str
+    duration_ms: int
+    popularity: int | None
+    external_urls: str
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> "PlayRecord":
+        """
+        recently-playedのアイテムをレコードに変換する
+
+        Args:
+            item: recently-playedのアイテム
+
+        Returns:
+            再生レコード
+        """
+        track = item["track"]
+        artist = track["artists"][0]
+        album = track["album"]
+        played_at, played_at_ms = parse_played_at(item["played_at"])
+        return cls(
+            track["name"],
+            artist["name"],
+            played_at,
+            played_at_ms,
+            track["id"],
+            artist["id"],
+            album["name"],
+            album["id"],
+            track["duration_ms"],
+            track.get("popularity"),
+            dump_external_urls(track["external_urls"]),
+        )
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "PlayRecord":
+        """
+        CSV形式の行（FIELDNAMES をキーに持つ辞書）をレコードに変換する
+
+        Args:
+            row: CSVやストレージから読み出した行
+
+        Returns:
+            再生レコード
+        """
+        played_at, played_at_ms = parse_played_at(row["played_at"])
+        popularity = row["popularity"]
+        return cls(
+            row["track_name"],
+            row["artist_name"],
+            played_at,
+            played_at_ms,
+            row["track_id"],
+            row["artist_id"],
+            row["album_name"],
+            row["album_id"],
+            int(row["duration_ms"]),
+            int(popularity) if popularity not in ("", None) else None,
+            row["external_urls"],
+        )
+
+    def to_row(self, saved_at: str) -> Dict[str, Any]:
+        """
+        CSVの1行（FIELDNAMES をキーに持つ辞書）に変換する
+
+        Args:
+            saved_at: 保存日時（ISO形式）
+
+        Returns:
+            CSVの1行。popularity がない場合は空文字
+        """
+        return {
+            "track_name": self.track_name,
+            "artist_name": self.artist_name,
+            "played_at": self.played_at,
+            "saved_at": saved_at,
+            "track_id": self.track_id,
+            "artist_id": self.artist_id,
+            "album_name": self.album_name,
+            "album_id": self.album_id,
+            "duration_ms": self.duration_ms,
+            "popularity": "" if self.popularity is None else self.popularity,
+            "external_urls": self.external_urls,
+        }
+
+
+def as_records(tracks: Iterable[Any]) -> List[PlayRecord]:
+    """
+    save_tracks の引数をレコードのリストにそろえる（APIのアイテムのままなら変換する）
+
+    Args:
+        tracks: PlayRecord、またはrecently-playedのアイテム
+
+    Returns:
+        再生レコードのリスト
+    """
+    return [t if isinstance(t, PlayRecord) else PlayRecord.from_item(t) for t in tracks]
@@ -0,0 +1,316 @@
+"""
+モジュール: storage/spool.py
+ストレージへの書き込み前に、取得した再生レコードをローカルに記録する追記専用のスプール（先行書き込みログ）。
+エントリはバックエンドのコミット後にだけ確認応答（ack）し、未確認のエントリは次のサイクルでまとめて再送する。
+"""
+
+import json
+import os
+import struct
+import zlib
+from datetime import datetime, timezone
+from typing import Iterator, List, Tuple
+from .base_storage import BaseStorage
+from .play_record import PlayRecord
+
+
+# エントリのヘッダー: ペイロード長, CRC32, エントリID, エントリ内の最大 played_at（ミリ秒）
+HEADER = struct.Struct("<IIQq")
+# CRC32の対象に含めるヘッダーの項目
+CHECKED_FIELDS = struct.Struct("<Qq")
+SEGMENT_SUFFIX = ".wal"
+ACK_FILE = "ack"
+
+
+def _checksum(entry_id: int, max_played_at_ms: int, payload: bytes) -> int:
+    return zlib.crc32(payload, zlib.crc32(CHECKED_FIELDS.pack(entry_id, max_played_at_ms)))
+
+
+def _scan(path: str) -> Iterator[Tuple[int, int, int, bytes]]:
+    """
+    セグメントのエントリを先頭から読む（途中で書き込みが切れたエントリの手前で止まる）
+
+    Yields:
+        (エントリの終端オフセット, エントリID, 最大 played_at（ミリ秒）, ペイロード)
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos + HEADER.size <= len(data):
+        length, crc, entry_id, max_ms = HEADER.unpack_from(data, pos)
+        end = pos + HEADER.size + length
+        if end > len(data):
+            return
+        payload = data[pos + HEADER.size:end]
+        if _checksum(entry_id, max_ms, payload) != crc:
+            return
+        yield end, entry_id, max_ms, payload
+        pos = end
+
+
+def _fsync_directory(directory: str) -> None:
+    """ファイルの作成・削除・置き換えをディレクトリに永続化する（対応していないOSでは何もしない）"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class WriteAheadSpool:
+    """
+    セグメントに分けた追記専用のジャーナル
+
+    エントリは1ページ分の再生レコードで、IDは1から単調に増える。確認済みのIDは ack ファイルに
+    最大値だけを記録し、確認済みのエントリしか含まないセグメントはコンパクションで削除する。
+    """
+
+    def __init__(
+        self,
+        directory: str = "spotify_spool",
+        segment_bytes: int = 1024 * 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        sync_every: int = 1,
+    ):
+        """
+        スプールを開き、前回の書き込みが途中で切れていれば切り詰める
+
+        Args:
+            directory: セグメントと ack ファイルを置くディレクトリ
+            segment_bytes: 1セグメントの最大バイト数（超えると次のセグメントに切り替える）
+            max_bytes: スプール全体の最大バイト数（超えると古いセグメントから破棄する）
+            sync_every: fsyncせずに追記できるエントリ数（sync() を呼べばいつでもfsyncする）
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.sync_every = sync_every
+        os.makedirs(directory, exist_ok=True)
+
+        self.acked = self._read_ack()
+        self.next_id = self.acked + 1
+        # [先頭のエントリID, パス, 有効なバイト数]
+        self.segments: List[list] = []
+        self._file = None
+        self._unsynced = 0
+        self._recover()
+
+    def append(self, records: List[PlayRecord]) -> int:
+        """
+        レコードを1エントリとして追記する
+
+        Args:
+            records: 1ページ分の再生レコード
+
+        Returns:
+            追記したエントリのID（ack() に渡す）
+        """
+        entry_id = self.next_id
+        max_ms = max(record.played_at_ms for record in records)
+        payload = json.dumps(records, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        data = HEADER.pack(len(payload), _checksum(entry_id, max_ms, payload), entry_id, max_ms) + payload
+
+        segment = self.segments[-1] if self.segments else None
+        if segment is None or (segment[2] > 0 and segment[2] + len(data) > self.segment_bytes):
+            segment = self._rotate(entry_id)
+        elif self._file is None:
+            self._file = open(segment[1], "ab")
+
+        self._file.write(data)
+        segment[2] += len(data)
+        self.next_id += 1
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+        self._enforce_limit()
+        return entry_id
+
+    def sync(self) -> None:
+        """未同期の追記をfsyncする"""
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def ack(self, entry_id: int) -> None:
+        """
+        entry_id までのエントリがバックエンドにコミットされたことを記録し、不要になったセグメントを削除する
+
+        Args:
+            entry_id: コミット済みの最後のエントリID
+        """
+        if entry_id <= self.acked:
+            return
+        self.acked = entry_id
+        self._write_ack()
+        self.compact()
+
+    def pending(self) -> Iterator[Tuple[int, List[PlayRecord]]]:
+        """
+        未確認のエントリを古い順に返す
+
+        Yields:
+            (エントリID, 再生レコードのリスト)
+        """
+        self.sync()
+        for _first_id, path, _size in list(self.segments):
+            for _end, entry_id, _max_ms, payload in _scan(path):
+                if entry_id > self.acked:
+                    yield entry_id, [PlayRecord(*row) for row in json.loads(payload)]
+
+    def pending_count(self) -> int:
+        """未確認のエントリ数を返す"""
+        return self.next_id - 1 - self.acked
+
+    def last_played_at(self) -> datetime | None:
+        """
+        未確認のエントリに含まれる最新の played_at を返す（ヘッダーだけを読む）
+
+        Returns:
+            最新の再生日時、または未確認のエントリがない場合はNone
+        """
+        if not self.pending_count():
+            return None
+        if self._file is not None:
+            self._file.flush()
+        latest = None
+        for _first_id, path, _size in self.segments:
+            for _end, entry_id, max_ms, _payload in _scan(path):
+                if entry_id > self.acked and (latest is None or max_ms > latest):
+                    latest = max_ms
+        if latest is None:
+            return None
+        return datetime.fromtimestamp(latest / 1000, tz=timezone.utc)
+
+    def replay(self, storage: BaseStorage, batch_size: int = 5000) -> int:
+        """
+        未確認のエントリをまとめてストレージに保存し、保存できた分を確認済みにする
+
+        追記専用のストレージ（idempotent_writes がFalse）では、保存後・確認前に止まったエントリを
+        もう一度追記しないよう、ストレージの最後の played_at 以前のレコードを除いて保存する。
+
+        Args:
+            storage: 保存先のストレージ
+            batch_size: 1回の save_tracks に渡すおおよそのレコード数（エントリの境界で区切る）
+
+        Returns:
+            再送したレコード数。保存に失敗した場合は例外をそのまま送出する
+        """
+        saved_ms = None
+        if not storage.idempotent_writes:
+            last_saved = storage.get_last_saved_timestamp()
+            if last_saved is not None:
+                saved_ms = int(last_saved.timestamp() * 1000)
+
+        replayed = 0
+        skipped = 0
+        batch: List[PlayRecord] = []
+        last_id = None
+        for entry_id, records in self.pending():
+            if saved_ms is not None:
+                kept = [record for record in records if record.played_at_ms > saved_ms]
+                skipped += len(records) - len(kept)
+                records = kept
+            batch.extend(records)
+            last_id = entry_id
+            if len(batch) >= batch_size:
+                storage.save_tracks(batch)
+                self.ack(last_id)
+                replayed += len(batch)
+                batch = []
+        if batch:
+            storage.save_tracks(batch)
+            replayed += len(batch)
+        if last_id is not None:
+            self.ack(last_id)
+        if skipped:
+            print(f"⚠️ : Skipped {skipped} spooled tracks already in {storage.__class__.__name__}")
+        return replayed
+
+    def compact(self) -> None:
+        """確認済みのエントリしか含まないセグメントを削除する"""
+        removed = False
+        while self.segments:
+            last_id = (self.segments[1][0] if len(self.segments) > 1 else self.next_id) - 1
+            if last_id > self.acked:
+                break
+            if len(self.segments) == 1 and self._file is not None:
+                self._file.close()
+                self._file = None
+                self._unsynced = 0
+            os.remove(self.segments.pop(0)[1])
+            removed = True
+        if removed:
+            _fsync_directory(self.directory)
+
+    def size(self) -> int:
+        """スプールのセグメントの合計バイト数を返す"""
+        return sum(segment[2] for segment in self.segments)
+
+    def close(self) -> None:
+        """未同期の追記をfsyncしてセグメントを閉じる"""
+        self.sync()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _recover(self) -> None:
+        """既存のセグメントを読み、次のエントリIDを求めて途中で切れた末尾を切り詰める"""
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        for name in names:
+            path = os.path.join(self.directory, name)
+            valid_end = 0
+            for end, entry_id, _max_ms, _payload in _scan(path):
+                valid_end = end
+                self.next_id = max(self.next_id, entry_id + 1)
+            size = os.path.getsize(path)
+            if valid_end < size:
+                print(f"⚠️ : Truncating {size - valid_end} bytes of incomplete spool entries in {path}")
+                with open(path, "r+b") as f:
+                    f.truncate(valid_end)
+                    os.fsync(f.fileno())
+            self.segments.append([int(name[:-len(SEGMENT_SUFFIX)]), path, valid_end])
+        self.compact()
+
+    def _rotate(self, first_id: int) -> list:
+        """現在のセグメントを閉じ、first_id から始まる新しいセグメントを開く"""
+        self.close()
+        path = os.path.join(self.directory, f"{first_id:020d}{SEGMENT_SUFFIX}")
+        self._file = open(path, "ab")
+        _fsync_directory(self.directory)
+        segment = [first_id, path, 0]
+        self.segments.append(segment)
+        return segment
+
+    def _enforce_limit(self) -> None:
+        """合計サイズが max_bytes を超えたら、最新のセグメントを残して古いものから破棄する"""
+        while len(self.segments) > 1 and self.size() > self.max_bytes:
+            last_id = self.segments[1][0] - 1
+            dropped = last_id - max(self.acked, self.segments[0][0] - 1)
+            if dropped > 0:
+                print(f"⚠️ : Spool exceeded {self.max_bytes} bytes, dropping {dropped} unacknowledged entries")
+            self.acked = max(self.acked, last_id)
+            self._write_ack()
+            self.compact()
+
+    def _read_ack(self) -> int:
+        try:
+            with open(os.path.join(self.directory, ACK_FILE), "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_ack(self) -> None:
+        """確認済みの最大エントリIDを一時ファイル経由で原子的に置き換える"""
+        path = os.path.join(self.directory, ACK_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(self.acked))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
@@ -0,0 +1,376 @@
+"""
+モジュール: storage/sqlite_storage.py
+Spotifyトラックデータ用の組み込みSQLiteストレージ実装。
+READMEのSupabaseスキーマと同じ列・一意制約・インデックスを持ち、オフライン実行やテストでの代替になる。
+"""
+
+import sqlite3
+from datetime import datetime, timezone
+from typing import Iterator, List, Dict, Any
+from .base_storage import BaseStorage
+from .play_record import PlayRecord, as_records
+from .aggregates import percentage
+
+
+# played_at / saved_at はインデックスで正しく並ぶようにミリ秒Unixタイムスタンプで保存する
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spotify_logs (
+    id INTEGER PRIMARY KEY,
+    track_name TEXT NOT NULL,
+    artist_name TEXT NOT NULL,
+    played_at INTEGER NOT NULL,
+    saved_at INTEGER NOT NULL,
+    track_id TEXT NOT NULL,
+    artist_id TEXT NOT NULL,
+    album_name TEXT NOT NULL,
+    album_id TEXT NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    popularity INTEGER,
+    external_urls TEXT,
+    CONSTRAINT spotify_logs_track_played_key UNIQUE (track_id, played_at)
+);
+CREATE INDEX IF NOT EXISTS idx_spotify_logs_played_at_desc ON spotify_logs(played_at DESC);
+CREATE INDEX IF NOT EXISTS idx_spotify_logs_track_id ON spotify_logs(track_id);
+CREATE INDEX IF NOT EXISTS idx_spotify_logs_artist_id ON spotify_logs(artist_id);
+"""
+
+# 保存のたびにトリガーで差分更新する集計テーブル（INSERT OR IGNORE で無視された行は数えない）
+AGGREGATE_TABLES = """
+CREATE TABLE IF NOT EXISTS track_stats (
+    track_name TEXT NOT NULL,
+    artist_name TEXT NOT NULL,
+    album_name TEXT NOT NULL,
+    external_urls TEXT NOT NULL,
+    play_count INTEGER NOT NULL,
+    popularity_sum INTEGER NOT NULL,
+    popularity_count INTEGER NOT NULL,
+    total_duration_ms INTEGER NOT NULL,
+    last_played INTEGER NOT NULL,
+    PRIMARY KEY (track_name, artist_name, album_name, external_urls)
+);
+CREATE INDEX IF NOT EXISTS idx_track_stats_play_count ON track_stats(play_count DESC);
+
+CREATE TABLE IF NOT EXISTS artist_stats (
+    artist_name TEXT NOT NULL,
+    artist_id TEXT NOT NULL,
+    play_count INTEGER NOT NULL,
+    unique_tracks INTEGER NOT NULL,
+    total_duration_ms INTEGER NOT NULL,
+    last_played INTEGER NOT NULL,
+    PRIMARY KEY (artist_name, artist_id)
+);
+CREATE INDEX IF NOT EXISTS idx_artist_stats_play_count ON artist_stats(play_count DESC);
+
+CREATE TABLE IF NOT EXISTS artist_tracks (
+    artist_name TEXT NOT NULL,
+    artist_id TEXT NOT NULL,
+    track_id TEXT NOT NULL,
+    PRIMARY KEY (artist_name, artist_id, track_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS log_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_plays INTEGER NOT NULL,
+    total_duration_ms INTEGER NOT NULL
+);
+"""
+
+AGGREGATE_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS spotify_logs_aggregate AFTER INSERT ON spotify_logs
+BEGIN
+    INSERT INTO track_stats VALUES (
+        NEW.track_name, NEW.artist_name, NEW.album_name, COALESCE(NEW.external_urls, ''),
+        1, COALESCE(NEW.popularity, 0), NEW.popularity IS NOT NULL, NEW.duration_ms, NEW.played_at
+    )
+    ON CONFLICT (track_name, artist_name, album_name, external_urls) DO UPDATE SET
+        play_count = play_count + 1,
+        popularity_sum = popularity_sum + excluded.popularity_sum,
+        popularity_count = popularity_count + excluded.popularity_count,
+        total_duration_ms = total_duration_ms + excluded.total_duration_ms,
+        last_played = MAX(last_played, excluded.last_played);
+
+    INSERT OR IGNORE INTO artist_tracks VALUES (NEW.artist_name, NEW.artist_id, NEW.track_id);
+    INSERT INTO artist_stats VALUES (NEW.artist_name, NEW.artist_id, 1, 0, NEW.duration_ms, NEW.played_at)
+    ON CONFLICT (artist_name, artist_id) DO UPDATE SET
+        play_count = play_count + 1,
+        total_duration_ms = total_duration_ms + excluded.total_duration_ms,
+        last_played = MAX(last_played, excluded.last_played);
+    UPDATE artist_stats SET unique_tracks = (
+        SELECT COUNT(*) FROM artist_tracks WHERE artist_name = NEW.artist_name AND artist_id = NEW.artist_id
+    ) WHERE artist_name = NEW.artist_name AND artist_id = NEW.artist_id;
+
+    INSERT INTO log_totals VALUES (1, 1, NEW.duration_ms)
+    ON CONFLICT (id) DO UPDATE SET
+        total_plays = total_plays + 1,
+        total_duration_ms = total_duration_ms + excluded.total_duration_ms;
+END;
+"""
+
+AGGREGATE_SCHEMA = AGGREGATE_TABLES + AGGREGATE_TRIGGER
+
+# 集計テーブルをログ全体から作り直すSQL
+REBUILD_AGGREGATES = """
+DELETE FROM track_stats;
+DELETE FROM artist_stats;
+DELETE FROM artist_tracks;
+DELETE FROM log_totals;
+INSERT INTO track_stats
+    SELECT track_name, artist_name, album_name, COALESCE(external_urls, ''), COUNT(*),
+           COALESCE(SUM(popularity), 0), COUNT(popularity), SUM(duration_ms), MAX(played_at)
+    FROM spotify_logs GROUP BY 1, 2, 3, 4;
+INSERT INTO artist_tracks SELECT DISTINCT artist_name, artist_id, track_id FROM spotify_logs;
+INSERT INTO artist_stats
+    SELECT artist_name, artist_id, COUNT(*), COUNT(DISTINCT track_id), SUM(duration_ms), MAX(played_at)
+    FROM spotify_logs GROUP BY artist_name, artist_id;
+INSERT INTO log_totals SELECT 1, COUNT(*), COALESCE(SUM(duration_ms), 0) FROM spotify_logs;
+"""
+
+COLUMNS = [
+    "track_name", "artist_name", "played_at", "saved_at", "track_id", "artist_id",
+    "album_name", "album_id", "duration_ms", "popularity", "external_urls",
+]
+
+
+def _iso(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).isoformat()
+
+
+class SQLiteStorage(BaseStorage):
+    """Spotifyトラックデータ用のSQLiteストレージ"""
+
+    # (track_id, played_at) の一意制約で重複を無視する
+    idempotent_writes = True
+    # 作成するスキーマと、再生ごとに1行を持つテーブル（サブクラスで置き換える）
+    schemas = (SCHEMA, AGGREGATE_SCHEMA)
+    log_table = "spotify_logs"
+
+    def __init__(self, db_path: str = "spotify_logs.db"):
+        """
+        SQLiteストレージを初期化し、スキーマを作成する
+
+        Args:
+            db_path: データベースファイルのパス（":memory:" でインメモリ）
+        """
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # WALではNORMALでもコミット済みのデータは壊れない
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for schema in self.schemas:
+            self.conn.executescript(schema)
+        # 集計テーブルより前に保存された行があれば集計を作り直す
+        if self.conn.execute("SELECT 1 FROM log_totals").fetchone() is None and \
+                self.conn.execute(f"SELECT 1 FROM {self.log_table} LIMIT 1").fetchone() is not None:
+            self.rebuild_aggregates()
+
+    def save_tracks(self, tracks: List[PlayRecord | Dict[str, Any]]) -> None:
+        """
+        トラックを1トランザクションで一括挿入する（既存の (track_id, played_at) は無視）
+
+        集計テーブルはトリガーにより同じトランザクション内で更新される。
+
+        Args:
+            tracks: 保存する再生レコード（APIのアイテムも可）
+        """
+        if not tracks:
+            return
+
+        saved_at = int(datetime.now(timezone.utc).timestamp() * 1000)
+        rows = [
+            (
+                r.track_name, r.artist_name, r.played_at_ms, saved_at, r.track_id, r.artist_id,
+                r.album_name, r.album_id, r.duration_ms, r.popularity, r.external_urls,
+            )
+            for r in as_records(tracks)
+        ]
+
+        with self.conn:
+            # rowcount はトリガーによる集計テーブルの変更を含まない
+            inserted = self.conn.executemany(
+                f"INSERT OR IGNORE INTO spotify_logs ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                rows,
+            ).rowcount
+
+        print(f"✅ : {inserted} tracks saved to {self.db_path} ({len(rows) - inserted} duplicates skipped)")
+
+    def get_last_saved_timestamp(self) -> datetime | None:
+        """
+        最後に保存されたトラックのタイムスタンプを played_at のインデックスから取得する
+
+        Returns:
+            最後に保存されたトラックの日時、またはトラックが保存されていない場合はNone
+        """
+        latest = self._edge_played_at("DESC")
+        if latest is None:
+            return None
+        return datetime.fromtimestamp(latest / 1000, tz=timezone.utc)
+
+    def get_first_saved_timestamp(self) -> datetime | None:
+        """
+        最も古いトラックのタイムスタンプを played_at のインデックスから取得する
+
+        Returns:
+            最も古いトラックの日時、またはトラックが保存されていない場合はNone
+        """
+        earliest = self._edge_played_at("ASC")
+        if earliest is None:
+            return None
+        return datetime.fromtimestamp(earliest / 1000, tz=timezone.utc)
+
+    def is_available(self) -> bool:
+        """
+        データベースに接続できるかチェックする
+
+        Returns:
+            ストレージが利用可能な場合はTrue、そうでなければFalse
+        """
+        try:
+            self.conn.execute(f"SELECT 1 FROM {self.log_table} LIMIT 1").fetchall()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _edge_played_at(self, order: str) -> int | None:
+        """played_at のインデックスの端（"ASC" で最も古い、"DESC" で最も新しい）の値を返す"""
+        row = self.conn.execute(
+            f"SELECT played_at FROM {self.log_table} ORDER BY played_at {order} LIMIT 1"
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        テーブルを走査せずに統計情報を取得する
+
+        行数はトリガーで更新される log_totals から、最初と最後の played_at はインデックスの端から読む。
+
+        Returns:
+            テーブル統計情報の辞書
+        """
+        totals = self.conn.execute("SELECT total_plays FROM log_totals").fetchone()
+        count = totals[0] if totals is not None else 0
+        first = self._edge_played_at("ASC")
+        last = self._edge_played_at("DESC")
+        return {
+            "available": True,
+            "count": count,
+            "first_played_at": _iso(first) if first is not None else None,
+            "last_played_at": _iso(last) if last is not None else None,
+            "table": self.log_table,
+            "db_path": self.db_path,
+        }
+
+    def query(self, start: datetime | None = None, end: datetime | None = None) -> Iterator[Dict[str, Any]]:
+        """
+        played_at が [start, end) の範囲の行を古い順に返す
+
+        Args:
+            start: 範囲の開始（含む、省略時は最初から）
+            end: 範囲の終了（含まない、省略時は最後まで）
+
+        Yields:
+            CSVと同じ列名を持つ行
+        """
+        start_ms = int(start.timestamp() * 1000) if start else -(2 ** 63)
+        end_ms = int(end.timestamp() * 1000) if end else 2 ** 63 - 1
+        cursor = self.conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM spotify_logs "
+            "WHERE played_at >= ? AND played_at < ? ORDER BY played_at",
+            (start_ms, end_ms),
+        )
+        for values in cursor:
+            row = dict(zip(COLUMNS, values))
+            row["played_at"] = _iso(row["played_at"])
+            row["saved_at"] = _iso(row["saved_at"])
+            yield row
+
+    def track_ranking(self, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        集計テーブルから再生数の多いトラックを返す（play_count のインデックスで上位だけを読む）
+
+        Args:
+            limit: 返す最大件数（省略時はすべて）
+
+        Returns:
+            track_ranking ビューと同じ形式の行のリスト
+        """
+        cursor = self.conn.execute(
+            "SELECT track_name, artist_name, album_name, play_count, popularity_sum, popularity_count, "
+            "total_duration_ms, last_played, external_urls FROM track_stats ORDER BY play_count DESC LIMIT ?",
+            (-1 if limit is None else limit,),
+        )
+        return [
+            {
+                "track_name": name,
+                "artist_name": artist,
+                "album_name": album,
+                "play_count": plays,
+                "avg_popularity": popularity_sum / popularity_count if popularity_count else None,
+                "total_duration_ms": duration,
+                "last_played": _iso(last),
+                "external_urls": urls,
+            }
+            for name, artist, album, plays, popularity_sum, popularity_count, duration, last, urls in cursor
+        ]
+
+    def artist_distribution(self, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        集計テーブルから再生数の多いアーティストを返す
+
+        Args:
+            limit: 返す最大件数（省略時はすべて）
+
+        Returns:
+            artist_distribution ビューの列と last_played を持つ行のリスト
+        """
+        totals = self.conn.execute("SELECT total_plays FROM log_totals").fetchone()
+        total_plays = totals[0] if totals is not None else 0
+        if not total_plays:
+            return []
+        cursor = self.conn.execute(
+            "SELECT artist_name, artist_id, play_count, unique_tracks, total_duration_ms, last_played "
+            "FROM artist_stats ORDER BY play_count DESC LIMIT ?",
+            (-1 if limit is None else limit,),
+        )
+        return [
+            {
+                "artist_name": name,
+                "artist_id": artist_id,
+                "play_count": plays,
+                "percentage": percentage(plays, total_plays),
+                "unique_tracks": unique_tracks,
+                "total_duration_ms": duration,
+                "last_played": _iso(last),
+            }
+            for name, artist_id, plays, unique_tracks, duration, last in cursor
+        ]
+
+    def rebuild_aggregates(self) -> None:
+        """集計テーブルを spotify_logs 全体から1トランザクションで作り直す"""
+        with self.conn:
+            for statement in REBUILD_AGGREGATES.strip().split(";"):
+                if statement.strip():
+                    self.conn.execute(statement)
+        (total,) = self.conn.execute("SELECT total_plays FROM log_totals").fetchone()
+        print(f"✅ : Aggregates rebuilt from {total} rows in {self.db_path}")
+
+    def deduplicate(self, batch_size: int = 100_000) -> Dict[str, Any]:
+        """
+        一意制約により (track_id, played_at) の重複は保存されないため、行数だけを返す
+
+        Args:
+            batch_size: 使用しない（他のバックエンドとの互換のため）
+
+        Returns:
+            行数と除いた重複数（常に0）
+        """
+        (rows,) = self.conn.execute(f"SELECT COUNT(*) FROM {self.log_table}").fetchone()
+        print(f"✅ : {self.db_path} has a unique constraint on (track_id, played_at), nothing to remove")
+        return {"rows": rows, "duplicates": 0}
+
+    def close(self) -> None:
+        """WALをチェックポイントして接続を閉じる"""
+        try:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            self.conn.close()
@@ -4,24 +4,66 @@ Spotifyトラックデータ用のSupabaseストレージ実装。
 """
 
 import os
+import time
 from datetime import datetime, timezone
-from typing import List, Dict, Any
+from typing import Iterator, List, Dict, Any
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
+from postgrest.types import CountMethod, ReturnMethod
 from .base_storage import BaseStorage
+from .aggregates import percentage
+from .play_record import PlayRecord, as_records, parse_played_at
+from metrics.metrics import get_metrics
 import json
 
 
+# 一意制約 (track_id, played_at) に対応する競合キー
+CONFLICT_COLUMNS = "track_id,played_at"
+
+# 読み出しで取得する列（csv_storage.FIELDNAMES と同じ順序）
+SELECT_COLUMNS = [
+    "track_name", "artist_name", "played_at", "saved_at", "track_id", "artist_id",
+    "album_name", "album_id", "duration_ms", "popularity", "external_urls",
+]
+
+
 class SupabaseStorage(BaseStorage):
     """Spotifyトラックデータ用のSupabaseストレージ"""
 
-    def __init__(self, supabase_url: str | None = None, supabase_key: str | None = None):
+    # (track_id, played_at) をキーにupsertする
+    idempotent_writes = True
+
+    def __init__(
+        self,
+        supabase_url: str | None = None,
+        supabase_key: str | None = None,
+        batch_size: int = 500,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        stats_ttl: float = 300.0,
+    ):
         """
         Supabaseストレージを初期化する
 
         Args:
             supabase_url: SupabaseプロジェクトURL（提供されない場合は環境変数を使用）
             supabase_key: Supabase匿名キー（提供されない場合は環境変数を使用）
+            batch_size: 1回のupsertリクエストで送信する最大行数
+            max_retries: チャンクごとの最大試行回数
+            retry_backoff: リトライ時の初回待機秒数（試行ごとに倍増）
+            stats_ttl: 統計情報（ヘルスチェックを兼ねる）をキャッシュする秒数
         """
+        if batch_size < 1:
+            raise ValueError("batch_sizeは1以上である必要があります")
+
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.stats_ttl = stats_ttl
+        self._stats: Dict[str, Any] | None = None
+        self._stats_at = 0.0
+        self._available_at = float("-inf")
+        self._stats_rpc = True
         self.supabase_url = supabase_url or os.environ.get("SUPABASE_URL")
         self.supabase_key = supabase_key or os.environ.get("SUPABASE_KEY")
 
@@ -30,40 +72,204 @@ class SupabaseStorage(BaseStorage):
 
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
 
-    def save_tracks(self, tracks: List[Dict[str, Any]]) -> None:
+    def save_tracks(self, tracks: List[PlayRecord | Dict[str, Any]]) -> None:
         """
         Supabaseにトラックを保存する
 
+        全行を batch_size ごとのチャンクに分け、(track_id, played_at) をキーとした
+        一括upsertで送信する。既存の行は無視されるため、同じ期間を再実行しても
+        重複は作られず、失敗したチャンクは安全に再送できる。
+
         Args:
-            tracks: 保存するトラックデータのリスト
+            tracks: 保存する再生レコード（APIのアイテムも可）
         """
         if not tracks:
             return
 
-        now = datetime.now(timezone.utc)
+        saved_at = datetime.now(timezone.utc).isoformat()
+
+        # 同一バッチ内の重複はキーで畳み込む
+        rows: Dict[tuple, Dict[str, Any]] = {}
+        for record in as_records(tracks):
+            row = record.to_row(saved_at)
+            row["popularity"] = record.popularity or 0
+            rows[(record.track_id, record.played_at_ms)] = row
+
+        batch = list(rows.values())
+        for start in range(0, len(batch), self.batch_size):
+            self._upsert_chunk(batch[start:start + self.batch_size])
+        # 件数は変わったので統計は取得し直すが、書き込めたのでヘルスチェックは省ける
+        self._stats = None
+        self._available_at = time.monotonic()
+
+        print(f"✅ : {len(batch)} tracks saved to Supabase")
+
+    def _upsert_chunk(self, chunk: List[Dict[str, Any]]) -> None:
+        """
+        1チャンクを一括upsertし、失敗時は指数バックオフでリトライする
+
+        Args:
+            chunk: 送信する行のリスト
+        """
+        metrics = get_metrics()
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                with metrics.span("storage_chunk", backend="SupabaseStorage"):
+                    self.supabase.table("spotify_logs").upsert(
+                        chunk,
+                        on_conflict=CONFLICT_COLUMNS,
+                        ignore_duplicates=True,
+                        returning=ReturnMethod.minimal,
+                    ).execute()
+                metrics.count("chunks_written", backend="SupabaseStorage")
+                return
+            except Exception as e:
+                metrics.count("chunk_failures", backend="SupabaseStorage")
+                if attempt >= self.max_retries:
+                    raise
+                wait = self.retry_backoff * (2 ** (attempt - 1))
+                print(f"⚠️ : Upsert of {len(chunk)} rows failed ({e}), retrying in {wait:.1f}s")
+                time.sleep(wait)
+
+    def query(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        page_size: int = 1000,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        played_at が [start, end) の範囲の行を古い順に返す
+
+        OFFSETではなく (played_at, id) のキーセットでページングするため、
+        後ろのページでも played_at のインデックスを使った範囲検索になる。
+
+        Args:
+            start: 範囲の開始（含む、省略時は最初から）
+            end: 範囲の終了（含まない、省略時は最後まで）
+            page_size: 1リクエストで取得する行数
+
+        Yields:
+            CSVと同じ列名を持つ行（external_urls はJSON文字列）
+        """
+        last_played_at = None
+        last_id = None
+        while True:
+            request = self.supabase.table("spotify_logs").select(",".join(["id"] + SELECT_COLUMNS))
+            if last_id is not None:
+                # 前のページの最後の行より後ろ: played_at が大きい、または同じ played_at で id が大きい
+                request = request.or_(
+                    f'played_at.gt."{last_played_at}",'
+                    f'and(played_at.eq."{last_played_at}",id.gt.{last_id})'
+                )
+            elif start is not None:
+                request = request.gte("played_at", start.isoformat())
+            if end is not None:
+                request = request.lt("played_at", end.isoformat())
+            result = request.order("played_at").order("id").limit(page_size).execute()
+
+            rows = result.data or []
+            for row in rows:
+                if not isinstance(row["external_urls"], str):
+                    row["external_urls"] = json.dumps(row["external_urls"])
+                yield {name: row[name] for name in SELECT_COLUMNS}
+
+            if len(rows) < page_size:
+                return
+            last_played_at, last_id = rows[-1]["played_at"], rows[-1]["id"]
+
+    def track_ranking(self, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        集計テーブル track_stats から再生数の多いトラックを返す
+
+        track_stats はREADMEのトリガーで保存のたびに更新されるため、spotify_logs を走査しない。
+
+        Args:
+            limit: 返す最大件数（省略時はすべて）
+
+        Returns:
+            track_ranking ビューと同じ形式の行のリスト
+        """
+        request = self.supabase.table("track_stats").select("*").order("play_count", desc=True)
+        if limit is not None:
+            request = request.limit(limit)
+        return [
+            {
+                "track_name": row["track_name"],
+                "artist_name": row["artist_name"],
+                "album_name": row["album_name"],
+                "play_count": row["play_count"],
+                "avg_popularity": row["popularity_sum"] / row["popularity_count"] if row["popularity_count"] else None,
+                "total_duration_ms": row["total_duration_ms"],
+                "last_played": row["last_played"],
+                "external_urls": row["external_urls"] if isinstance(row["external_urls"], str) else json.dumps(row["external_urls"]),
+            }
+            for row in request.execute().data
+        ]
+
+    def artist_distribution(self, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        集計テーブル artist_stats から再生数の多いアーティストを返す
+
+        Args:
+            limit: 返す最大件数（省略時はすべて）
+
+        Returns:
+            artist_distribution ビューの列と last_played を持つ行のリスト
+        """
+        totals = self.supabase.table("log_totals").select("total_plays").eq("id", 1).execute().data
+        total_plays = totals[0]["total_plays"] if totals else 0
+        if not total_plays:
+            # 空のテーブル（log_totals の行がまだない）では割合を計算できないので何も返さない
+            return []
+        request = self.supabase.table("artist_stats").select("*").order("play_count", desc=True)
+        if limit is not None:
+            request = request.limit(limit)
+        return [
+            {
+                "artist_name": row["artist_name"],
+                "artist_id": row["artist_id"],
+                "play_count": row["play_count"],
+                "percentage": percentage(row["play_count"], total_plays),
+                "unique_tracks": row["unique_tracks"],
+                "total_duration_ms": row["total_duration_ms"],
+                "last_played": row["last_played"],
+            }
+            for row in request.execute().data
+        ]
+
+    def rebuild_aggregates(self) -> None:
+        """READMEの rebuild_spotify_aggregates 関数を呼び、集計テーブルを作り直す"""
+        self.supabase.rpc("rebuild_spotify_aggregates").execute()
+        print("✅ : Aggregates rebuilt in Supabase")
+
+    def deduplicate(self, batch_size: int = 10_000) -> Dict[str, Any]:
+        """
+        READMEの dedupe_spotify_logs 関数を繰り返し呼び、(track_id, played_at) の重複をサーバー側で削除する
 
-        saved_count = 0
-        for item in tracks:
-            track = item["track"]
-            played_at = datetime.fromisoformat(item["played_at"].replace("Z", "+00:00"))
+        1回の呼び出しで削除するのは batch_size 行までなので、大きなテーブルでも長いロックを取らない。
+        重複があった場合は集計テーブルも作り直す。
 
+        Args:
+            batch_size: 1回の呼び出しで削除する最大行数
 
-            self.supabase.table("spotify_logs").insert({
-                "track_name": track["name"],
-                "artist_name": track["artists"][0]["name"],
-                "played_at": played_at.isoformat(),
-                "saved_at": now.isoformat(),
-                "track_id": track["id"],
-                "artist_id": track["artists"][0]["id"],
-                "album_name": track["album"]["name"],
-                "album_id": track["album"]["id"],
-                "duration_ms": track["duration_ms"],
-                "popularity": track.get("popularity", 0),
-                "external_urls": json.dumps(track["external_urls"])
-            }).execute()
-            saved_count += 1
+        Returns:
+            削除した行数と呼び出し回数
+        """
+        removed = 0
+        batches = 0
+        while True:
+            deleted = self.supabase.rpc("dedupe_spotify_logs", {"batch_size": batch_size}).execute().data or 0
+            removed += deleted
+            batches += 1
+            print(f"📊 Batch {batches}: {deleted} duplicates removed")
+            if deleted < batch_size:
+                break
 
-        print(f"✅ : {saved_count} tracks saved to Supabase")
+        self._stats = None
+        if removed:
+            self.rebuild_aggregates()
+        print(f"✅ : {removed} duplicates removed from Supabase")
+        return {"duplicates": removed, "batches": batches}
 
     def get_last_saved_timestamp(self) -> datetime | None:
         """
@@ -84,37 +290,102 @@ class SupabaseStorage(BaseStorage):
             print(f"最後に保存されたタイムスタンプの取得エラー: {e}")
         return None
 
+    def get_first_saved_timestamp(self) -> datetime | None:
+        """
+        最も古いトラックのタイムスタンプを played_at のインデックスから取得する
+
+        Returns:
+            最も古いトラックの日時、またはトラックが保存されていない場合はNone
+        """
+        try:
+            result = self.supabase.table("spotify_logs").select("played_at").order("played_at").limit(1).execute()
+            if result.data:
+                _, played_at_ms = parse_played_at(result.data[0]["played_at"])
+                return datetime.fromtimestamp(played_at_ms / 1000, tz=timezone.utc)
+        except Exception as e:
+            print(f"最も古いタイムスタンプの取得エラー: {e}")
+        return None
+
     def is_available(self) -> bool:
         """
         Supabaseストレージが利用可能かチェックする
 
+        統計の取得を兼ねた1回のリクエストで確認し、stats_ttl 秒以内に統計の取得か書き込みに
+        成功していればリクエストしない。
+
         Returns:
             ストレージが利用可能な場合はTrue、そうでなければFalse
         """
-        try:
-            # 接続性をチェックするためにシンプルなクエリを試行
-            result = self.supabase.table("spotify_logs").select("id").limit(1).execute()
+        if time.monotonic() - self._available_at < self.stats_ttl:
             return True
-        except Exception:
-            return False
+        return self.get_stats()["available"]
 
-    def get_stats(self) -> Dict[str, Any]:
+    def get_stats(self, refresh: bool = False) -> Dict[str, Any]:
         """
-        Supabaseテーブルの統計情報を取得する
+        Supabaseテーブルの統計情報を1回のリクエストで取得する
+
+        READMEの spotify_log_stats 関数（RPC）で、集計テーブルの行数・ユニーク数と played_at の
+        インデックスからの最小・最大を取得する。関数がない場合は件数を推定値（count=estimated）で
+        取得し、最新の played_at だけを1行読む。どちらも spotify_logs の行は転送しない。
+
+        Args:
+            refresh: キャッシュを使わずに取得し直す
 
         Returns:
-            テーブル統計情報の辞書
+            available、count、first_played_at、last_played_at、unique_tracks、unique_artists などの辞書
         """
+        if not refresh and self._stats is not None and time.monotonic() - self._stats_at < self.stats_ttl:
+            return self._stats
+
         try:
-            result = self.supabase.table("spotify_logs").select("*", count="exact").execute()
-            return {
-                "available": True,
-                "count": result.count,
-                "table": "spotify_logs"
-            }
+            stats = self._fetch_stats()
         except Exception as e:
+            self._stats = None
+            self._available_at = float("-inf")
             return {
                 "available": False,
                 "error": str(e)
             }
+        self._stats = stats
+        self._stats_at = self._available_at = time.monotonic()
+        return stats
+
+    def _fetch_stats(self) -> Dict[str, Any]:
+        """統計情報を取得する（RPCがなければ推定件数のリクエストに切り替える）"""
+        if self._stats_rpc:
+            try:
+                data = self.supabase.rpc("spotify_log_stats").execute().data
+            except APIError as e:
+                if str(e.code) not in ("PGRST202", "404"):
+                    raise
+                # 関数が作成されていない
+                self._stats_rpc = False
+            else:
+                count = data.get("total_plays")
+                return {
+                    "available": True,
+                    "table": "spotify_logs",
+                    "count": count if count is not None else data.get("estimated_rows"),
+                    "count_method": "aggregate" if count is not None else "estimated",
+                    "first_played_at": data.get("first_played_at"),
+                    "last_played_at": data.get("last_played_at"),
+                    "unique_tracks": data.get("unique_tracks"),
+                    "unique_artists": data.get("unique_artists"),
+                    "total_duration_ms": data.get("total_duration_ms"),
+                }
+
+        result = (
+            self.supabase.table("spotify_logs")
+            .select("played_at", count=CountMethod.estimated)
+            .order("played_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+        return {
+            "available": True,
+            "table": "spotify_logs",
+            "count": result.count,
+            "count_method": "estimated",
+            "last_played_at": result.data[0]["played_at"] if result.data else None,
+        }
 
@@ -0,0 +1,92 @@
+"""
+モジュール: cmd/analytics/analyze.py
+設定されたストレージの再生履歴から spotify_stats / track_ranking / artist_distribution を集計して表示する。
+Supabaseのビューを使わないため、CSVやParquetなどのローカルストレージでも同じ集計が得られる。
+
+使い方:
+    python cmd/analytics/analyze.py --report tracks --limit 20
+    python cmd/analytics/analyze.py --start 2025-01-01 --end 2026-01-01 --json
+    python cmd/analytics/analyze.py --materialized --report artists
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from main import create_storage_backend  # noqa: E402
+from useCase.analytics import analyze  # noqa: E402
+
+
+def parse_date(value: str) -> datetime:
+    """ISO形式の日付/日時をUTCのdatetimeに変換する（タイムゾーン省略時はUTC）"""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def print_report(report: str, result) -> None:
+    """集計結果を表形式で表示する"""
+    if report == "stats":
+        print("📊 spotify_stats")
+        for key, value in result.items():
+            print(f"  {key}: {value}")
+    elif report == "tracks":
+        print("📊 track_ranking")
+        for rank, row in enumerate(result, 1):
+            print(f"  {rank:>3}. {row['play_count']:>6} plays  {row['track_name']} / {row['artist_name']}")
+    elif report == "artists":
+        print("📊 artist_distribution")
+        for rank, row in enumerate(result, 1):
+            print(f"  {rank:>3}. {row['play_count']:>6} plays  {row['percentage']:>6.2f}%  "
+                  f"{row['unique_tracks']:>4} tracks  {row['artist_name']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--report", default="all", choices=["all", "stats", "tracks", "artists"], help="表示する集計")
+    parser.add_argument("--limit", type=int, default=20, help="ランキングの表示件数")
+    parser.add_argument("--start", type=parse_date, help="集計期間の開始（含む）")
+    parser.add_argument("--end", type=parse_date, help="集計期間の終了（含まない）")
+    parser.add_argument("--batch-size", type=int, default=100_000, help="一度に読み込む行数")
+    parser.add_argument("--json", action="store_true", help="JSONで出力する")
+    parser.add_argument("--materialized", action="store_true",
+                        help="ログを走査せず、保存のたびに更新される集計からランキングだけを読む")
+    args = parser.parse_args()
+
+    reports = ["stats", "tracks", "artists"] if args.report == "all" else [args.report]
+    storage = create_storage_backend()
+    started = time.perf_counter()
+    try:
+        if args.materialized:
+            reports = [report for report in reports if report != "stats"]
+            results = {"tracks": storage.track_ranking, "artists": storage.artist_distribution}
+            output = {report: results[report](args.limit) for report in reports}
+        else:
+            analytics = analyze(storage, args.start, args.end, args.batch_size)
+            results = {
+                "stats": lambda: analytics.spotify_stats(),
+                "tracks": lambda: analytics.track_ranking(args.limit),
+                "artists": lambda: analytics.artist_distribution(args.limit),
+            }
+            output = {report: results[report]() for report in reports}
+    except NotImplementedError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        storage.close()
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+        return
+    for report in reports:
+        print_report(report, output[report])
+    print(f"✅ : Analyzed in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
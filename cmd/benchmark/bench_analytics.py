@@ -0,0 +1,142 @@
+"""
+モジュール: cmd/benchmark/bench_analytics.py
+合成した再生履歴をParquetStorageに書き、useCase.analytics の集計時間とピークメモリを計測する。
+--check を付けると同じデータをSQLiteに入れ、READMEのビューと同じSQLの結果と一致するか確認する。
+
+使い方:
+    python cmd/benchmark/bench_analytics.py --rows 10000000
+    python cmd/benchmark/bench_analytics.py --rows 200000 --check
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from synthetic import make_catalog  # noqa: E402
+from bench_parquet_vs_csv import CATALOG_SIZE, write_parquet  # noqa: E402
+from LogRepository.parquet_storage import ParquetStorage  # noqa: E402
+from LogRepository.sqlite_storage import SCHEMA, COLUMNS  # noqa: E402
+from useCase.analytics import analyze  # noqa: E402
+
+
+# READMEのビューをSQLite向けにしたもの（played_at はミリ秒整数で保存される）
+VIEWS = {
+    "stats": """
+        SELECT COUNT(*) AS total_plays, COUNT(DISTINCT track_id) AS unique_tracks,
+               COUNT(DISTINCT artist_id) AS unique_artists, COUNT(DISTINCT album_id) AS unique_albums,
+               SUM(duration_ms) AS total_duration_ms, AVG(popularity) AS avg_popularity
+        FROM spotify_logs""",
+    "tracks": """
+        SELECT track_name, artist_name, album_name, COUNT(*) AS play_count, AVG(popularity) AS avg_popularity,
+               SUM(duration_ms) AS total_duration_ms, MAX(played_at) AS last_played, external_urls
+        FROM spotify_logs GROUP BY track_name, artist_name, album_name, external_urls""",
+    "artists": """
+        SELECT artist_name, artist_id, COUNT(*) AS play_count,
+               COUNT(*) * 100.0 / SUM(COUNT(*)) OVER() AS percentage,
+               COUNT(DISTINCT track_id) AS unique_tracks, SUM(duration_ms) AS total_duration_ms
+        FROM spotify_logs GROUP BY artist_name, artist_id""",
+}
+
+
+def check_against_sql(storage: ParquetStorage, analytics) -> None:
+    """同じデータをSQLiteに読み込み、ビューのSQLの結果と集計結果を比較する"""
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(SCHEMA)
+    for batch in storage.iter_batches(COLUMNS):
+        table = batch.to_pydict()
+        table["played_at"] = [int(v.timestamp() * 1000) for v in table["played_at"]]
+        table["saved_at"] = [int(v.timestamp() * 1000) for v in table["saved_at"]]
+        conn.executemany(
+            f"INSERT INTO spotify_logs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})",
+            zip(*(table[name] for name in COLUMNS)),
+        )
+
+    cursor = conn.execute(VIEWS["stats"])
+    expected = dict(zip([d[0] for d in cursor.description], cursor.fetchone()))
+    actual = analytics.spotify_stats()
+    assert expected.keys() == actual.keys()
+    for key in expected:
+        assert abs(expected[key] - actual[key]) < 1e-9, (key, expected[key], actual[key])
+
+    tracks = {(r["track_name"], r["artist_name"], r["album_name"], r["external_urls"]): r
+              for r in analytics.track_ranking()}
+    rows = conn.execute(VIEWS["tracks"]).fetchall()
+    assert len(rows) == len(tracks)
+    for name, artist, album, plays, popularity, duration, last, urls in rows:
+        got = tracks[(name, artist, album, urls)]
+        assert (got["play_count"], got["total_duration_ms"]) == (plays, duration)
+        assert abs(got["avg_popularity"] - popularity) < 1e-9
+        assert got["last_played"] == datetime.fromtimestamp(last / 1000, tz=timezone.utc).isoformat()
+
+    artists = {(r["artist_name"], r["artist_id"]): r for r in analytics.artist_distribution()}
+    rows = conn.execute(VIEWS["artists"]).fetchall()
+    assert len(rows) == len(artists)
+    for name, artist_id, plays, percentage, unique_tracks, duration in rows:
+        got = artists[(name, artist_id)]
+        assert (got["play_count"], got["unique_tracks"], got["total_duration_ms"]) == (plays, unique_tracks, duration)
+        assert abs(got["percentage"] - percentage) <= 0.005 + 1e-9
+    conn.close()
+
+
+def run_analysis(directory: str, batch_size: int) -> dict:
+    """別プロセスで集計し、結果の概要とそのプロセスのピークメモリを返す"""
+    storage = ParquetStorage(directory)
+    started = time.perf_counter()
+    analytics = analyze(storage, batch_size=batch_size)
+    ranking = analytics.track_ranking(20)
+    distribution = analytics.artist_distribution()
+    return {
+        "analyze_seconds": time.perf_counter() - started,
+        "plays": analytics.total_plays,
+        "tracks": len(analytics.tracks),
+        "artists": len(distribution),
+        "top_track_plays": ranking[0]["play_count"] if ranking else 0,
+        # ru_maxrss はLinuxではKB単位
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--rows", type=int, default=10_000_000, help="合成する再生数")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="書き込みチャンクの行数")
+    parser.add_argument("--batch-size", type=int, default=250_000, help="集計で一度に読む行数")
+    parser.add_argument("--check", action="store_true", help="SQLでの集計結果と比較する")
+    args = parser.parse_args()
+
+    catalog = make_catalog(n_tracks=CATALOG_SIZE, n_artists=400)
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = os.path.join(tmp, "parquet")
+        storage = ParquetStorage(directory, row_group_size=args.chunk_size)
+        write_seconds = write_parquet(storage, catalog, args.rows, args.chunk_size)
+
+        # 書き込み側のメモリを含めないよう、集計は新しいプロセスで計測する
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = pool.submit(run_analysis, directory, args.batch_size).result()
+
+        if args.check:
+            check_against_sql(storage, analyze(storage, batch_size=args.batch_size))
+            print("✅ : Results match the SQL views")
+
+    results["analyze_seconds"] = round(results["analyze_seconds"], 3)
+    print(json.dumps({
+        "rows": args.rows,
+        "write_seconds": round(write_seconds, 3),
+        "rows_per_second": round(args.rows / results["analyze_seconds"]),
+        **results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+モジュール: cmd/benchmark/bench_csv_range.py
+合成した再生履歴で、CSVStorage の疎インデックスを使った期間指定の読み出しと全行走査を比較する。
+バッチは recently-played API と同じく新しい順に追記し、直近7日間と履歴の途中の1週間を読み出す。
+
+使い方:
+    python cmd/benchmark/bench_csv_range.py --rows 1000000
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from synthetic import generate_plays, make_catalog  # noqa: E402
+from LogRepository.csv_storage import CSVStorage, played_at_to_ms  # noqa: E402
+from LogRepository.play_record import as_records  # noqa: E402
+
+
+def full_scan(path: str, start: datetime, end: datetime) -> int:
+    """インデックスを使わずに全行を読み、範囲内の行数を返す"""
+    start_ms, end_ms = start.timestamp() * 1000, end.timestamp() * 1000
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return sum(1 for row in csv.DictReader(f) if start_ms <= played_at_to_ms(row["played_at"]) < end_ms)
+
+
+def timed(fn, *args) -> tuple:
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="合成する再生数")
+    parser.add_argument("--batch-size", type=int, default=1000, help="1回の save_tracks で保存する件数")
+    args = parser.parse_args()
+
+    catalog = make_catalog(5000, 800)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "spotify_logs.csv")
+        storage = CSVStorage(path)
+        start_ms = 1_420_070_400_000  # 2015-01-01
+        started = time.perf_counter()
+        for seed, offset in enumerate(range(0, args.rows, args.batch_size)):
+            records = as_records(generate_plays(min(args.batch_size, args.rows - offset), start_ms, catalog, seed))
+            start_ms = records[-1].played_at_ms
+            with contextlib.redirect_stdout(io.StringIO()):
+                storage.save_tracks(records[::-1])
+        write_seconds = time.perf_counter() - started
+
+        last = storage.get_last_saved_timestamp()
+        first = storage.get_first_saved_timestamp()
+        middle = first + (last - first) / 2
+        ranges = {
+            "recent_7d": (last - timedelta(days=7), last + timedelta(milliseconds=1)),
+            "middle_7d": (middle, middle + timedelta(days=7)),
+        }
+
+        results = {
+            "rows": args.rows,
+            "file_bytes": os.path.getsize(path),
+            "index_bytes": os.path.getsize(storage.index_file),
+            "write_seconds": round(write_seconds, 3),
+        }
+        for name, (start, end) in ranges.items():
+            # 開き直した状態（インデックス未読み込み）で計測する
+            indexed, indexed_seconds = timed(lambda: sum(1 for _ in CSVStorage(path).query(start, end)))
+            scanned, scan_seconds = timed(full_scan, path, start, end)
+            assert indexed == scanned, (name, indexed, scanned)
+            results[name] = {
+                "rows": indexed,
+                "indexed_seconds": round(indexed_seconds, 4),
+                "full_scan_seconds": round(scan_seconds, 3),
+                "speedup": round(scan_seconds / indexed_seconds, 1),
+            }
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
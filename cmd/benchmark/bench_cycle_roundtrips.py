@@ -0,0 +1,124 @@
+"""
+モジュール: cmd/benchmark/bench_cycle_roundtrips.py
+1回の収集サイクルでSpotifyとSupabase (PostgREST) に送るリクエスト数を、状況ごとに計測する。
+変更前の順序（ヘルスチェック→最終保存日時→取得）と、取得を先に行いカーソルキャッシュを使う順序を比較する。
+
+使い方:
+    python cmd/benchmark/bench_cycle_roundtrips.py --plays 120
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from fake_servers import FakePostgREST, FakeSpotify  # noqa: E402
+from synthetic import generate_plays  # noqa: E402
+from config.config import config_manager  # noqa: E402
+from useCase.auth import SpotifyAuth  # noqa: E402
+from useCase.cursor_cache import CursorCache  # noqa: E402
+from useCase.data_fetcher import SpotifyDataFetcher  # noqa: E402
+from useCase.http_client import HttpClient  # noqa: E402
+from useCase.normalizer import normalize_pages  # noqa: E402
+from useCase.storage_session import StorageSession  # noqa: E402
+import main as app  # noqa: E402
+
+
+def legacy_cycle(fetcher: SpotifyDataFetcher, storage) -> int:
+    """変更前の run_collection_cycle と同じ順序で1サイクルを実行する"""
+    if not storage.is_available():
+        raise RuntimeError("storage is not available")
+    last_saved = storage.get_last_saved_timestamp()
+    since = str(int(last_saved.timestamp() * 1000)) if last_saved else None
+    fetched = 0
+    for records in normalize_pages(fetcher.iter_recent_track_pages(after=since)):
+        storage.save_tracks(records)
+        fetched += len(records)
+    if fetched:
+        storage.get_stats()
+    return fetched
+
+
+def measure(spotify: FakeSpotify, postgrest: FakePostgREST, label: str, fn) -> dict:
+    """1サイクルを実行して各サーバーへのリクエスト数を返す"""
+    spotify.reset_counts()
+    postgrest.reset_counts()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fetched = fn()
+    return {
+        "scenario": label,
+        "tracks": fetched,
+        "spotify_requests": spotify.request_count,
+        "storage_requests": postgrest.request_count,
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--plays", type=int, default=120, help="最初のサイクルで取得する再生数")
+    parser.add_argument("--new-plays", type=int, default=10, help="途中で追加する再生数")
+    args = parser.parse_args()
+
+    history = generate_plays(args.plays + args.new_plays)
+    initial, later = history[:args.plays], history[args.plays:]
+    config_manager.config.spool_dir = None
+    config_manager.config.token_cache_path = None
+
+    results = []
+    with FakeSpotify({"bench-refresh": initial}) as spotify, tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "SPOTIFY_CLIENT_ID": "bench",
+            "SPOTIFY_CLIENT_SECRET": "bench",
+            "SPOTIFY_REFRESH_TOKEN": "bench-refresh",
+            "SPOTIFY_TOKEN_URL": spotify.token_url,
+            "SPOTIFY_API_BASE_URL": spotify.api_base_url,
+        })
+        fetcher = SpotifyDataFetcher(SpotifyAuth(http_client=HttpClient()))
+        fetcher.spotify_auth.token  # トークンの取得は計測に含めない
+
+        for ordering in ("legacy", "fetch_first"):
+            spotify.set_history("bench-refresh", initial)
+            with FakePostgREST() as postgrest:
+                storage_config = {"type": "supabase", "url": postgrest.url, "key": "bench-key", "batch_size": 500}
+                cursors = CursorCache(os.path.join(tmp, f"{ordering}_cursor.json"))
+                if ordering == "legacy":
+                    storage = app.create_storage_backend(storage_config)
+
+                    def cycle():
+                        return legacy_cycle(fetcher, storage)
+                else:
+                    def cycle():
+                        session = StorageSession(
+                            lambda: app.create_storage_backend(storage_config),
+                            cursors, CursorCache.key_for(storage_config),
+                        )
+                        try:
+                            return app.collect_tracks(fetcher, session)
+                        finally:
+                            session.close()
+
+                results.append({"ordering": ordering, **measure(spotify, postgrest, "first_run", cycle)})
+                results.append({"ordering": ordering, **measure(spotify, postgrest, "idle", cycle)})
+                spotify.add_plays("bench-refresh", later)
+                results.append({"ordering": ordering, **measure(spotify, postgrest, "new_plays", cycle)})
+                results.append({"ordering": ordering, **measure(spotify, postgrest, "idle_after_new", cycle)})
+                if ordering == "fetch_first":
+                    os.remove(cursors.path)
+                    results.append({"ordering": ordering, **measure(spotify, postgrest, "idle_cache_miss", cycle)})
+                # どちらの順序でも全再生が1回ずつ保存される
+                assert len(postgrest.rows()) == len(history)
+
+    print(json.dumps({"plays": args.plays, "new_plays": args.new_plays, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+モジュール: cmd/benchmark/bench_fetch_pagination.py
+ローカルのrecently-playedスタブに対して、カーソルをたどる全期間取得を計測する。
+前回の保存以降に limit を超える再生があっても取りこぼさないことを確認できる。
+
+使い方:
+    python cmd/benchmark/bench_fetch_pagination.py --plays 230 --max-pages 3
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from fake_servers import FakeSpotify, _played_ms  # noqa: E402
+from synthetic import generate_plays  # noqa: E402
+from config.config import config_manager  # noqa: E402
+from useCase.auth import SpotifyAuth  # noqa: E402
+from useCase.data_fetcher import SpotifyDataFetcher  # noqa: E402
+from useCase.http_client import HttpClient  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--plays", type=int, default=230, help="前回の保存以降の再生数")
+    parser.add_argument("--limit", type=int, default=50, help="1ページあたりのトラック数")
+    parser.add_argument("--max-pages", type=int, default=None, help="ページ数の上限")
+    parser.add_argument("--max-items", type=int, default=None, help="アイテム数の上限")
+    args = parser.parse_args()
+
+    history = generate_plays(args.plays + 10)
+    since = str(_played_ms(history[9]))
+
+    with FakeSpotify({"bench-refresh": history}) as server:
+        os.environ.update({
+            "SPOTIFY_CLIENT_ID": "bench",
+            "SPOTIFY_CLIENT_SECRET": "bench",
+            "SPOTIFY_REFRESH_TOKEN": "bench-refresh",
+            "SPOTIFY_TOKEN_URL": server.token_url,
+            "SPOTIFY_API_BASE_URL": server.api_base_url,
+        })
+        config_manager.config.token_cache_path = None
+
+        http = HttpClient()
+        fetcher = SpotifyDataFetcher(SpotifyAuth(http_client=http))
+
+        started = time.perf_counter()
+        first_page_at = None
+        pages = 0
+        items = []
+        for page in fetcher.iter_recent_track_pages(
+            after=since, limit=args.limit, max_pages=args.max_pages, max_items=args.max_items
+        ):
+            if first_page_at is None:
+                first_page_at = time.perf_counter() - started
+            pages += 1
+            items.extend(page)
+        elapsed = time.perf_counter() - started
+
+    unique = {(i["track"]["id"], i["played_at"]) for i in items}
+    print(json.dumps({
+        "plays_in_window": args.plays,
+        "pages": pages,
+        "items": len(items),
+        "unique_items": len(unique),
+        "complete": len(unique) == args.plays,
+        "first_page_ms": round((first_page_at or 0) * 1000, 2),
+        "total_ms": round(elapsed * 1000, 2),
+        "http": http.stats(),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+モジュール: cmd/benchmark/bench_metrics_overhead.py
+計測を無効にした場合（NullMetrics）と有効にした場合（Metrics）の、スパン・カウンタ1回あたりのコストを計測する。
+あわせてローカルのSpotifyスタブとSQLiteで1サイクルを実行し、書き出されるメトリクスを表示する。
+
+使い方:
+    python cmd/benchmark/bench_metrics_overhead.py --iterations 1000000 --plays 500
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from fake_servers import FakeSpotify  # noqa: E402
+from synthetic import generate_plays  # noqa: E402
+from config.config import config_manager  # noqa: E402
+from metrics.metrics import Metrics, NullMetrics, configure_metrics  # noqa: E402
+from useCase.auth import SpotifyAuth  # noqa: E402
+from useCase.data_fetcher import SpotifyDataFetcher  # noqa: E402
+from useCase.storage_session import StorageSession  # noqa: E402
+import main as app  # noqa: E402
+
+
+def per_call_ns(metrics, iterations: int) -> dict:
+    """span と count を iterations 回呼び、1回あたりのナノ秒を返す"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        with metrics.span("fetch_page"):
+            pass
+    span_ns = (time.perf_counter() - started) / iterations * 1e9
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        metrics.count("rows_written", 50, backend="SQLiteStorage")
+    count_ns = (time.perf_counter() - started) / iterations * 1e9
+
+    return {"span_ns": round(span_ns, 1), "count_ns": round(count_ns, 1)}
+
+
+def run_cycle(spotify: FakeSpotify, plays, db_path: str) -> float:
+    """スタブに再生履歴を入れ直し、SQLiteへの1サイクルを実行して秒数を返す"""
+    spotify.set_history("bench-refresh", plays)
+    storage_config = {"type": "sqlite", "path": db_path}
+    fetcher = SpotifyDataFetcher(SpotifyAuth())
+    session = StorageSession(lambda: app.create_storage_backend(storage_config))
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            app.collect_tracks(fetcher, session)
+        finally:
+            session.close()
+            fetcher.http.close()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--iterations", type=int, default=1_000_000, help="スパン・カウンタの呼び出し回数")
+    parser.add_argument("--plays", type=int, default=500, help="1サイクルで取得する再生数")
+    args = parser.parse_args()
+
+    config_manager.config.spool_dir = None
+    config_manager.config.token_cache_path = None
+    config_manager.config.cursor_cache_path = None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            "iterations": args.iterations,
+            "null": per_call_ns(NullMetrics(), args.iterations),
+            "enabled": per_call_ns(Metrics(os.path.join(tmp, "micro.jsonl")), args.iterations),
+        }
+
+        plays = generate_plays(args.plays)
+        metrics_path = os.path.join(tmp, "cycle.jsonl")
+        with FakeSpotify({"bench-refresh": plays}) as spotify:
+            os.environ.update({
+                "SPOTIFY_CLIENT_ID": "bench",
+                "SPOTIFY_CLIENT_SECRET": "bench",
+                "SPOTIFY_REFRESH_TOKEN": "bench-refresh",
+                "SPOTIFY_TOKEN_URL": spotify.token_url,
+                "SPOTIFY_API_BASE_URL": spotify.api_base_url,
+            })
+            configure_metrics(None)
+            null_seconds = run_cycle(spotify, plays, os.path.join(tmp, "null.db"))
+            metrics = configure_metrics(metrics_path)
+            enabled_seconds = run_cycle(spotify, plays, os.path.join(tmp, "enabled.db"))
+            metrics.flush(mode="benchmark", ok=True)
+            configure_metrics(None)
+
+        with open(metrics_path, encoding="utf-8") as f:
+            results["cycle"] = {
+                "plays": args.plays,
+                "null_seconds": round(null_seconds, 4),
+                "enabled_seconds": round(enabled_seconds, 4),
+                "metrics": json.loads(f.readline()),
+            }
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
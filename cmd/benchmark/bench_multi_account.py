@@ -0,0 +1,111 @@
+"""
+モジュール: cmd/benchmark/bench_multi_account.py
+ローカルのSpotifyスタブに対して、複数アカウントの並行収集のスループットを計測する。
+トークンキャッシュ・カーソルキャッシュは既定の設定のまま使い、保存先はアプリケーション設定のCSVから
+アカウントごとに導出する。同時実行数ごとの全体・アカウント別スループットを出力する。
+
+使い方:
+    python cmd/benchmark/bench_multi_account.py --users 1000 --concurrency 1 50
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from fake_servers import FakeSpotify  # noqa: E402
+from synthetic import generate_plays, make_catalog  # noqa: E402
+from config.config import config_manager  # noqa: E402
+from useCase.http_client import HttpClient  # noqa: E402
+from useCase.multi_account import AccountConfig, collect_accounts, summarize  # noqa: E402
+import main as app  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--users", type=int, default=1000, help="シミュレートするユーザー数")
+    parser.add_argument("--plays", type=int, default=50, help="ユーザーごとの再生数")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 50], help="計測する同時実行数")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="スタブが応答ごとに加える遅延（ミリ秒）")
+    parser.add_argument("--fail-every", type=int, default=0, help="N人に1人を無効な認証情報にする")
+    parser.add_argument("--no-token-cache", action="store_true", help="比較用にトークンキャッシュを無効にする")
+    args = parser.parse_args()
+
+    catalog = make_catalog()
+    histories = {
+        f"refresh-{i}": generate_plays(args.plays, catalog=catalog, seed=i)
+        for i in range(args.users)
+    }
+    config_manager.config.storage_type = "csv"
+
+    runs = []
+    with FakeSpotify(histories, latency=args.latency_ms / 1000) as server:
+        os.environ["SPOTIFY_TOKEN_URL"] = server.token_url
+        os.environ["SPOTIFY_API_BASE_URL"] = server.api_base_url
+
+        for concurrency in args.concurrency:
+            with tempfile.TemporaryDirectory() as tmp:
+                # 既定のファイル名のまま一時ディレクトリに置く
+                config_manager.config.csv_file_path = f"{tmp}/spotify_logs.csv"
+                config_manager.config.cursor_cache_path = f"{tmp}/.spotify_cursor.json"
+                config_manager.config.token_cache_path = (
+                    None if args.no_token_cache else f"{tmp}/.spotify_token_cache.json"
+                )
+                accounts = [
+                    AccountConfig(
+                        name=f"user{i}",
+                        client_id="bench",
+                        client_secret="bench",
+                        refresh_token=(
+                            "revoked" if args.fail_every and i % args.fail_every == 0 else f"refresh-{i}"
+                        ),
+                    )
+                    for i in range(args.users)
+                ]
+                app.check_account_storage(accounts)
+                http_client = HttpClient(pool_size=concurrency)
+
+                server.reset_counts()
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results = collect_accounts(
+                        accounts,
+                        lambda account: app.collect_account(account, http_client),
+                        concurrency=concurrency,
+                    )
+                summary = summarize(results, time.perf_counter() - started)
+                http_stats = http_client.stats()
+                http_client.close()
+
+            latencies = [a["seconds"] for a in summary["per_account"]]
+            runs.append({
+                "concurrency": concurrency,
+                "accounts": summary["accounts"],
+                "failed": summary["failed"],
+                "tracks": summary["tracks"],
+                "wall_seconds": summary["wall_seconds"],
+                "accounts_per_second": summary["accounts_per_second"],
+                "tracks_per_second": summary["tracks_per_second"],
+                "account_p50_seconds": round(statistics.median(latencies), 4),
+                "http_requests": server.request_count,
+                "http": http_stats,
+            })
+
+    print(json.dumps({
+        "users": args.users,
+        "plays_per_user": args.plays,
+        "token_cache": not args.no_token_cache,
+        "runs": runs,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+モジュール: cmd/benchmark/bench_normalized.py
+合成した再生履歴でSQLiteStorage（横長の行）とNormalizedSQLiteStorage（ディメンションテーブル）を比較する。
+書き込み時間、ファイルサイズ、全期間・直近7日間の読み出し、トラック別再生数の集計を計測する。
+
+使い方:
+    python cmd/benchmark/bench_normalized.py --rows 1000000
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from synthetic import generate_plays, make_catalog  # noqa: E402
+from LogRepository.play_record import as_records  # noqa: E402
+from LogRepository.sqlite_storage import SQLiteStorage  # noqa: E402
+from LogRepository.normalized_sqlite_storage import NormalizedSQLiteStorage  # noqa: E402
+
+
+def write_history(storage, n_rows: int, chunk_size: int, catalog) -> float:
+    """合成再生履歴を古い順にチャンク単位で save_tracks し、経過秒数を返す"""
+    elapsed = 0.0
+    start_ms = 1_420_070_400_000  # 2015-01-01
+    for seed, offset in enumerate(range(0, n_rows, chunk_size)):
+        records = as_records(generate_plays(min(chunk_size, n_rows - offset), start_ms, catalog, seed))
+        start_ms = records[-1].played_at_ms
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            storage.save_tracks(records)
+        elapsed += time.perf_counter() - started
+    return elapsed
+
+
+def measure(storage_class, path: str, args, catalog) -> dict:
+    """書き込み・ファイルサイズ・読み出しを計測する"""
+    storage = storage_class(path)
+    write_seconds = write_history(storage, args.rows, args.chunk_size, catalog)
+    storage.close()
+
+    # 書き込み時のページキャッシュの影響を減らすため開き直してから読む
+    storage = storage_class(path)
+    started = time.perf_counter()
+    scanned = sum(1 for _ in storage.query())
+    full_scan = time.perf_counter() - started
+
+    recent_start = storage.get_last_saved_timestamp() - timedelta(days=7)
+    started = time.perf_counter()
+    recent = sum(1 for _ in storage.query(recent_start))
+    recent_scan = time.perf_counter() - started
+
+    # トラック別の再生数（集計テーブルを使わず再生の行を全件走査する）
+    group_sql = (
+        "SELECT track_key, COUNT(*) FROM plays GROUP BY track_key"
+        if storage.log_table == "plays"
+        else "SELECT track_id, COUNT(*) FROM spotify_logs GROUP BY track_id"
+    )
+    started = time.perf_counter()
+    groups = len(storage.conn.execute(group_sql).fetchall())
+    group_scan = time.perf_counter() - started
+    storage.close()
+
+    return {
+        "write_seconds": round(write_seconds, 3),
+        "rows_per_second": round(args.rows / write_seconds),
+        "file_bytes": os.path.getsize(path),
+        "full_scan_seconds": round(full_scan, 3),
+        "full_scan_rows": scanned,
+        "recent_7d_seconds": round(recent_scan, 4),
+        "recent_7d_rows": recent,
+        "group_by_track_seconds": round(group_scan, 3),
+        "tracks": groups,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="合成する再生数")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="1回の save_tracks で保存する件数")
+    parser.add_argument("--tracks", type=int, default=5000, help="カタログのトラック数")
+    parser.add_argument("--artists", type=int, default=800, help="カタログのアーティスト数")
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.tracks, args.artists)
+    with tempfile.TemporaryDirectory() as tmp:
+        wide = measure(SQLiteStorage, os.path.join(tmp, "wide.db"), args, catalog)
+        normalized = measure(NormalizedSQLiteStorage, os.path.join(tmp, "normalized.db"), args, catalog)
+
+    results = {
+        "rows": args.rows,
+        "catalog_tracks": args.tracks,
+        "wide": wide,
+        "normalized": normalized,
+        "size_ratio": round(normalized["file_bytes"] / wide["file_bytes"], 3),
+        "full_scan_speedup": round(wide["full_scan_seconds"] / normalized["full_scan_seconds"], 2),
+        "group_by_track_speedup": round(wide["group_by_track_seconds"] / normalized["group_by_track_seconds"], 2),
+    }
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
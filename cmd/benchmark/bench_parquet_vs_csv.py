@@ -0,0 +1,172 @@
+"""
+モジュール: cmd/benchmark/bench_parquet_vs_csv.py
+合成した再生履歴でCSVStorageとParquetStorageのファイルサイズと走査時間を比較する。
+アーティスト別の再生数の集計（全期間）と、直近7日間の範囲読み出しを計測する。
+
+使い方:
+    python cmd/benchmark/bench_parquet_vs_csv.py --rows 10000000
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from synthetic import make_catalog  # noqa: E402
+from LogRepository.csv_storage import CSVStorage, FIELDNAMES, played_at_to_ms  # noqa: E402
+from LogRepository.parquet_storage import ParquetStorage  # noqa: E402
+
+
+CATALOG_SIZE = 5000
+
+
+def synthetic_chunks(n_rows: int, chunk_size: int, seed: int = 0):
+    """
+    合成再生履歴を古い順にチャンク単位で生成する
+
+    Yields:
+        (played_ms, track_index) のNumPy配列のタプル
+    """
+    rng = np.random.default_rng(seed)
+    start_ms = int(datetime(2015, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    for offset in range(0, n_rows, chunk_size):
+        size = min(chunk_size, n_rows - offset)
+        gaps = rng.integers(150_000, 400_000, size=size)
+        played = start_ms + np.cumsum(gaps)
+        start_ms = int(played[-1])
+        # Zipf分布で人気曲に偏らせる
+        tracks = np.minimum(rng.zipf(1.3, size=size) - 1, CATALOG_SIZE - 1)
+        yield played, tracks
+
+
+def write_csv(path: str, catalog, n_rows: int, chunk_size: int) -> float:
+    """CSVStorageと同じ形式で書き込み、経過秒数を返す"""
+    started = time.perf_counter()
+    saved_at = datetime.now(timezone.utc).isoformat()
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
+        for played, tracks in synthetic_chunks(n_rows, chunk_size):
+            rows = []
+            for ms, index in zip(played.tolist(), tracks.tolist()):
+                t = catalog[index]
+                rows.append((
+                    t["name"], t["artists"][0]["name"],
+                    datetime.fromtimestamp(ms / 1000, tz=timezone.utc).isoformat(), saved_at,
+                    t["id"], t["artists"][0]["id"], t["album"]["name"], t["album"]["id"],
+                    t["duration_ms"], t["popularity"], json.dumps(t["external_urls"]),
+                ))
+            writer.writerows(rows)
+    return time.perf_counter() - started
+
+
+def write_parquet(storage: ParquetStorage, catalog, n_rows: int, chunk_size: int) -> float:
+    """ParquetStorage.write_table でチャンクごとに書き込み、経過秒数を返す"""
+    started = time.perf_counter()
+    saved_at = int(datetime.now(timezone.utc).timestamp() * 1000)
+    columns = {
+        "track_id": [t["id"] for t in catalog],
+        "track_name": [t["name"] for t in catalog],
+        "artist_id": [t["artists"][0]["id"] for t in catalog],
+        "artist_name": [t["artists"][0]["name"] for t in catalog],
+        "album_id": [t["album"]["id"] for t in catalog],
+        "album_name": [t["album"]["name"] for t in catalog],
+        "duration_ms": [t["duration_ms"] for t in catalog],
+        "popularity": [t["popularity"] for t in catalog],
+        "external_urls": [json.dumps(t["external_urls"]) for t in catalog],
+    }
+    lookup = {name: pa.array(values) for name, values in columns.items()}
+
+    for played, tracks in synthetic_chunks(n_rows, chunk_size):
+        indices = pa.array(tracks)
+        data = {
+            "played_at": pa.array(played, type=pa.timestamp("ms", tz="UTC")),
+            "saved_at": pa.array(np.full(len(played), saved_at), type=pa.timestamp("ms", tz="UTC")),
+        }
+        for name, values in lookup.items():
+            data[name] = values.take(indices)
+        storage.write_table(pa.table(data))
+    return time.perf_counter() - started
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--rows", type=int, default=10_000_000, help="合成する再生数")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="書き込みチャンクの行数（Parquetのrow group）")
+    args = parser.parse_args()
+
+    catalog = make_catalog(n_tracks=CATALOG_SIZE, n_artists=400)
+    results = {"rows": args.rows}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "spotify_logs.csv")
+        parquet = ParquetStorage(os.path.join(tmp, "parquet"), row_group_size=args.chunk_size)
+
+        results["csv_write_seconds"] = write_csv(csv_path, catalog, args.rows, args.chunk_size)
+        results["parquet_write_seconds"] = write_parquet(parquet, catalog, args.rows, args.chunk_size)
+        results["csv_bytes"] = os.path.getsize(csv_path)
+        results["parquet_bytes"] = parquet.get_stats()["size"]
+
+        def csv_artist_counts():
+            counts = Counter()
+            with open(csv_path, "r", encoding="utf-8", newline="") as f:
+                column = FIELDNAMES.index("artist_id")
+                reader = csv.reader(f)
+                next(reader)
+                for row in reader:
+                    counts[row[column]] += 1
+            return counts
+
+        def parquet_artist_counts():
+            table = parquet.scan(columns=["artist_id"])
+            return table.column("artist_id").value_counts()
+
+        csv_counts, results["csv_artist_scan_seconds"] = timed(csv_artist_counts)
+        parquet_counts, results["parquet_artist_scan_seconds"] = timed(parquet_artist_counts)
+        assert sum(csv_counts.values()) == pc.sum(parquet_counts.field("counts")).as_py()
+
+        end = CSVStorage(csv_path).get_last_saved_timestamp() + timedelta(milliseconds=1)
+        start = end - timedelta(days=7)
+        start_ms, end_ms = int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+
+        def csv_range():
+            column = FIELDNAMES.index("played_at")
+            with open(csv_path, "r", encoding="utf-8", newline="") as f:
+                reader = csv.reader(f)
+                next(reader)
+                return sum(1 for row in reader if start_ms <= played_at_to_ms(row[column]) < end_ms)
+
+        csv_hits, results["csv_range_7d_seconds"] = timed(csv_range)
+        parquet_hits, results["parquet_range_7d_seconds"] = timed(
+            lambda: parquet.scan(columns=["played_at", "track_id"], start=start, end=end).num_rows
+        )
+        assert csv_hits == parquet_hits
+        results["range_7d_rows"] = parquet_hits
+
+    for key in ("csv_write_seconds", "parquet_write_seconds", "csv_artist_scan_seconds",
+                "parquet_artist_scan_seconds", "csv_range_7d_seconds", "parquet_range_7d_seconds"):
+        results[key] = round(results[key], 3)
+    results["size_ratio"] = round(results["csv_bytes"] / results["parquet_bytes"], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+モジュール: cmd/benchmark/bench_play_record.py
+APIのアイテムを保存用の形に変換する処理の速度（records/s）と1件あたりのメモリ（bytes/record）を計測する。
+変更前の「バックエンドごとに11キーの辞書を作り、played_at を解析し直す」経路と、PlayRecord への一度きりの変換を比較する。
+
+使い方:
+    python cmd/benchmark/bench_play_record.py --tracks 100000 --repeat 3
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from synthetic import generate_plays  # noqa: E402
+from LogRepository.play_record import PlayRecord  # noqa: E402
+from useCase.normalizer import normalize_items  # noqa: E402
+
+
+def legacy_rows(tracks):
+    """変更前の CSVStorage.save_tracks と同じく、辞書を作った後に played_at をもう一度解析して最大値を求める"""
+    saved_at = datetime.now(timezone.utc).isoformat()
+    rows = []
+    for item in tracks:
+        track = item["track"]
+        played_at = datetime.fromisoformat(item["played_at"].replace("Z", "+00:00"))
+        rows.append({
+            "track_name": track["name"],
+            "artist_name": track["artists"][0]["name"],
+            "played_at": played_at.isoformat(),
+            "saved_at": saved_at,
+            "track_id": track["id"],
+            "artist_id": track["artists"][0]["id"],
+            "album_name": track["album"]["name"],
+            "album_id": track["album"]["id"],
+            "duration_ms": track["duration_ms"],
+            "popularity": track.get("popularity", ""),
+            "external_urls": json.dumps(track["external_urls"])
+        })
+    latest = max(datetime.fromisoformat(item["played_at"].replace("Z", "+00:00")) for item in tracks)
+    return rows, int(latest.timestamp() * 1000)
+
+
+def record_rows(tracks):
+    """正規化ステージで一度だけ変換し、最大値は played_at_ms から求める"""
+    records = normalize_items(tracks)
+    return records, max(record.played_at_ms for record in records)
+
+
+def measure(label: str, fn, tracks, repeat: int) -> dict:
+    """変換の最良時間と、変換結果を保持するのに使ったメモリを返す"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(tracks)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    result = fn(tracks)
+    held, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return {
+        "path": label,
+        "seconds": round(best, 4),
+        "records_per_sec": round(len(tracks) / best),
+        "bytes_per_record": round(held / len(tracks)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--tracks", type=int, default=100_000, help="変換するアイテム数")
+    parser.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数（最良値を使う）")
+    args = parser.parse_args()
+
+    tracks = generate_plays(args.tracks)
+    # 両方の経路が同じ内容を作ることを確認する
+    legacy, legacy_latest = legacy_rows(tracks[:1000])
+    records, latest = record_rows(tracks[:1000])
+    assert legacy_latest == latest
+    assert all(
+        record.to_row(row["saved_at"]) == row for record, row in zip(records, legacy)
+        if record.popularity is not None
+    )
+    assert all(isinstance(record, PlayRecord) for record in records)
+
+    results = [
+        measure("legacy_dict", legacy_rows, tracks, args.repeat),
+        measure("play_record", record_rows, tracks, args.repeat),
+    ]
+    print(json.dumps({"tracks": args.tracks, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+モジュール: cmd/benchmark/bench_snapshots.py
+ダッシュボード用スナップショットを、保存した月だけ書き出す場合と毎回すべて作り直す場合で比較する。
+あわせてシャードの大きさ（JSON / gzip / brotli）と、ダッシュボードが毎回集計する場合の1回あたりの集計時間を計測する。
+
+使い方:
+    python cmd/benchmark/bench_snapshots.py --history 100000 --new-plays 50
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from fake_servers import FakeSpotify  # noqa: E402
+from synthetic import generate_plays, make_catalog  # noqa: E402
+from config.config import config_manager  # noqa: E402
+from LogRepository.play_record import as_records  # noqa: E402
+from useCase.auth import SpotifyAuth  # noqa: E402
+from useCase.data_fetcher import SpotifyDataFetcher  # noqa: E402
+from useCase.http_client import HttpClient  # noqa: E402
+from useCase.snapshots import SnapshotWriter  # noqa: E402
+from useCase.storage_session import StorageSession  # noqa: E402
+import main as app  # noqa: E402
+
+
+def live_dashboard(storage) -> None:
+    """スナップショットがない場合にページを開くたびに行う集計（上位・分布・全期間の日別）"""
+    storage.track_ranking(100)
+    storage.artist_distribution(100)
+    days = {}
+    for row in storage.query():
+        day = row["played_at"][:10]
+        days[day] = days.get(day, 0) + 1
+
+
+def shard_bytes(directory: str) -> dict:
+    """書き出したシャードの合計バイト数を形式ごとに返す"""
+    sizes = {"json": 0, "gzip": 0, "brotli": 0}
+    for root, _dirs, files in os.walk(directory):
+        for name in files:
+            size = os.path.getsize(os.path.join(root, name))
+            if name.endswith(".json.gz"):
+                sizes["gzip"] += size
+            elif name.endswith(".json.br"):
+                sizes["brotli"] += size
+            elif name.endswith(".json") and name != "manifest.json":
+                sizes["json"] += size
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--history", type=int, default=100_000, help="事前に保存しておく再生数")
+    parser.add_argument("--new-plays", type=int, default=50, help="1サイクルで取得する再生数")
+    parser.add_argument("--repeat", type=int, default=3, help="各方式の計測回数（中央値を使う）")
+    args = parser.parse_args()
+
+    catalog = make_catalog()
+    total = args.history + args.new_plays * args.repeat
+    history = generate_plays(total, catalog=catalog)
+    config_manager.config.spool_dir = None
+    config_manager.config.token_cache_path = None
+
+    with FakeSpotify({"bench-refresh": []}) as spotify, tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "SPOTIFY_CLIENT_ID": "bench",
+            "SPOTIFY_CLIENT_SECRET": "bench",
+            "SPOTIFY_REFRESH_TOKEN": "bench-refresh",
+            "SPOTIFY_TOKEN_URL": spotify.token_url,
+            "SPOTIFY_API_BASE_URL": spotify.api_base_url,
+        })
+        fetcher = SpotifyDataFetcher(SpotifyAuth(http_client=HttpClient()))
+        fetcher.spotify_auth.token  # トークンの取得は計測に含めない
+
+        storage_config = {"type": "sqlite", "path": os.path.join(tmp, "logs.db")}
+        storage = app.create_storage_backend(storage_config)
+        with contextlib.redirect_stdout(io.StringIO()):
+            storage.save_tracks(as_records(history[:args.history]))
+
+        writer = SnapshotWriter(os.path.join(tmp, "snapshots"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            writer.rebuild(storage)
+            initial_seconds = time.perf_counter() - started
+
+        # デーモンと同じく1つのセッションを使い回し、新しい再生を保存するたびに保存後の段階を実行する
+        session = StorageSession(lambda: storage)
+        full_writer = SnapshotWriter(os.path.join(tmp, "full"))
+        incremental, full, written = [], [], []
+        for cycle in range(args.repeat):
+            offset = args.history + cycle * args.new_plays
+            new_plays = history[offset:offset + args.new_plays]
+            spotify.add_plays("bench-refresh", new_plays)
+            with contextlib.redirect_stdout(io.StringIO()):
+                app.collect_tracks(fetcher, session)
+                writer.touch(as_records(new_plays))
+                started = time.perf_counter()
+                result = writer.publish(storage)
+                incremental.append(time.perf_counter() - started)
+                # 比較用: 保存した月に関係なくすべてのシャードを作り直す
+                started = time.perf_counter()
+                full_writer.rebuild(storage)
+                full.append(time.perf_counter() - started)
+            written.append(len(result["written"]))
+
+        live = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            live_dashboard(storage)
+            live.append(time.perf_counter() - started)
+
+        sizes = shard_bytes(writer.directory)
+        with open(writer.manifest_path, "r") as f:
+            months = len(json.load(f)["months"])
+        storage.close()
+
+    print(json.dumps({
+        "history": args.history,
+        "new_plays_per_cycle": args.new_plays,
+        "months": months,
+        "initial_build_seconds": round(initial_seconds, 4),
+        "incremental_publish_seconds": round(statistics.median(incremental), 4),
+        "incremental_shards_written": max(written),
+        "full_rebuild_seconds": round(statistics.median(full), 4),
+        "live_dashboard_seconds_per_visit": round(statistics.median(live), 4),
+        "shard_bytes": sizes,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+モジュール: cmd/benchmark/bench_startup.py
+main.py の起動時間を -X importtime で計測し、しきい値を超えたら終了コード1を返す。
+新しい再生がない1サイクル（ストレージを作らずに終わる経路）もローカルのスタブに対して実行して計測する。
+
+使い方:
+    python cmd/benchmark/bench_startup.py --runs 10 --threshold-ms 300
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+
+from fake_servers import FakeSpotify, _played_ms  # noqa: E402
+from synthetic import generate_plays  # noqa: E402
+
+# 1回の収集サイクルでは読み込まれてはならない重いモジュール
+FORBIDDEN = ["supabase", "postgrest", "pyarrow", "numpy", "asyncio"]
+
+
+def parse_importtime(stderr: str) -> dict:
+    """-X importtime の出力をモジュール名 -> 累積マイクロ秒の辞書にする"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def run(args, env=None, cwd=None) -> tuple:
+    """子プロセスを -X importtime 付きで実行し、(経過秒, モジュールの辞書, 終了コード, 標準出力) を返す"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=cwd or ROOT, env=env, capture_output=True, text=True,
+    )
+    return time.perf_counter() - started, parse_importtime(result.stderr), result.returncode, result.stdout
+
+
+def forbidden_modules(modules: dict) -> list:
+    return sorted({name for name in modules if name.split(".")[0] in FORBIDDEN})
+
+
+def measure_import(runs: int) -> dict:
+    """import main の累積時間とプロセス全体の時間を計測する"""
+    import_ms, wall_ms, modules = [], [], {}
+    for _ in range(runs):
+        elapsed, modules, _code, _out = run(["-c", "import main"])
+        import_ms.append(modules["main"] / 1000)
+        wall_ms.append(elapsed * 1000)
+    top = sorted(modules.items(), key=lambda item: item[1], reverse=True)[1:11]
+    return {
+        "import_main_ms": round(statistics.median(import_ms), 1),
+        "process_ms": round(statistics.median(wall_ms), 1),
+        "slowest_imports_ms": {name: round(us / 1000, 1) for name, us in top},
+        "forbidden_imported": forbidden_modules(modules),
+    }
+
+
+def measure_idle_cycle(runs: int) -> dict:
+    """カーソル以降の再生がない状態で main.py を実行し、ストレージを作らずに終わることを確認する"""
+    history = generate_plays(50)
+    supabase_url = "http://127.0.0.1:9"  # 接続すれば失敗する宛先
+    with FakeSpotify({"bench-refresh": history}) as server, tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, ".spotify_cursor.json"), "w") as f:
+            json.dump({f"supabase:{supabase_url}": max(_played_ms(item) for item in history)}, f)
+        env = {
+            **os.environ,
+            "SPOTIFY_CLIENT_ID": "bench",
+            "SPOTIFY_CLIENT_SECRET": "bench",
+            "SPOTIFY_REFRESH_TOKEN": "bench-refresh",
+            "SPOTIFY_TOKEN_URL": server.token_url,
+            "SPOTIFY_API_BASE_URL": server.api_base_url,
+            "SUPABASE_URL": supabase_url,
+            "SUPABASE_KEY": "bench",
+        }
+        wall_ms, codes, modules, requests = [], set(), {}, []
+        for _ in range(runs):
+            server.reset_counts()
+            elapsed, modules, code, _out = run([str(ROOT / "main.py")], env=env, cwd=tmp)
+            wall_ms.append(elapsed * 1000)
+            codes.add(code)
+            requests.append(server.request_count)
+    return {
+        "process_ms": round(statistics.median(wall_ms), 1),
+        "exit_codes": sorted(codes),
+        "spotify_requests": max(requests),
+        "forbidden_imported": forbidden_modules(modules),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--runs", type=int, default=10, help="計測の繰り返し回数（中央値を使う）")
+    parser.add_argument("--threshold-ms", type=float, default=300.0, help="import main の累積時間の上限（ミリ秒）")
+    args = parser.parse_args()
+
+    report = {
+        "runs": args.runs,
+        "threshold_ms": args.threshold_ms,
+        "import": measure_import(args.runs),
+        "idle_cycle": measure_idle_cycle(args.runs),
+    }
+    failures = []
+    if report["import"]["import_main_ms"] > args.threshold_ms:
+        failures.append(f"import main took {report['import']['import_main_ms']}ms (> {args.threshold_ms}ms)")
+    for phase in ("import", "idle_cycle"):
+        if report[phase]["forbidden_imported"]:
+            failures.append(f"{phase} imported {', '.join(report[phase]['forbidden_imported'])}")
+    if report["idle_cycle"]["exit_codes"] != [0]:
+        failures.append(f"idle cycle exited with {report['idle_cycle']['exit_codes']}")
+    report["failures"] = failures
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
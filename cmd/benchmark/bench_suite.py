@@ -0,0 +1,372 @@
+"""
+モジュール: cmd/benchmark/bench_suite.py
+ローカルのSpotify・Supabaseスタブと合成履歴だけで、収集サイクルと各ストレージバックエンドをまとめて計測する。
+シナリオごとに新しいプロセスで実行し、スループット・p50/p99レイテンシ・ピークRSSをJSONで出力する。
+--output で結果を保存し、別のコミットで --compare に渡すと悪化したメトリクスを報告する。
+
+使い方:
+    python cmd/benchmark/bench_suite.py --output bench.json
+    python cmd/benchmark/bench_suite.py --backends sqlite supabase --compare bench.json --tolerance 0.25
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Dict, Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from fake_servers import FakePostgREST, FakeSpotify  # noqa: E402
+from synthetic import generate_plays, make_catalog  # noqa: E402
+from config.config import config_manager  # noqa: E402
+from metrics.metrics import configure_metrics  # noqa: E402
+from useCase.http_client import get_http_client  # noqa: E402
+from useCase.normalizer import normalize_items  # noqa: E402
+import main as app  # noqa: E402
+
+BACKENDS = ["csv", "partitioned_csv", "parquet", "sqlite", "supabase"]
+KINDS = ["cycle", "storage"]
+
+# --compare で比較するメトリクスと、値が大きい方が良いかどうか
+COMPARED_METRICS = {
+    "tracks_per_second": True,
+    "rows_per_second": True,
+    "p50_seconds": False,
+    "p99_seconds": False,
+    "query_rows_per_second": True,
+    "peak_rss_mb": False,
+}
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    """レイテンシの p50 / p99 / 最大値を返す"""
+    if not latencies:
+        return {"p50_seconds": 0.0, "p99_seconds": 0.0, "max_seconds": 0.0}
+    p99 = statistics.quantiles(latencies, n=100, method="inclusive")[98] if len(latencies) > 1 else latencies[0]
+    return {
+        "p50_seconds": round(statistics.median(latencies), 6),
+        "p99_seconds": round(p99, 6),
+        "max_seconds": round(max(latencies), 6),
+    }
+
+
+def storage_config(backend: str, tmp: str, postgrest: FakePostgREST | None) -> Dict[str, Any]:
+    """一時ディレクトリ内に保存するストレージ設定を返す"""
+    if backend == "csv":
+        return {"type": "csv", "file_path": os.path.join(tmp, "spotify_logs.csv")}
+    if backend == "partitioned_csv":
+        return {"type": "partitioned_csv", "directory": os.path.join(tmp, "partitions"), "compression": "auto"}
+    if backend == "parquet":
+        return {"type": "parquet", "directory": os.path.join(tmp, "parquet")}
+    if backend == "sqlite":
+        return {"type": "sqlite", "path": os.path.join(tmp, "spotify_logs.db")}
+    return {"type": "supabase", "url": postgrest.url, "key": "bench-key", "batch_size": 500}
+
+
+def configure_app(backend: str, tmp: str, spotify: FakeSpotify, postgrest: FakePostgREST | None) -> None:
+    """run_collection_cycle がスタブと一時ディレクトリを使うようにアプリケーション設定を書き換える"""
+    config = config_manager.config
+    config.storage_type = backend
+    config.csv_file_path = os.path.join(tmp, "spotify_logs.csv")
+    config.partition_dir = os.path.join(tmp, "partitions")
+    config.parquet_dir = os.path.join(tmp, "parquet")
+    config.sqlite_path = os.path.join(tmp, "spotify_logs.db")
+    config.spool_dir = os.path.join(tmp, "spool")
+    config.cursor_cache_path = os.path.join(tmp, "cursor.json")
+    config.token_cache_path = None
+    config.debug = False
+    os.environ.update({
+        "SPOTIFY_CLIENT_ID": "bench",
+        "SPOTIFY_CLIENT_SECRET": "bench",
+        "SPOTIFY_REFRESH_TOKEN": "bench-refresh",
+        "SPOTIFY_TOKEN_URL": spotify.token_url,
+        "SPOTIFY_API_BASE_URL": spotify.api_base_url,
+    })
+    if postgrest is not None:
+        os.environ.update({"SUPABASE_URL": postgrest.url, "SUPABASE_KEY": "bench-key"})
+
+
+def count_rows(backend: str, tmp: str, postgrest: FakePostgREST | None) -> int:
+    """保存された行数を数える（取りこぼし・重複の確認用）"""
+    if postgrest is not None:
+        return len(postgrest.rows())
+    storage = app.create_storage_backend(storage_config(backend, tmp, None))
+    try:
+        return sum(1 for _ in storage.query())
+    finally:
+        storage.close()
+
+
+def run_cycles(backend: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    run_collection_cycle を最初のバックフィルと、再生を追加しながらの増分サイクルで繰り返す
+
+    Returns:
+        サイクルのレイテンシ、スループット、リクエスト数、フェーズごとの所要時間
+    """
+    catalog = make_catalog(n_tracks=options["catalog"], n_artists=max(1, options["catalog"] // 8))
+    history = generate_plays(options["backfill"] + options["cycles"] * options["plays_per_cycle"], catalog=catalog)
+    initial, later = history[:options["backfill"]], history[options["backfill"]:]
+
+    with contextlib.ExitStack() as stack:
+        tmp = stack.enter_context(tempfile.TemporaryDirectory())
+        spotify = stack.enter_context(FakeSpotify(
+            {"bench-refresh": initial},
+            rate_limit_every=options["rate_limit_every"],
+            retry_after=0,
+        ))
+        postgrest = stack.enter_context(FakePostgREST()) if backend == "supabase" else None
+        configure_app(backend, tmp, spotify, postgrest)
+        get_http_client().backoff = options["backoff"]
+        metrics_path = os.path.join(tmp, "metrics.jsonl")
+        configure_metrics(metrics_path, "jsonl")
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            ok = app.run_collection_cycle()
+        backfill_seconds = time.perf_counter() - started
+        if not ok:
+            raise RuntimeError(f"Backfill cycle failed for {backend}")
+
+        latencies = []
+        for cycle in range(options["cycles"]):
+            start = cycle * options["plays_per_cycle"]
+            spotify.add_plays("bench-refresh", later[start:start + options["plays_per_cycle"]])
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                ok = app.run_collection_cycle()
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                raise RuntimeError(f"Cycle {cycle + 1} failed for {backend}")
+
+        configure_metrics(None)
+        phases: Dict[str, float] = {}
+        with open(metrics_path, encoding="utf-8") as f:
+            for line in f:
+                for span in json.loads(line)["spans"]:
+                    phases[span["name"]] = phases.get(span["name"], 0.0) + span["seconds"]
+
+        rows = count_rows(backend, tmp, postgrest)
+        # 429を受けても、全再生が1回ずつ保存される
+        if rows != len(history):
+            raise RuntimeError(f"{backend} stored {rows} rows, expected {len(history)}")
+
+        incremental_tracks = len(later)
+        total_seconds = backfill_seconds + sum(latencies)
+        return {
+            "cycles": options["cycles"],
+            "rows": rows,
+            "backfill_tracks": len(initial),
+            "backfill_seconds": round(backfill_seconds, 4),
+            "incremental_tracks": incremental_tracks,
+            **percentiles(latencies),
+            "tracks_per_second": round(len(history) / total_seconds, 1),
+            "spotify_requests": spotify.request_count,
+            "spotify_rate_limited": spotify.rate_limited,
+            "storage_requests": postgrest.request_count if postgrest is not None else 0,
+            "phase_seconds": {name: round(seconds, 4) for name, seconds in sorted(phases.items())},
+        }
+
+
+def run_storage(backend: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    BaseStorage を直接使い、ページ単位の保存・最終保存日時・期間の読み出しを計測する
+
+    Returns:
+        保存のレイテンシとスループット、読み出しのスループット
+    """
+    catalog = make_catalog(n_tracks=options["catalog"], n_artists=max(1, options["catalog"] // 8))
+    records = normalize_items(generate_plays(options["rows"], catalog=catalog))
+    batch = options["batch"]
+
+    with contextlib.ExitStack() as stack:
+        tmp = stack.enter_context(tempfile.TemporaryDirectory())
+        postgrest = stack.enter_context(FakePostgREST()) if backend == "supabase" else None
+        storage = app.create_storage_backend(storage_config(backend, tmp, postgrest))
+        stack.callback(storage.close)
+
+        latencies = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(0, len(records), batch):
+                started = time.perf_counter()
+                storage.save_tracks(records[i:i + batch])
+                latencies.append(time.perf_counter() - started)
+
+            last_saved = []
+            for _ in range(options["lookups"]):
+                started = time.perf_counter()
+                storage.get_last_saved_timestamp()
+                last_saved.append(time.perf_counter() - started)
+
+        result = {
+            "rows": len(records),
+            "batch": batch,
+            **percentiles(latencies),
+            "rows_per_second": round(len(records) / sum(latencies), 1),
+            "last_saved_p50_seconds": percentiles(last_saved)["p50_seconds"],
+        }
+
+        try:
+            started = time.perf_counter()
+            scanned = sum(1 for _ in storage.query())
+            scan_seconds = time.perf_counter() - started
+            # 直近1週間の読み出し
+            week_ago = datetime.fromtimestamp(records[-1].played_at_ms / 1000, tz=timezone.utc) - timedelta(days=7)
+            started = time.perf_counter()
+            recent = sum(1 for _ in storage.query(start=week_ago))
+            recent_seconds = time.perf_counter() - started
+        except NotImplementedError:
+            result["query"] = "unsupported"
+        else:
+            if scanned != len(records):
+                raise RuntimeError(f"{backend} returned {scanned} rows, expected {len(records)}")
+            result.update({
+                "query_rows_per_second": round(scanned / scan_seconds, 1),
+                "query_last_week_rows": recent,
+                "query_last_week_seconds": round(recent_seconds, 6),
+            })
+        return result
+
+
+def run_scenario(name: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """シナリオ（"cycle:sqlite" など）を実行し、そのプロセスのピークRSSを加えて返す"""
+    kind, backend = name.split(":", 1)
+    try:
+        result = (run_cycles if kind == "cycle" else run_storage)(backend, options)
+    except ImportError as e:
+        # オプションの依存パッケージ（pyarrowなど）がない場合
+        return {"skipped": str(e)}
+    # ru_maxrss はLinuxではKB単位
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def git_commit() -> str | None:
+    """計測したコミットのハッシュを返す"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parents[2],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """
+    基準の結果と比較し、tolerance を超えて悪化したメトリクスを返す
+
+    Args:
+        results: 今回の結果
+        baseline: 基準の結果（--output で保存したもの）
+        tolerance: 許容する悪化率（0.25で25%）
+
+    Returns:
+        悪化したメトリクスのリスト
+    """
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or "skipped" in current or "skipped" in previous:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = previous.get(metric), current.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append({
+                    "scenario": name, "metric": metric,
+                    "baseline": before, "current": after, "change": round(change, 3),
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS, help="計測するバックエンド")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=KINDS,
+                        help="cycle: run_collection_cycle を通した計測、storage: BaseStorage 単体の計測")
+    parser.add_argument("--backfill", type=int, default=2000, help="最初のサイクルで取得する再生数")
+    parser.add_argument("--cycles", type=int, default=30, help="増分サイクルの回数")
+    parser.add_argument("--plays-per-cycle", type=int, default=20, help="増分サイクルごとに追加する再生数")
+    parser.add_argument("--rate-limit-every", type=int, default=7, help="Spotifyスタブが429を返す間隔（0で返さない）")
+    parser.add_argument("--backoff", type=float, default=0.01, help="429を受けたときの初回待機秒数")
+    parser.add_argument("--rows", type=int, default=50_000, help="storage シナリオで保存する再生数")
+    parser.add_argument("--batch", type=int, default=50, help="storage シナリオの1回の保存件数")
+    parser.add_argument("--lookups", type=int, default=20, help="最終保存日時の問い合わせ回数")
+    parser.add_argument("--catalog", type=int, default=2000, help="合成カタログのトラック数")
+    parser.add_argument("--output", metavar="PATH", help="結果のJSONを保存する")
+    parser.add_argument("--compare", metavar="PATH", help="基準の結果のJSONと比較する")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="--compare で許容する悪化率")
+    args = parser.parse_args()
+
+    options = {
+        key: getattr(args, key)
+        for key in ("backfill", "cycles", "plays_per_cycle", "rate_limit_every", "backoff",
+                    "rows", "batch", "lookups", "catalog")
+    }
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "time": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "options": options,
+        },
+        "scenarios": {},
+    }
+
+    context = multiprocessing.get_context("spawn")
+    for kind in args.kinds:
+        for backend in args.backends:
+            name = f"{kind}:{backend}"
+            print(f"📊 Running {name}", file=sys.stderr)
+            # ピークRSSをシナリオごとに測るため、毎回新しいプロセスで実行する
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results["scenarios"][name] = pool.submit(run_scenario, name, options).result()
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        results["comparison"] = {
+            "baseline_commit": baseline.get("meta", {}).get("commit"),
+            "tolerance": args.tolerance,
+            "regressions": regressions,
+        }
+        for regression in regressions:
+            print(
+                f"❌ {regression['scenario']} {regression['metric']}: "
+                f"{regression['baseline']} -> {regression['current']} ({regression['change']:+.1%})",
+                file=sys.stderr,
+            )
+        if regressions:
+            exit_code = 1
+        else:
+            print(f"✅ : No regressions beyond {args.tolerance:.0%}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+モジュール: cmd/benchmark/bench_supabase_save.py
+SupabaseStorage.save_tracks の1サイクルあたりのHTTPラウンドトリップ数を計測する。
+ローカルのPostgREST互換スタブに対して、従来の1行ずつのinsertと一括upsertを比較する。
+
+使い方:
+    python cmd/benchmark/bench_supabase_save.py --tracks 50 --batch-size 500
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from fake_servers import FakePostgREST  # noqa: E402
+from synthetic import generate_plays  # noqa: E402
+from LogRepository.supabase_storage import SupabaseStorage  # noqa: E402
+
+
+def legacy_save(storage: SupabaseStorage, tracks) -> None:
+    """変更前の save_tracks と同じく1トラックごとにinsertする"""
+    now = datetime.now(timezone.utc)
+    for item in tracks:
+        track = item["track"]
+        played_at = datetime.fromisoformat(item["played_at"].replace("Z", "+00:00"))
+        storage.supabase.table("spotify_logs").insert({
+            "track_name": track["name"],
+            "artist_name": track["artists"][0]["name"],
+            "played_at": played_at.isoformat(),
+            "saved_at": now.isoformat(),
+            "track_id": track["id"],
+            "artist_id": track["artists"][0]["id"],
+            "album_name": track["album"]["name"],
+            "album_id": track["album"]["id"],
+            "duration_ms": track["duration_ms"],
+            "popularity": track.get("popularity", 0),
+            "external_urls": json.dumps(track["external_urls"])
+        }).execute()
+
+
+def measure(server: FakePostgREST, label: str, fn) -> dict:
+    """1サイクル分の保存を実行してラウンドトリップ数と所要時間を返す"""
+    server.reset_counts()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    return {
+        "path": label,
+        "round_trips": server.request_count,
+        "seconds": round(elapsed, 4),
+        "rows_in_table": len(server.rows()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--tracks", type=int, default=50, help="1サイクルで保存するトラック数")
+    parser.add_argument("--batch-size", type=int, default=500, help="upsertのチャンクサイズ")
+    args = parser.parse_args()
+
+    tracks = generate_plays(args.tracks)
+    results = []
+
+    with FakePostgREST(unique_keys={}) as server:
+        storage = SupabaseStorage(server.url, "bench-key", batch_size=args.batch_size)
+        results.append(measure(server, "legacy_insert_per_row", lambda: legacy_save(storage, tracks)))
+
+    with FakePostgREST() as server:
+        storage = SupabaseStorage(server.url, "bench-key", batch_size=args.batch_size)
+        results.append(measure(server, "bulk_upsert", lambda: storage.save_tracks(tracks)))
+        # 同じ期間をもう一度保存しても行は増えない
+        results.append(measure(server, "bulk_upsert_rerun", lambda: storage.save_tracks(tracks)))
+
+    print(json.dumps({"tracks": args.tracks, "batch_size": args.batch_size, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+モジュール: cmd/benchmark/bench_supabase_stats.py
+SupabaseStorage.get_stats の所要時間と転送量を、テーブルの行数を増やしながら計測する。
+変更前の全行を select して count=exact を読む方法と、RPC（spotify_log_stats）・推定件数による取得を比較する。
+
+使い方:
+    python cmd/benchmark/bench_supabase_stats.py --rows 1000 10000 50000
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from fake_servers import FakePostgREST  # noqa: E402
+from synthetic import generate_plays  # noqa: E402
+from LogRepository.supabase_storage import SupabaseStorage  # noqa: E402
+
+
+def legacy_stats(storage: SupabaseStorage) -> dict:
+    """変更前の get_stats と同じく全行を取得して件数を読む"""
+    result = storage.supabase.table("spotify_logs").select("*", count="exact").execute()
+    return {"available": True, "count": result.count, "table": "spotify_logs"}
+
+
+def measure(server: FakePostgREST, label: str, fn, repeat: int) -> dict:
+    """repeat 回実行して1回あたりの所要時間とリクエスト数を返す"""
+    server.reset_counts()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        stats = fn()
+    return {
+        "method": label,
+        "count": stats.get("count"),
+        "seconds": round((time.perf_counter() - started) / repeat, 5),
+        "requests": server.request_count / repeat,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10_000, 50_000], help="テーブルの行数")
+    parser.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数")
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        with FakePostgREST() as server:
+            storage = SupabaseStorage(server.url, "bench-key", batch_size=5000, stats_ttl=0)
+            with contextlib.redirect_stdout(io.StringIO()):
+                storage.save_tracks(generate_plays(rows))
+
+            results.append({"rows": rows, **measure(server, "legacy_select_all", lambda: legacy_stats(storage), args.repeat)})
+            results.append({"rows": rows, **measure(server, "rpc", lambda: storage.get_stats(refresh=True), args.repeat)})
+
+            # ヘルスチェックは統計のキャッシュを使い回す
+            cached = SupabaseStorage(server.url, "bench-key")
+            results.append({"rows": rows, **measure(server, "is_available_cached", lambda: {"count": cached.is_available()}, args.repeat)})
+
+            # RPCが作成されていない場合の推定件数による取得
+            server._rpc = lambda function: (404, {}, {"code": "PGRST202", "details": None, "hint": None, "message": ""})
+            fallback = SupabaseStorage(server.url, "bench-key", stats_ttl=0)
+            fallback.get_stats()
+            results.append({"rows": rows, **measure(server, "estimated_count", lambda: fallback.get_stats(refresh=True), args.repeat)})
+
+    print(json.dumps({"results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""
+モジュール: cmd/benchmark/fake_servers.py
+ベンチマーク用のローカルなスタブサーバー。
+本物のSpotify APIとSupabase (PostgREST) の代わりにlocalhostで応答し、受信したリクエスト数を記録する。
+"""
+
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any
+from urllib.parse import urlsplit, parse_qsl
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """FakeServer.routeにリクエストを委譲するハンドラ"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        parts = urlsplit(self.path)
+        query = parse_qsl(parts.query, keep_blank_values=True)
+
+        server: FakeServer = self.server.owner
+        server.record(self.command, parts.path)
+        if server.latency:
+            time.sleep(server.latency)
+        status, headers, payload = server.route(self.command, parts.path, query, self.headers, body)
+
+        data = b"" if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    do_GET = do_POST = do_HEAD = do_PATCH = do_DELETE = _dispatch
+
+
+class FakeServer:
+    """スレッドで動作するスタブHTTPサーバーの基底クラス"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        """
+        Args:
+            host: 待ち受けるホスト
+            port: 待ち受けるポート（0で空きポート）
+            latency: 応答ごとに加えるネットワーク遅延の模擬値（秒）
+        """
+        self.latency = latency
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.owner = self
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.requests: Counter = Counter()
+
+    @property
+    def url(self) -> str:
+        """サーバーのベースURL"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, method: str, path: str) -> None:
+        """受信したリクエストを記録する"""
+        with self._lock:
+            self.requests[(method, path)] += 1
+
+    @property
+    def request_count(self) -> int:
+        """受信したリクエストの総数"""
+        return sum(self.requests.values())
+
+    def reset_counts(self) -> None:
+        """リクエストカウンタをリセットする"""
+        with self._lock:
+            self.requests.clear()
+
+    def route(self, method: str, path: str, query: list, headers, body: bytes):
+        """
+        リクエストを処理する（サブクラスで実装）
+
+        Returns:
+            (ステータスコード, 追加ヘッダー, JSONペイロード) のタプル
+        """
+        return 404, {}, {"error": "not found"}
+
+    def start(self) -> "FakeServer":
+        """バックグラウンドスレッドでサーバーを起動する"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """サーバーを停止する"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakePostgREST(FakeServer):
+    """
+    /rest/v1/<table> を提供するPostgREST互換のスタブ
+
+    一括insert/upsert (on_conflict, Prefer: resolution=...)、select、order、limit、
+    比較フィルタ (eq/gt/gte/lt/lte)、Prefer: count=exact / estimated と、
+    READMEのRPC（spotify_log_stats、rebuild_spotify_aggregates、dedupe_spotify_logs）に対応する。
+    """
+
+    def __init__(self, unique_keys: Dict[str, tuple] | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        if unique_keys is None:
+            unique_keys = {"spotify_logs": ("track_id", "played_at")}
+        self.unique_keys = unique_keys
+        self._next_id = 1
+
+    def rows(self, table: str = "spotify_logs") -> List[Dict[str, Any]]:
+        """テーブルの全行を返す"""
+        return self.tables.setdefault(table, [])
+
+    def route(self, method, path, query, headers, body):
+        prefix = "/rest/v1/"
+        if not path.startswith(prefix):
+            return 404, {}, {"message": "not found"}
+        table = path[len(prefix):]
+
+        with self._lock:
+            if method == "POST" and table.startswith("rpc/"):
+                return self._rpc(table[len("rpc/"):], json.loads(body or b"{}"))
+            if method == "POST":
+                return self._insert(table, query, headers, body)
+            if method in ("GET", "HEAD"):
+                return self._select(table, query, headers)
+            if method == "DELETE":
+                return self._delete(table, query)
+        return 405, {}, {"message": "method not allowed"}
+
+    def _insert(self, table, query, headers, body):
+        payload = json.loads(body or b"[]")
+        new_rows = payload if isinstance(payload, list) else [payload]
+        prefer = headers.get("Prefer", "")
+        params = dict(query)
+
+        on_conflict = tuple(c for c in params.get("on_conflict", "").split(",") if c)
+        unique = self.unique_keys.get(table)
+        rows = self.rows(table)
+        index = {tuple(r.get(c) for c in unique): r for r in rows} if unique else {}
+
+        inserted = []
+        for row in new_rows:
+            key = tuple(row.get(c) for c in unique) if unique else None
+            if key is not None and key in index:
+                if not on_conflict:
+                    return 409, {}, {"code": "23505", "message": "duplicate key value violates unique constraint"}
+                if "resolution=merge-duplicates" in prefer:
+                    index[key].update(row)
+                continue
+            stored = {"id": self._next_id, **row}
+            self._next_id += 1
+            rows.append(stored)
+            if key is not None:
+                index[key] = stored
+            inserted.append(stored)
+
+        if "return=minimal" in prefer:
+            return 201, {}, None
+        return 201, {}, inserted
+
+    _OPS = {
+        "eq": lambda a, b: a == b,
+        "gt": lambda a, b: a > b,
+        "gte": lambda a, b: a >= b,
+        "lt": lambda a, b: a < b,
+        "lte": lambda a, b: a <= b,
+    }
+
+    def _match(self, row, column, expr) -> bool:
+        """column=op.value の条件を1行に適用する（数値の列は数値として比較する）"""
+        op, value = expr.split(".", 1)
+        if op not in self._OPS:
+            return True
+        actual = row.get(column)
+        if actual is None:
+            return False
+        value = value.strip('"')
+        if isinstance(actual, (int, float)) and not isinstance(actual, bool):
+            return self._OPS[op](actual, float(value))
+        return self._OPS[op](str(actual), value)
+
+    @staticmethod
+    def _split_top_level(expr: str) -> List[str]:
+        """括弧・引用符の外側のカンマで分割する"""
+        parts, depth, quoted, current = [], 0, False, ""
+        for char in expr:
+            if char == '"':
+                quoted = not quoted
+            elif not quoted and char in "()":
+                depth += 1 if char == "(" else -1
+            elif not quoted and depth == 0 and char == ",":
+                parts.append(current)
+                current = ""
+                continue
+            current += char
+        parts.append(current)
+        return parts
+
+    def _match_logic(self, row, op: str, expr: str) -> bool:
+        """or=(...) / and=(...) の条件を1行に適用する"""
+        results = []
+        for term in self._split_top_level(expr[1:-1]):
+            if term.startswith(("or(", "and(")):
+                inner_op, _, inner = term.partition("(")
+                results.append(self._match_logic(row, inner_op, "(" + inner))
+            else:
+                column, _, condition = term.partition(".")
+                results.append(self._match(row, column, condition))
+        return any(results) if op == "or" else all(results)
+
+    def _filter(self, rows, query):
+        reserved = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+        for column, expr in query:
+            if column in ("or", "and"):
+                rows = [r for r in rows if self._match_logic(r, column, expr)]
+            elif column not in reserved and "." in expr:
+                rows = [r for r in rows if self._match(r, column, expr)]
+        return rows
+
+    def _select(self, table, query, headers):
+        params = dict(query)
+        rows = self._filter(self.rows(table), query)
+
+        for clause in reversed([c for c in params.get("order", "").split(",") if c]):
+            column, _, direction = clause.partition(".")
+            rows = sorted(rows, key=lambda r: (r.get(column) is None, r.get(column)),
+                          reverse=direction.startswith("desc"))
+
+        total = len(rows)
+        offset = int(params.get("offset", 0))
+        rows = rows[offset:]
+        if "limit" in params:
+            rows = rows[:int(params["limit"])]
+
+        select = params.get("select", "*")
+        if select != "*":
+            columns = select.split(",")
+            rows = [{c: r.get(c) for c in columns} for r in rows]
+
+        extra = {}
+        if "count=" in headers.get("Prefer", ""):
+            end = offset + len(rows) - 1
+            extra["Content-Range"] = f"{offset}-{end}/{total}" if rows else f"*/{total}"
+        return 200, extra, rows
+
+    def _rpc(self, function: str, params: Dict[str, Any]):
+        if function == "spotify_log_stats":
+            rows = self.rows("spotify_logs")
+            played = [r["played_at"] for r in rows]
+            return 200, {}, {
+                "total_plays": len(rows),
+                "estimated_rows": len(rows),
+                "unique_tracks": len({r.get("track_id") for r in rows}),
+                "unique_artists": len({r.get("artist_id") for r in rows}),
+                "total_duration_ms": sum(r.get("duration_ms") or 0 for r in rows),
+                "first_played_at": min(played) if played else None,
+                "last_played_at": max(played) if played else None,
+            }
+        if function == "rebuild_spotify_aggregates":
+            return 200, {}, None
+        if function == "dedupe_spotify_logs":
+            rows = self.rows("spotify_logs")
+            seen = set()
+            doomed = set()
+            for row in sorted(rows, key=lambda r: r["id"]):
+                key = (row.get("track_id"), row.get("played_at"))
+                if key in seen and len(doomed) < params.get("batch_size", 10_000):
+                    doomed.add(row["id"])
+                seen.add(key)
+            self.tables["spotify_logs"] = [r for r in rows if r["id"] not in doomed]
+            return 200, {}, len(doomed)
+        return 404, {}, {
+            "code": "PGRST202",
+            "details": None,
+            "hint": None,
+            "message": f"Could not find the function public.{function} without parameters in the schema cache",
+        }
+
+    def _delete(self, table, query):
+        doomed = {id(r) for r in self._filter(self.rows(table), query)}
+        self.tables[table] = [r for r in self.rows(table) if id(r) not in doomed]
+        return 204, {}, None
+
+
+def _played_ms(item: Dict[str, Any]) -> int:
+    """アイテムの played_at をミリ秒Unixタイムスタンプに変換する"""
+    return int(datetime.fromisoformat(item["played_at"].replace("Z", "+00:00")).timestamp() * 1000)
+
+
+class FakeSpotify(FakeServer):
+    """
+    /api/token と /v1/me/player/recently-played を提供するSpotify互換のスタブ
+
+    リフレッシュトークンごとに再生履歴を持ち、before/after/limit とカーソル、
+    next を本物と同じ形で返す。rate_limit_every を指定するとN回に1回429を返す。
+    """
+
+    def __init__(
+        self,
+        histories: Dict[str, List[Dict[str, Any]]] | None = None,
+        rate_limit_every: int = 0,
+        retry_after: float = 0,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.histories: Dict[str, List[Dict[str, Any]]] = {}
+        self._played: Dict[str, List[int]] = {}
+        for refresh_token, items in (histories or {}).items():
+            self.set_history(refresh_token, items)
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self._served = 0
+        self.rate_limited = 0
+
+    @property
+    def token_url(self) -> str:
+        return f"{self.url}/api/token"
+
+    @property
+    def api_base_url(self) -> str:
+        return f"{self.url}/v1"
+
+    def set_history(self, refresh_token: str, items: List[Dict[str, Any]]) -> None:
+        """ユーザーの再生履歴を設定する（新しい順に並べ替えて保持）"""
+        ordered = sorted(items, key=_played_ms, reverse=True)
+        with self._lock:
+            self.histories[refresh_token] = ordered
+            self._played[refresh_token] = [_played_ms(i) for i in ordered]
+
+    def add_plays(self, refresh_token: str, items: List[Dict[str, Any]]) -> None:
+        """ユーザーの再生履歴に再生を追加する"""
+        self.set_history(refresh_token, self.histories.get(refresh_token, []) + list(items))
+
+    def route(self, method, path, query, headers, body):
+        with self._lock:
+            self._served += 1
+            if self.rate_limit_every and self._served % self.rate_limit_every == 0:
+                self.rate_limited += 1
+                return 429, {"Retry-After": str(self.retry_after)}, {"error": {"status": 429}}
+
+        if method == "POST" and path == "/api/token":
+            form = dict(parse_qsl(body.decode()))
+            refresh_token = form.get("refresh_token", "")
+            if refresh_token not in self.histories:
+                return 400, {}, {"error": "invalid_grant"}
+            return 200, {}, {"access_token": f"access-{refresh_token}", "token_type": "Bearer", "expires_in": 3600}
+
+        if method == "GET" and path == "/v1/me/player/recently-played":
+            auth = headers.get("Authorization", "")
+            refresh_token = auth.removeprefix("Bearer access-")
+            if not auth.startswith("Bearer access-") or refresh_token not in self.histories:
+                return 401, {}, {"error": {"status": 401, "message": "The access token expired"}}
+            return 200, {}, self._recently_played(refresh_token, dict(query))
+
+        return 404, {}, {"error": {"status": 404}}
+
+    def _recently_played(self, refresh_token: str, params: Dict[str, str]) -> Dict[str, Any]:
+        items = self.histories[refresh_token]
+        played = self._played[refresh_token]
+        limit = min(int(params.get("limit", 20)), 50)
+
+        if "after" in params:
+            # after より新しい再生のうち古い方から limit 件を、新しい順で返す
+            after = int(params["after"])
+            newer = [i for i, ms in enumerate(played) if ms > after]
+            selected = newer[-limit:]
+            remaining = len(newer) - len(selected)
+        else:
+            before = int(params["before"]) if "before" in params else None
+            older = [i for i, ms in enumerate(played) if before is None or ms < before]
+            selected = older[:limit]
+            remaining = len(older) - len(selected)
+
+        page = [items[i] for i in selected]
+        cursors = None
+        if page:
+            cursors = {"after": str(played[selected[0]]), "before": str(played[selected[-1]])}
+
+        next_url = None
+        if remaining > 0 and cursors:
+            if "after" in params:
+                next_url = f"{self.api_base_url}/me/player/recently-played?after={cursors['after']}&limit={limit}"
+            else:
+                next_url = f"{self.api_base_url}/me/player/recently-played?before={cursors['before']}&limit={limit}"
+
+        return {"items": page, "cursors": cursors, "next": next_url, "limit": limit}
@@ -0,0 +1,87 @@
+"""
+モジュール: cmd/benchmark/synthetic.py
+ベンチマーク用の合成リスニング履歴を生成する。
+"""
+
+import random
+from datetime import datetime, timezone
+from typing import List, Dict, Any
+
+
+def _spotify_id(rng: random.Random) -> str:
+    """Spotify IDと同じ22文字のbase62文字列を生成する"""
+    alphabet = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+    return "".join(rng.choice(alphabet) for _ in range(22))
+
+
+def make_catalog(n_tracks: int = 500, n_artists: int = 60, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    recently-playedの "track" オブジェクトと同じ形のトラックカタログを生成する
+
+    Args:
+        n_tracks: トラック数
+        n_artists: アーティスト数
+        seed: 乱数シード
+
+    Returns:
+        トラックオブジェクトのリスト
+    """
+    rng = random.Random(seed)
+    artists = [{"id": _spotify_id(rng), "name": f"Artist {i}"} for i in range(n_artists)]
+    albums = [
+        {"id": _spotify_id(rng), "name": f"Album {i}", "artist": rng.choice(artists)}
+        for i in range(max(1, n_tracks // 8))
+    ]
+
+    catalog = []
+    for i in range(n_tracks):
+        album = rng.choice(albums)
+        track_id = _spotify_id(rng)
+        catalog.append({
+            "id": track_id,
+            "name": f"Track {i}",
+            "artists": [album["artist"]],
+            "album": {"id": album["id"], "name": album["name"]},
+            "duration_ms": rng.randint(120_000, 420_000),
+            "popularity": rng.randint(0, 100),
+            "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+        })
+    return catalog
+
+
+def generate_plays(
+    n_plays: int,
+    start_ms: int | None = None,
+    catalog: List[Dict[str, Any]] | None = None,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    recently-playedのアイテム形式で合成再生履歴を生成する（古い順）
+
+    Args:
+        n_plays: 再生数
+        start_ms: 最初の再生のミリ秒Unixタイムスタンプ（省略時は最後の再生が現在時刻より前になる時刻）
+        catalog: 使用するトラックカタログ（省略時は生成）
+        seed: 乱数シード
+
+    Returns:
+        {"track": ..., "played_at": ...} 形式のアイテムのリスト
+    """
+    rng = random.Random(seed)
+    catalog = catalog or make_catalog(seed=seed)
+    if start_ms is None:
+        now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+        start_ms = now_ms - n_plays * 480_000
+
+    # 人気曲に偏った分布にする
+    weights = [1.0 / (rank + 1) for rank in range(len(catalog))]
+    played_ms = start_ms
+    items = []
+    for track in rng.choices(catalog, weights=weights, k=n_plays):
+        played_ms += track["duration_ms"] + rng.randint(0, 60_000)
+        played_at = datetime.fromtimestamp(played_ms / 1000, tz=timezone.utc)
+        items.append({
+            "track": track,
+            "played_at": played_at.strftime("%Y-%m-%dT%H:%M:%S.") + f"{played_ms % 1000:03d}Z",
+        })
+    return items
@@ -0,0 +1,54 @@
+"""
+モジュール: cmd/buildSnapshots/build_snapshots.py
+保存済みログ全体からダッシュボード用のスナップショットをすべて作り直す。
+履歴のインポートや重複の除去など、収集サイクルを通らずにログを書き換えた後に実行する。
+
+使い方:
+    python cmd/buildSnapshots/build_snapshots.py
+    python cmd/buildSnapshots/build_snapshots.py --storage sqlite:spotify_logs.db --dir docs/data
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from config.config import config_manager  # noqa: E402
+from main import create_storage_backend, parse_storage_spec  # noqa: E402
+from useCase.snapshots import SnapshotWriter  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--storage", type=parse_storage_spec, default=None,
+                        help="集計元のストレージ（種類[:場所]、省略時はアプリケーション設定）")
+    parser.add_argument("--dir", default=config_manager.config.snapshot_dir,
+                        help="スナップショットの出力先（省略時はアプリケーション設定）")
+    parser.add_argument("--top-limit", type=int, default=config_manager.config.snapshot_top_limit,
+                        help="上位トラック・アーティストの件数")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    args = parser.parse_args()
+
+    if not args.dir:
+        print("❌ Snapshot directory is not configured, pass --dir")
+        sys.exit(1)
+
+    storage = create_storage_backend(args.storage)
+    started = time.perf_counter()
+    try:
+        result = SnapshotWriter(args.dir, top_limit=args.top_limit).rebuild(storage)
+    finally:
+        storage.close()
+    result["seconds"] = round(time.perf_counter() - started, 3)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"📊 Rebuilt snapshots in {result['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+モジュール: cmd/compactLog/compact_log.py
+保存済みログの (track_id, played_at) の重複を除き、ファイルのストレージは played_at 順に書き直す。
+ファイルは外部マージソートで一定のメモリのまま書き直し、Supabaseはサーバー側の関数で少しずつ削除する。
+
+使い方:
+    python cmd/compactLog/compact_log.py
+    python cmd/compactLog/compact_log.py --storage csv:spotify_logs.csv --batch-size 200000
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from main import create_storage_backend, parse_storage_spec  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--storage", type=parse_storage_spec, default=None,
+                        help="対象のストレージ（種類[:場所]、省略時はアプリケーション設定）")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="一度に処理する行数（ファイルはメモリ上で並べる行数、Supabaseは1回に削除する行数）")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    args = parser.parse_args()
+
+    storage = create_storage_backend(args.storage)
+    started = time.perf_counter()
+    try:
+        if args.batch_size is None:
+            stats = storage.deduplicate()
+        else:
+            stats = storage.deduplicate(args.batch_size)
+    except NotImplementedError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        storage.close()
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return
+    print(f"📊 Compacted in {stats['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+モジュール: cmd/importHistory/import_history.py
+Spotifyのデータエクスポート（StreamingHistory*.json / endsong_*.json）の再生履歴を、設定されたストレージに取り込む。
+recently-played APIで取得できない直近50件より前の履歴を、保存済みの行と重複させずに一括で追加する。
+
+使い方:
+    python cmd/importHistory/import_history.py ~/Downloads/my_spotify_data/
+    python cmd/importHistory/import_history.py endsong_0.json endsong_1.json --workers 4 --min-ms-played 0
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from main import create_storage_backend  # noqa: E402
+from useCase.history_import import MIN_MS_PLAYED, find_export_files, import_history  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("paths", nargs="+", help="エクスポートのJSONファイル、またはそれを含むディレクトリ")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="解析に使うプロセス数")
+    parser.add_argument("--batch-size", type=int, default=5000, help="1回の保存で書き込む件数")
+    parser.add_argument("--min-ms-played", type=int, default=MIN_MS_PLAYED,
+                        help="これより短い再生（ミリ秒）はスキップする（Spotifyの再生回数と同じ30秒が既定）")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    args = parser.parse_args()
+
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        print(f"❌ Not found: {', '.join(missing)}")
+        sys.exit(1)
+    if not find_export_files(args.paths):
+        print("❌ No StreamingHistory*.json / endsong_*.json files found")
+        sys.exit(1)
+
+    storage = create_storage_backend()
+    try:
+        stats = import_history(
+            args.paths,
+            storage,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            min_ms_played=args.min_ms_played,
+        )
+    finally:
+        storage.close()
+
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return
+    print(
+        f"✅ : Imported {stats['imported']} plays from {stats['files']} files in {stats['seconds']}s "
+        f"({stats['entries_per_second']} entries/s, {stats['duplicates']} duplicates, {stats['skipped']} skipped)"
+    )
+
+
+if __name__ == "__main__":
+    main()
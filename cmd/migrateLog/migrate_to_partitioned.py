@@ -0,0 +1,76 @@
+"""
+モジュール: cmd/migrateLog/migrate_to_partitioned.py
+単一ファイルのCSVログを月ごとのパーティション分割レイアウトへ移行する。
+元のファイルは変更せず、一定行数ずつ読みながら追記するため、ログ全体をメモリに載せない。
+
+使い方:
+    python cmd/migrateLog/migrate_to_partitioned.py --source spotify_logs.csv --dest spotify_logs
+"""
+
+import argparse
+import csv
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from LogRepository.csv_storage import FIELDNAMES  # noqa: E402
+from LogRepository.partitioned_csv_storage import PartitionedCSVStorage  # noqa: E402
+
+
+def migrate(source: str, dest: str, compression: str = "auto", batch_size: int = 50_000) -> int:
+    """
+    CSVログをパーティション分割ストレージへコピーする
+
+    Args:
+        source: 移行元のCSVファイル
+        dest: 移行先のディレクトリ（空である必要がある）
+        compression: 締まったパーティションの圧縮方式
+        batch_size: 一度に追記する行数
+
+    Returns:
+        移行した行数
+    """
+    storage = PartitionedCSVStorage(dest, compression=compression)
+    if storage.get_stats()["partitions"]:
+        raise ValueError(f"{dest} には既にパーティションがあります")
+
+    migrated = 0
+    with open(source, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        missing = set(FIELDNAMES) - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"{source} に列がありません: {', '.join(sorted(missing))}")
+
+        batch = []
+        for row in reader:
+            batch.append({name: row[name] for name in FIELDNAMES})
+            if len(batch) >= batch_size:
+                migrated += storage.append_rows(batch)
+                batch = []
+                print(f"📊 Migrated {migrated} rows")
+        migrated += storage.append_rows(batch)
+
+    compressed = storage.compress_closed_partitions()
+    print(f"✅ : {migrated} rows migrated to {dest} ({len(compressed)} partitions compressed)")
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--source", default="spotify_logs.csv", help="移行元のCSVファイル")
+    parser.add_argument("--dest", default="spotify_logs", help="移行先のディレクトリ")
+    parser.add_argument("--compression", default="auto", choices=["auto", "zstd", "gzip", "none"],
+                        help="締まったパーティションの圧縮方式")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="一度に追記する行数")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"❌ {args.source} not found")
+        sys.exit(1)
+    migrate(args.source, args.dest, args.compression, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
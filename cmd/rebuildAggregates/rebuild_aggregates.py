@@ -0,0 +1,42 @@
+"""
+モジュール: cmd/rebuildAggregates/rebuild_aggregates.py
+設定されたストレージの保存済みログ全体から、トラック別・アーティスト別の集計を作り直す。
+集計ファイル・集計テーブルが壊れた場合や、既存のログに集計を後から追加した場合に使う。
+
+使い方:
+    python cmd/rebuildAggregates/rebuild_aggregates.py
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from main import create_storage_backend  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--top", type=int, default=5, help="作り直した後に表示する上位トラック数")
+    args = parser.parse_args()
+
+    storage = create_storage_backend()
+    started = time.perf_counter()
+    try:
+        storage.rebuild_aggregates()
+        ranking = storage.track_ranking(args.top)
+    except NotImplementedError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        storage.close()
+
+    print(f"📊 Rebuilt in {time.perf_counter() - started:.2f}s")
+    for rank, row in enumerate(ranking, 1):
+        print(f"  {rank:>3}. {row['play_count']:>6} plays  {row['track_name']} / {row['artist_name']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+モジュール: cmd/syncStorage/sync_storage.py
+あるストレージの再生履歴を別のストレージへ同期する（CSVからSupabaseへの移行など）。
+移行先にない行だけを期間ごとに一括で書き込み、中断してもチェックポイントから再開する。
+
+使い方:
+    python cmd/syncStorage/sync_storage.py --source csv --dest supabase
+    python cmd/syncStorage/sync_storage.py --source csv:old_logs.csv --dest sqlite:spotify_logs.db --window-days 7
+"""
+
+import argparse
+import json
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from main import create_storage_backend, parse_storage_spec  # noqa: E402
+from useCase.cursor_cache import CursorCache  # noqa: E402
+from useCase.storage_sync import sync_storage  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--source", type=parse_storage_spec, required=True, help="移行元（種類[:場所]）")
+    parser.add_argument("--dest", type=parse_storage_spec, required=True, help="移行先（種類[:場所]）")
+    parser.add_argument("--batch-size", type=int, default=5000, help="1回の保存で書き込む行数")
+    parser.add_argument("--window-days", type=float, default=30, help="一度に照合する期間（日）")
+    parser.add_argument("--checkpoint", default=".spotify_sync_checkpoint.json", help="チェックポイントのファイル")
+    parser.add_argument("--full", action="store_true", help="チェックポイントを無視して全期間を照合する")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    args = parser.parse_args()
+
+    source_key = CursorCache.key_for(args.source)
+    dest_key = CursorCache.key_for(args.dest)
+    if source_key == dest_key:
+        print("❌ Source and destination are the same storage")
+        sys.exit(1)
+
+    source = create_storage_backend(args.source)
+    dest = create_storage_backend(args.dest)
+    try:
+        for name, storage in (("Source", source), ("Destination", dest)):
+            if not storage.is_available():
+                print(f"❌ {name} storage '{storage.__class__.__name__}' is not available")
+                sys.exit(1)
+        stats = sync_storage(
+            source,
+            dest,
+            batch_size=args.batch_size,
+            window=timedelta(days=args.window_days),
+            checkpoint=CursorCache(args.checkpoint),
+            checkpoint_key=f"{source_key} -> {dest_key}",
+            full=args.full,
+        )
+    except NotImplementedError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        source.close()
+        dest.close()
+
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return
+    print(
+        f"✅ : Transferred {stats['transferred']} rows ({stats['existing']} already present, "
+        f"{stats['scanned']} scanned in {stats['windows']} windows) in {stats['seconds']}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
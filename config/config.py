@@ -6,10 +6,9 @@ Spotifyログアプリケーションの設定管理。
 import os
 from typing import Literal
 from dataclasses import dataclass
-from dotenv import load_dotenv
 
 
-StorageType = Literal["csv", "supabase"]
+StorageType = Literal["csv", "partitioned_csv", "parquet", "sqlite", "sqlite_normalized", "supabase"]
 
 
 @dataclass
@@ -19,9 +18,52 @@ class AppConfig:
     # ストレージ設定
     storage_type: StorageType = "supabase"
     csv_file_path: str = "spotify_logs.csv"
+    partition_dir: str = "spotify_logs"
+    partition_compression: str = "auto"
+    parquet_dir: str = "spotify_logs_parquet"
+    sqlite_path: str = "spotify_logs.db"
+    normalized_sqlite_path: str = "spotify_logs_normalized.db"
+    supabase_batch_size: int = 500
+    # Supabaseの統計情報（ヘルスチェックを兼ねる）をキャッシュする秒数
+    supabase_stats_ttl: float = 300.0
+
+    # 先行書き込みスプール設定（Noneでスプールを使わない。保存先が実行ごとに消える環境では効果がないため既定は無効）
+    spool_dir: str | None = None
+    spool_segment_bytes: int = 1024 * 1024
+    spool_max_bytes: int = 64 * 1024 * 1024
+
+    # ダッシュボード用スナップショットの出力先（Noneで書き出さない）と上位トラック・アーティストの件数
+    snapshot_dir: str | None = None
+    snapshot_top_limit: int = 100
 
     # Spotify API設定
     fetch_limit: int = 50
+    # ページングの上限（Noneで期間を取り切るまで取得）
+    fetch_max_pages: int | None = None
+    fetch_max_items: int | None = None
+
+    # アクセストークンのキャッシュ設定（Noneで永続化しない）
+    token_cache_path: str | None = ".spotify_token_cache.json"
+    token_refresh_margin: int = 300
+
+    # ストレージごとの最後に保存した played_at のキャッシュ（Noneで使わない）
+    cursor_cache_path: str | None = ".spotify_cursor.json"
+
+    # HTTP設定
+    http_pool_size: int = 10
+    http_timeout: float = 10.0
+    http_max_retries: int = 3
+
+    # デーモンモード設定（秒）
+    daemon_min_interval: float = 300.0
+    daemon_max_interval: float = 3600.0
+
+    # 複数アカウントモードの同時実行数
+    account_concurrency: int = 10
+
+    # メトリクスの出力先（Noneで計測しない）と形式（"auto" / "prometheus" / "jsonl"）
+    metrics_path: str | None = None
+    metrics_format: str = "auto"
 
     # アプリケーション設定
     debug: bool = False
@@ -31,36 +73,77 @@ class ConfigManager:
     """環境変数とデフォルト値から設定を処理する設定マネージャー"""
 
     def __init__(self):
-        """環境変数から設定を初期化する"""
-        # .envファイルを読み込む
-        load_dotenv()
-        
-        # 設定を初期化
+        """設定を初期化する（.envファイルは環境変数が必要になった時点で読み込む）"""
         self.config = AppConfig()
-
-    def get_storage_config(self) -> dict:
-        """ストレージ固有の設定を取得する"""
-        if self.config.storage_type == "csv":
+        self._env_loaded = False
+
+    def load_env(self) -> None:
+        """.envファイルを一度だけ読み込む"""
+        if self._env_loaded:
+            return
+        # 起動時間を抑えるため、環境変数を使うまでdotenvをインポートしない
+        from dotenv import load_dotenv
+        load_dotenv()
+        self._env_loaded = True
+
+    def get_storage_config(self, storage_type: str | None = None) -> dict:
+        """
+        ストレージ固有の設定を取得する
+
+        Args:
+            storage_type: ストレージの種類（省略時は AppConfig.storage_type）
+        """
+        self.load_env()
+        storage_type = storage_type or self.config.storage_type
+        if storage_type == "csv":
             return {
                 "type": "csv",
                 "file_path": self.config.csv_file_path
             }
-        elif self.config.storage_type == "supabase":
+        elif storage_type == "partitioned_csv":
+            return {
+                "type": "partitioned_csv",
+                "directory": self.config.partition_dir,
+                "compression": self.config.partition_compression
+            }
+        elif storage_type == "parquet":
+            return {
+                "type": "parquet",
+                "directory": self.config.parquet_dir
+            }
+        elif storage_type == "sqlite":
+            return {
+                "type": "sqlite",
+                "path": self.config.sqlite_path
+            }
+        elif storage_type == "sqlite_normalized":
+            return {
+                "type": "sqlite_normalized",
+                "path": self.config.normalized_sqlite_path
+            }
+        elif storage_type == "supabase":
             return {
                 "type": "supabase",
                 "url": os.getenv("SUPABASE_URL"),
-                "key": os.getenv("SUPABASE_KEY")
+                "key": os.getenv("SUPABASE_KEY"),
+                "batch_size": self.config.supabase_batch_size,
+                "stats_ttl": self.config.supabase_stats_ttl
             }
         else:
-            raise ValueError(f"Unsupported storage type: {self.config.storage_type}")
+            raise ValueError(f"Unsupported storage type: {storage_type}")
 
     def get_spotify_config(self) -> dict:
         """Spotify API設定を取得する"""
+        self.load_env()
         return {
             "client_id": os.getenv("SPOTIFY_CLIENT_ID"),
             "client_secret": os.getenv("SPOTIFY_CLIENT_SECRET"),
             "refresh_token": os.getenv("SPOTIFY_REFRESH_TOKEN"),
-            "fetch_limit": self.config.fetch_limit
+            "token_url": os.getenv("SPOTIFY_TOKEN_URL", "https://accounts.spotify.com/api/token"),
+            "api_base_url": os.getenv("SPOTIFY_API_BASE_URL", "https://api.spotify.com/v1"),
+            "fetch_limit": self.config.fetch_limit,
+            "fetch_max_pages": self.config.fetch_max_pages,
+            "fetch_max_items": self.config.fetch_max_items
         }
 
     def validate(self) -> list[str]:
@@ -92,9 +175,20 @@ class ConfigManager:
         print(f"  Storage Type: {self.config.storage_type}")
         print(f"  Fetch Limit: {self.config.fetch_limit}")
         print(f"  Debug Mode: {self.config.debug}")
+        print(f"  Spool Directory: {self.config.spool_dir or '無効'}")
+        print(f"  Snapshot Directory: {self.config.snapshot_dir or '無効'}")
+        print(f"  Metrics: {self.config.metrics_path or '無効'}")
 
         if self.config.storage_type == "csv":
             print(f"  CSV File Path: {self.config.csv_file_path}")
+        elif self.config.storage_type == "partitioned_csv":
+            print(f"  Partition Directory: {self.config.partition_dir}")
+        elif self.config.storage_type == "parquet":
+            print(f"  Parquet Directory: {self.config.parquet_dir}")
+        elif self.config.storage_type == "sqlite":
+            print(f"  SQLite Database: {self.config.sqlite_path}")
+        elif self.config.storage_type == "sqlite_normalized":
+            print(f"  SQLite Database (normalized): {self.config.normalized_sqlite_path}")
         elif self.config.storage_type == "supabase":
             print("  Supabase: 環境変数で設定済み")
 
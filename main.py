@@ -4,64 +4,376 @@
 設定可能なストレージバックエンドを使用したSpotifyログ収集のメインスクリプト。
 """
 
-import time
+import argparse
+import os
+import signal
 import sys
+import threading
+import time
 from datetime import datetime, timezone
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Dict, List
 
 # モジュールのインポート
+# ストレージバックエンドと複数アカウントモードは使うときにだけインポートし、起動時間を抑える
 from useCase.auth import SpotifyAuth
 from useCase.data_fetcher import SpotifyDataFetcher
+from useCase.normalizer import normalize_pages
+from useCase.cursor_cache import CursorCache
+from useCase.storage_session import StorageSession
 from config.config import config_manager
-from LogRepository.csv_storage import CSVStorage
-from LogRepository.supabase_storage import SupabaseStorage
 from LogRepository.base_storage import BaseStorage
+from LogRepository.spool import WriteAheadSpool
+from useCase.snapshots import SnapshotWriter
+from useCase.scheduler import AdaptivePollScheduler
+from useCase.http_client import HttpClient
+from metrics.metrics import configure_metrics, get_metrics
 
+if TYPE_CHECKING:
+    from useCase.multi_account import AccountConfig
 
-def create_storage_backend() -> BaseStorage:
-    """設定に基づいてストレージバックエンドを作成する"""
-    storage_config = config_manager.get_storage_config()
 
-    if storage_config["type"] == "csv":
-        return CSVStorage(storage_config["file_path"])
-    elif storage_config["type"] == "supabase":
-        return SupabaseStorage(storage_config["url"], storage_config["key"])
-    else:
+def _csv_storage(storage_config: dict) -> BaseStorage:
+    from LogRepository.csv_storage import CSVStorage
+    return CSVStorage(storage_config["file_path"])
+
+
+def _partitioned_csv_storage(storage_config: dict) -> BaseStorage:
+    from LogRepository.partitioned_csv_storage import PartitionedCSVStorage
+    return PartitionedCSVStorage(storage_config["directory"], storage_config.get("compression", "auto"))
+
+
+def _parquet_storage(storage_config: dict) -> BaseStorage:
+    from LogRepository.parquet_storage import ParquetStorage
+    return ParquetStorage(storage_config["directory"])
+
+
+def _sqlite_storage(storage_config: dict) -> BaseStorage:
+    from LogRepository.sqlite_storage import SQLiteStorage
+    return SQLiteStorage(storage_config["path"])
+
+
+def _normalized_sqlite_storage(storage_config: dict) -> BaseStorage:
+    from LogRepository.normalized_sqlite_storage import NormalizedSQLiteStorage
+    return NormalizedSQLiteStorage(storage_config["path"])
+
+
+def _supabase_storage(storage_config: dict) -> BaseStorage:
+    from LogRepository.supabase_storage import SupabaseStorage
+    return SupabaseStorage(
+        storage_config["url"],
+        storage_config["key"],
+        batch_size=storage_config.get("batch_size", 500),
+        stats_ttl=storage_config.get("stats_ttl", 300.0),
+    )
+
+
+# ストレージ種別 -> バックエンドを作成する関数（モジュールは作成時に初めてインポートされる）
+STORAGE_BACKENDS: Dict[str, Callable[[dict], BaseStorage]] = {
+    "csv": _csv_storage,
+    "partitioned_csv": _partitioned_csv_storage,
+    "parquet": _parquet_storage,
+    "sqlite": _sqlite_storage,
+    "sqlite_normalized": _normalized_sqlite_storage,
+    "supabase": _supabase_storage,
+}
+
+
+def create_storage_backend(storage_config: dict | None = None) -> BaseStorage:
+    """
+    設定に基づいてストレージバックエンドを作成する
+
+    Args:
+        storage_config: ストレージ設定（省略時はアプリケーション設定）
+    """
+    storage_config = storage_config or config_manager.get_storage_config()
+
+    factory = STORAGE_BACKENDS.get(storage_config["type"])
+    if factory is None:
         raise ValueError(f"Unsupported storage type: {storage_config['type']}")
+    return factory(storage_config)
+
+
+# 「種類:場所」の場所を設定するキー
+STORAGE_LOCATION_KEYS = {
+    "csv": "file_path",
+    "partitioned_csv": "directory",
+    "parquet": "directory",
+    "sqlite": "path",
+    "sqlite_normalized": "path",
+    "supabase": "url",
+}
+
+
+def parse_storage_spec(value: str) -> dict:
+    """
+    「種類」または「種類:場所」をストレージ設定に変換する（場所を省略するとアプリケーション設定を使う）
+
+    コマンドラインツールの argparse の type として使う。
+
+    Args:
+        value: 例: csv、sqlite:spotify_logs.db、partitioned_csv:spotify_logs
+
+    Returns:
+        create_storage_backend に渡すストレージ設定
+    """
+    storage_type, _, location = value.partition(":")
+    if storage_type not in STORAGE_BACKENDS:
+        raise argparse.ArgumentTypeError(
+            f"unknown storage type '{storage_type}' (choose from {', '.join(STORAGE_BACKENDS)})"
+        )
+    storage_config = config_manager.get_storage_config(storage_type)
+    if location:
+        storage_config[STORAGE_LOCATION_KEYS[storage_type]] = location
+    return storage_config
+
+
+def create_cursor_cache() -> CursorCache | None:
+    """設定に基づいてカーソルキャッシュを返す（無効化されている場合はNone）"""
+    path = config_manager.config.cursor_cache_path
+    return CursorCache(path) if path else None
+
+
+def create_spool(name: str | None = None) -> WriteAheadSpool | None:
+    """
+    設定に基づいて先行書き込みスプールを開く
+
+    Args:
+        name: アカウント名（指定するとアカウントごとのサブディレクトリを使う）
+
+    Returns:
+        スプール、または無効化されている場合はNone
+    """
+    directory = config_manager.config.spool_dir
+    if not directory:
+        return None
+    if name is not None:
+        directory = os.path.join(directory, name)
+    return WriteAheadSpool(
+        directory,
+        segment_bytes=config_manager.config.spool_segment_bytes,
+        max_bytes=config_manager.config.spool_max_bytes,
+    )
 
 
-def should_fetch_new_tracks(storage: BaseStorage, fetcher: SpotifyDataFetcher) -> tuple[bool, Optional[str]]:
+def create_snapshot_writer(name: str | None = None) -> SnapshotWriter | None:
     """
-    最後に保存されたタイムスタンプに基づいて新しいトラックを取得すべきかどうかを判定する
+    設定に基づいてダッシュボード用スナップショットの書き出し先を作成する
+
+    Args:
+        name: アカウント名（指定するとアカウントごとのサブディレクトリを使う）
 
     Returns:
-        (should_fetch, last_timestamp_unix) のタプル
+        スナップショットの書き出し、または無効化されている場合はNone
+    """
+    directory = config_manager.config.snapshot_dir
+    if not directory:
+        return None
+    if name is not None:
+        directory = os.path.join(directory, name)
+    return SnapshotWriter(directory, top_limit=config_manager.config.snapshot_top_limit)
+
+
+def create_storage_session(storage_config: dict | None = None, account: str | None = None) -> StorageSession:
     """
-    last_saved = storage.get_last_saved_timestamp()
+    書き込みが必要になるまでストレージを作らないセッションを作成する
+
+    Args:
+        storage_config: ストレージ設定（省略時はアプリケーション設定）
+        account: アカウント名（カーソルキャッシュのキーに含める）
+    """
+    storage_config = storage_config or config_manager.get_storage_config()
+    return StorageSession(
+        lambda: create_storage_backend(storage_config),
+        create_cursor_cache(),
+        CursorCache.key_for(storage_config, account),
+    )
+
+
+def save_records(storage: BaseStorage, records) -> None:
+    """ストレージに書き込み、所要時間と行数をメトリクスに記録する"""
+    backend = storage.__class__.__name__
+    metrics = get_metrics()
+    with metrics.span("storage_write", backend=backend):
+        storage.save_tracks(records)
+    metrics.count("rows_written", len(records), backend=backend)
+
 
-    if last_saved is None:
-        # 以前のデータがない場合、すべての最近のトラックを取得
-        return True, None
+def replay_spool(
+    spool: WriteAheadSpool,
+    session: StorageSession,
+    snapshots: SnapshotWriter | None = None,
+) -> bool:
+    """
+    前回までに保存できなかったエントリをまとめて再送する
 
-    # Spotify API用にミリ秒Unixタイムスタンプに変換
-    last_timestamp = int(last_saved.timestamp() * 1000)
+    Args:
+        spool: 先行書き込みスプール
+        session: 保存先のストレージのセッション
+        snapshots: 再送したレコードの月を書き出し対象に加えるスナップショット
 
-    # タイムスタンプフィルターで取得して最近のトラックがあるかチェック
+    Returns:
+        ストレージに書き込めた場合はTrue
+    """
+    pending = spool.pending_count()
+    spooled = spool.last_played_at()
+    storage = session.storage()
+    if not session.available:
+        print(f"⚠️ : Keeping {pending} spooled batches for the next cycle")
+        return False
+    print(f"🔁 Replaying {pending} spooled batches")
+    if snapshots is not None:
+        # 再送に失敗しても、書き出し時にストレージの内容から作り直すだけなので先に加えておく
+        for _, records in spool.pending():
+            snapshots.touch(records)
     try:
-        recent_tracks = fetcher.fetch_recent_tracks_since(str(last_timestamp), limit=1)
-        return len(recent_tracks) > 0, str(last_timestamp)
+        with get_metrics().span("spool_replay", backend=session.backend):
+            replayed = spool.replay(storage)
     except Exception as e:
-        if config_manager.config.debug:
-            print(f"Debug: Error checking for new tracks: {e}")
-        # チェックできない場合は取得すべきと仮定
-        return True, None
+        print(f"⚠️ : Spool replay failed, keeping {spool.pending_count()} batches for the next cycle: {e}")
+        return False
+    if spooled is not None:
+        session.remember(int(spooled.timestamp() * 1000))
+    get_metrics().count("rows_replayed", replayed, backend=session.backend)
+    print(f"✅ : Replayed {replayed} spooled tracks")
+    return True
 
 
-def run_collection_cycle():
-    """1回の収集サイクルを実行: トラックを取得して保存"""
-    print(f"🚀 Starting Spotify logs collection at {datetime.now(timezone.utc).isoformat()}")
+def publish_snapshots(snapshots: SnapshotWriter, session: StorageSession) -> None:
+    """保存後の段階として、変更のあったスナップショットを書き出す（失敗しても収集は失敗にしない）"""
+    try:
+        with get_metrics().span("snapshots", backend=session.backend):
+            snapshots.publish(session.storage())
+    except Exception as e:
+        print(f"⚠️ : Could not write snapshots, retrying on the next cycle: {e}")
 
-    # 設定の検証
+
+def collect_tracks(
+    fetcher: SpotifyDataFetcher,
+    session: StorageSession,
+    should_stop: Callable[[], bool] | None = None,
+    spool: WriteAheadSpool | None = None,
+    snapshots: SnapshotWriter | None = None,
+) -> int:
+    """
+    前回保存以降のトラックを取得して保存する
+
+    先にSpotifyへ問い合わせ、保存するページが届いた時点で初めてストレージを作成してヘルスチェックする。
+    前回の保存位置はカーソルキャッシュから読み、キャッシュにない場合だけストレージに問い合わせる。
+    スプールを指定すると、未確認のエントリを先に再送し、各ページをスプールにfsyncしてから
+    ストレージに書き込む。ストレージへの書き込みに失敗した後のページはスプールにだけ記録し、
+    次のサイクルで再送する。
+    スナップショットを指定すると、保存を終えた後で保存した再生の影響を受けるシャードだけを書き出す。
+
+    Args:
+        fetcher: Spotifyデータ取得
+        session: 保存先のストレージのセッション
+        should_stop: Trueを返したら次のページを取得せずに終了する
+        spool: 先行書き込みスプール
+        snapshots: ダッシュボード用スナップショットの書き出し
+
+    Returns:
+        保存したトラック数
+    """
+    metrics = get_metrics()
+    storage_ok = True
+    if spool is not None and spool.pending_count():
+        storage_ok = replay_spool(spool, session, snapshots)
+
+    try:
+        since_ms = session.last_saved_ms()
+    except Exception as e:
+        if spool is None:
+            raise
+        print(f"⚠️ : Could not read the last saved timestamp, spooling only: {e}")
+        since_ms = None
+        storage_ok = False
+
+    # スプールに残っている分は取得済みなので、その続きから取得する
+    spooled = spool.last_played_at() if spool is not None else None
+    if spooled is not None:
+        since_ms = max(since_ms or 0, int(spooled.timestamp() * 1000))
+
+    since_timestamp = None
+    if since_ms is None:
+        print("📊 No last saved timestamp found, fetching all tracks")
+    else:
+        since_timestamp = str(since_ms)
+        print(f"📊 Fetching tracks since timestamp: {since_timestamp}")
+
+    # ページを受け取るたびにレコードへ変換して保存し、最後のページを待たずに書き込みを進める
+    fetched = 0
+    pages = fetcher.iter_recent_track_pages(
+        after=since_timestamp,
+        limit=config_manager.config.fetch_limit,
+    )
+    for records in normalize_pages(pages):
+        print(f"📊 Fetched page of {len(records)} tracks")
+        if storage_ok:
+            # 保存するものが届いてから接続する
+            storage = session.storage()
+            if not session.available:
+                if spool is None:
+                    raise RuntimeError(f"Storage backend '{storage.__class__.__name__}' is not available")
+                storage_ok = False
+
+        if spool is None:
+            save_records(storage, records)
+            session.remember(max(record.played_at_ms for record in records))
+            if snapshots is not None:
+                snapshots.touch(records)
+        else:
+            with metrics.span("spool_append"):
+                entry_id = spool.append(records)
+            if storage_ok:
+                # ストレージに書き込む前にスプールへの追記を永続化する
+                with metrics.span("spool_sync"):
+                    spool.sync()
+                try:
+                    save_records(storage, records)
+                except Exception as e:
+                    print(f"⚠️ : Save failed, spooling the remaining pages for replay: {e}")
+                    storage_ok = False
+                else:
+                    spool.ack(entry_id)
+                    session.remember(max(record.played_at_ms for record in records))
+                    if snapshots is not None:
+                        snapshots.touch(records)
+        fetched += len(records)
+        if should_stop is not None and should_stop():
+            print("🛑 Stop requested, skipping remaining pages")
+            break
+
+    if spool is not None:
+        with metrics.span("spool_sync"):
+            spool.sync()
+        if not storage_ok:
+            raise RuntimeError(
+                f"Storage is unavailable, {spool.pending_count()} batches are kept in the spool for replay"
+            )
+
+    if snapshots is not None and snapshots.dirty:
+        publish_snapshots(snapshots, session)
+
+    if fetched == 0:
+        print("✅ : No tracks to save")
+        return 0
+
+    print(f"📊 Fetched {fetched} tracks")
+
+    if config_manager.config.debug:
+        # ストレージ統計の表示（デバッグ時のみ問い合わせる）
+        storage = session.storage()
+        if hasattr(storage, 'get_stats'):
+            with metrics.span("storage_stats", backend=session.backend):
+                stats = storage.get_stats()
+            print(f"📊 Storage stats: {stats}")
+        print(f"📊 HTTP stats: {fetcher.http.stats()}")
+
+    return fetched
+
+
+def validate_config() -> bool:
+    """設定を検証し、エラーがあれば表示する"""
     errors = config_manager.validate()
     if errors:
         print("❌ Configuration errors:")
@@ -71,51 +383,37 @@ def run_collection_cycle():
 
     if config_manager.config.debug:
         config_manager.print_config()
+    return True
+
+
+def run_collection_cycle():
+    """1回の収集サイクルを実行: トラックを取得して保存"""
+    print(f"🚀 Starting Spotify logs collection at {datetime.now(timezone.utc).isoformat()}")
+
+    # 設定の検証
+    if not validate_config():
+        return False
 
     try:
-        # コンポーネントの初期化
+        # コンポーネントの初期化（ストレージは保存するページが届くまで作らない）
         auth = SpotifyAuth()
         fetcher = SpotifyDataFetcher(auth)
-        storage = create_storage_backend()
-
-        # ストレージが利用可能かチェック
-        if not storage.is_available():
-            print(f"❌ Storage backend '{config_manager.config.storage_type}' is not available")
-            return False
+        session = create_storage_session()
+        spool = create_spool()
+        snapshots = create_snapshot_writer()
 
         print("✅ : Components initialized successfully")
-        
-        last_saved = storage.get_last_saved_timestamp()
-        
-        tracks = []
-        print(f"📊 Last saved timestamp: {last_saved}")
-        if last_saved is None:
-            print("📊 No last saved timestamp found, fetching all tracks")
-            tracks = fetcher.fetch_recent_tracks(config_manager.config.fetch_limit)
-
-        else:
-            print(f"📊 Last saved timestamp found: {last_saved}")
-            since_timestamp = str(int(last_saved.timestamp() * 1000))
 
-            # トラックの取得
-            print(f"📊 Fetching tracks since timestamp: {since_timestamp}")
-            tracks = fetcher.fetch_recent_tracks_since(since_timestamp)
-        
-        if len(tracks) == 0:
-            print("✅ : No tracks to save")
-            return True
-
-        print(f"📊 Fetched {len(tracks)} tracks")
-
-        # トラックの保存
-        storage.save_tracks(tracks)
-
-        # ストレージ統計の表示
-        if hasattr(storage, 'get_stats'):
-            stats = storage.get_stats()
-            if config_manager.config.debug:
-                print(f"📊 Storage stats: {stats}")
+        metrics = get_metrics()
+        try:
+            with metrics.span("cycle"):
+                saved = collect_tracks(fetcher, session, spool=spool, snapshots=snapshots)
+        finally:
+            session.close()
+            if spool is not None:
+                spool.close()
 
+        metrics.flush(mode="once", ok=True, tracks=saved)
         print("✅ : Collection cycle completed successfully")
         return True
 
@@ -124,17 +422,225 @@ def run_collection_cycle():
         if config_manager.config.debug:
             import traceback
             traceback.print_exc()
+        get_metrics().flush(mode="once", ok=False, error=str(e))
+        return False
+
+
+def run_daemon(min_interval: float, max_interval: float) -> bool:
+    """
+    デーモンモード: コンポーネントを保持したまま収集サイクルを繰り返す
+
+    再生が続いている間は min_interval まで間隔を縮め、アイドル時は max_interval まで広げる。
+    SIGTERM / SIGINT を受けると実行中のページの保存を終えてから停止する。
+
+    Args:
+        min_interval: 最短のポーリング間隔（秒）
+        max_interval: 最長のポーリング間隔（秒）
+
+    Returns:
+        正常に停止した場合はTrue
+    """
+    print(f"🚀 Starting Spotify logs daemon at {datetime.now(timezone.utc).isoformat()}")
+
+    if not validate_config():
+        return False
+
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"🛑 Received signal {signum}, shutting down after the current cycle")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    auth = SpotifyAuth()
+    fetcher = SpotifyDataFetcher(auth)
+    # ストレージは最初に保存するページが届いた時点で作成し、以降のサイクルでも使い回す
+    session = create_storage_session()
+    spool = create_spool()
+    # 書き出しに失敗した月は次のサイクルで保存と合わせて書き出す
+    snapshots = create_snapshot_writer()
+
+    print("✅ : Components initialized successfully")
+
+    scheduler = AdaptivePollScheduler(min_interval, max_interval)
+    metrics = get_metrics()
+    try:
+        while not stop.is_set():
+            print(f"🔄 Collection cycle at {datetime.now(timezone.utc).isoformat()}")
+            try:
+                with metrics.span("cycle"):
+                    saved = collect_tracks(
+                        fetcher, session, should_stop=stop.is_set, spool=spool, snapshots=snapshots
+                    )
+                interval = scheduler.record(saved)
+                metrics.flush(mode="daemon", ok=True, tracks=saved)
+            except Exception as e:
+                print(f"❌ Error during collection cycle: {e}")
+                if config_manager.config.debug:
+                    import traceback
+                    traceback.print_exc()
+                interval = scheduler.record_failure()
+                metrics.flush(mode="daemon", ok=False, error=str(e))
+
+            if not stop.is_set():
+                print(f"💤 Next poll in {interval:.1f}s")
+                stop.wait(interval)
+    finally:
+        # 保留中の書き込みをフラッシュしてから終了する
+        session.close()
+        if spool is not None:
+            spool.close()
+        fetcher.http.close()
+
+    print("✅ : Daemon stopped")
+    return True
+
+
+def account_storage_config(account: "AccountConfig") -> dict:
+    """
+    アカウントのストレージ設定を返す（未指定の項目はアプリケーション設定を使用）
+
+    ログにはアカウントの列がないため、保存先はアカウントごとに分ける。
+    ファイルのストレージは場所を省略するとアカウント名を付けたファイル・ディレクトリを使う。
+
+    Raises:
+        ValueError: Supabaseで接続先を指定していない（他のアカウントと同じテーブルに保存する）場合
+    """
+    storage_config = {**config_manager.get_storage_config(), **account.storage}
+    location_key = STORAGE_LOCATION_KEYS[storage_config["type"]]
+    if location_key not in account.storage:
+        if storage_config["type"] == "supabase":
+            raise ValueError(
+                f"Account '{account.name}' must set storage.url: accounts cannot share one Supabase table"
+            )
+        # 並行書き込みでロックを奪い合わず、最後に保存した played_at も混ざらないようにアカウントごとに分ける
+        root, ext = os.path.splitext(storage_config[location_key])
+        storage_config[location_key] = f"{root}_{account.name}{ext}"
+    return storage_config
+
+
+def check_account_storage(accounts: List["AccountConfig"]) -> None:
+    """
+    すべてのアカウントが別々のストレージに保存することを確認する
+
+    Raises:
+        ValueError: 同じストレージに保存するアカウントがある場合
+    """
+    owners: Dict[str, str] = {}
+    for account in accounts:
+        key = CursorCache.key_for(account_storage_config(account))
+        if key in owners:
+            raise ValueError(f"Accounts '{owners[key]}' and '{account.name}' share the storage {key}")
+        owners[key] = account.name
+
+
+def collect_account(account: "AccountConfig", http_client: HttpClient | None = None) -> int:
+    """
+    1アカウント分の認証→取得→保存を実行する
+
+    Args:
+        account: アカウント設定
+        http_client: 全アカウントで共有するHTTPクライアント
+
+    Returns:
+        保存したトラック数
+    """
+    auth = SpotifyAuth(http_client=http_client, credentials=account.credentials)
+    fetcher = SpotifyDataFetcher(auth)
+    session = create_storage_session(account_storage_config(account), account.name)
+    spool = create_spool(account.name)
+    snapshots = create_snapshot_writer(account.name)
+    try:
+        with get_metrics().span("cycle", account=account.name):
+            return collect_tracks(fetcher, session, spool=spool, snapshots=snapshots)
+    finally:
+        session.close()
+        if spool is not None:
+            spool.close()
+
+
+def run_accounts(accounts_path: str, concurrency: int) -> bool:
+    """
+    複数アカウントモード: 設定ファイルの全アカウントを並行して収集する
+
+    Args:
+        accounts_path: アカウント設定ファイルのパス
+        concurrency: 同時に収集するアカウント数の上限
+
+    Returns:
+        全アカウントが成功した場合はTrue
+    """
+    from useCase.multi_account import collect_accounts, load_accounts, summarize
+
+    print(f"🚀 Starting multi-account collection at {datetime.now(timezone.utc).isoformat()}")
+
+    # アカウント設定は環境変数名で認証情報を参照するため、先に.envを読み込む
+    config_manager.load_env()
+    accounts = load_accounts(accounts_path)
+    try:
+        check_account_storage(accounts)
+    except ValueError as e:
+        print(f"❌ {e}")
         return False
+    # 同時実行数ぶんのkeep-alive接続を共有する
+    http_client = HttpClient(
+        pool_size=max(concurrency, config_manager.config.http_pool_size),
+        timeout=config_manager.config.http_timeout,
+        max_retries=config_manager.config.http_max_retries,
+    )
+
+    started = time.perf_counter()
+    results = collect_accounts(
+        accounts,
+        lambda account: collect_account(account, http_client),
+        concurrency=concurrency,
+    )
+    summary = summarize(results, time.perf_counter() - started)
+    http_client.close()
+    get_metrics().flush(
+        mode="accounts", ok=summary["failed"] == 0,
+        accounts=summary["accounts"], tracks=summary["tracks"],
+    )
 
+    for account in summary["per_account"]:
+        mark = "✅" if account["ok"] else "❌"
+        detail = account.get("error") or f"{account['tracks']} tracks in {account['seconds']}s"
+        print(f"{mark} : [{account['name']}] {detail}")
+    print(
+        f"📊 {summary['succeeded']}/{summary['accounts']} accounts, {summary['tracks']} tracks "
+        f"in {summary['wall_seconds']}s ({summary['tracks_per_second']} tracks/s)"
+    )
+    return summary["failed"] == 0
 
 
 def main():
     """メインエントリーポイント"""
-    # 単一の収集サイクルを実行
-    success = run_collection_cycle()
+    parser = argparse.ArgumentParser(description="Spotifyの再生履歴を収集して保存する")
+    parser.add_argument("--daemon", action="store_true", help="常駐して適応的な間隔で収集を繰り返す")
+    parser.add_argument("--accounts", metavar="PATH", help="複数アカウントの設定ファイル（JSON）を並行して収集する")
+    parser.add_argument("--concurrency", type=int, default=config_manager.config.account_concurrency,
+                        help="複数アカウントモードで同時に収集するアカウント数")
+    parser.add_argument("--min-interval", type=float, default=config_manager.config.daemon_min_interval,
+                        help="デーモンモードの最短ポーリング間隔（秒）")
+    parser.add_argument("--max-interval", type=float, default=config_manager.config.daemon_max_interval,
+                        help="デーモンモードの最長ポーリング間隔（秒）")
+    parser.add_argument("--metrics", metavar="PATH", default=config_manager.config.metrics_path,
+                        help="サイクルごとのメトリクスの出力先（.prom ならPrometheusのテキストファイル、それ以外はJSON Lines）")
+    args = parser.parse_args()
+
+    configure_metrics(args.metrics, config_manager.config.metrics_format)
+
+    if args.accounts:
+        success = run_accounts(args.accounts, args.concurrency)
+    elif args.daemon:
+        success = run_daemon(args.min_interval, args.max_interval)
+    else:
+        # 単一の収集サイクルを実行
+        success = run_collection_cycle()
     sys.exit(0 if success else 1)
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,251 @@
+"""
+モジュール: metrics.py
+収集サイクルの各フェーズの所要時間（スパン）と件数（カウンタ）を記録し、
+Prometheusのテキストファイル、またはJSON Lines として書き出す。
+出力先を設定しない場合は何もしない NullMetrics を使い、計測のコストをほぼゼロにする。
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Tuple
+
+# メトリクス名の接頭辞（Prometheus）
+PREFIX = "spotify_logs"
+
+# (名前, ((ラベル名, 値), ...))
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, Any]) -> MetricKey:
+    if not labels:
+        return name, ()
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class _Span:
+    """with文の間の経過時間を Metrics に記録する"""
+
+    __slots__ = ("metrics", "key", "started")
+
+    def __init__(self, metrics: "Metrics", key: MetricKey):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.key, time.perf_counter() - self.started)
+        return False
+
+
+class _NullSpan:
+    """何もしないスパン（NullMetrics が毎回同じインスタンスを返す）"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullMetrics:
+    """計測しない場合のメトリクス（すべて何もしない）"""
+
+    enabled = False
+
+    def span(self, name: str, **labels) -> _NullSpan:
+        return _NULL_SPAN
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        pass
+
+    def flush(self, **info) -> None:
+        pass
+
+
+class Metrics:
+    """
+    スパンとカウンタをサイクル単位で集計するメトリクス
+
+    スパンは名前とラベルごとに回数・合計秒数・最大秒数を持つ。flush() で現在のサイクルの値を
+    書き出してプロセス全体の累計に加え、次のサイクルの集計を始める。
+    """
+
+    enabled = True
+
+    def __init__(self, path: str, fmt: str = "auto"):
+        """
+        メトリクスを初期化する
+
+        Args:
+            path: 出力先のパス
+            fmt: "prometheus"（テキストファイルを置き換え）、"jsonl"（サイクルごとに1行追記）、
+                "auto"（拡張子が .prom ならprometheus、それ以外はjsonl）
+        """
+        if fmt == "auto":
+            fmt = "prometheus" if path.endswith(".prom") else "jsonl"
+        if fmt not in ("prometheus", "jsonl"):
+            raise ValueError(f"Unsupported metrics format: {fmt}")
+        self.path = path
+        self.format = fmt
+        self._lock = threading.Lock()
+        # key -> [count, sum_seconds, max_seconds]
+        self._spans: Dict[MetricKey, list] = {}
+        self._counters: Dict[MetricKey, float] = {}
+        self._total_spans: Dict[MetricKey, list] = {}
+        self._total_counters: Dict[MetricKey, float] = {}
+        self.cycles = 0
+
+    def span(self, name: str, **labels) -> _Span:
+        """
+        with文で囲んだ区間の所要時間を記録する
+
+        Args:
+            name: フェーズ名（例: fetch_page）
+            **labels: ラベル（例: backend="SQLiteStorage"）
+        """
+        return _Span(self, _key(name, labels))
+
+    def observe(self, key: MetricKey, seconds: float) -> None:
+        """計測済みの所要時間を記録する"""
+        with self._lock:
+            entry = self._spans.get(key)
+            if entry is None:
+                self._spans[key] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                if seconds > entry[2]:
+                    entry[2] = seconds
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        """
+        カウンタを加算する
+
+        Args:
+            name: カウンタ名（例: rows_written）
+            value: 加算する値
+            **labels: ラベル
+        """
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """現在のサイクルの値を、JSONに変換できる形で返す"""
+        with self._lock:
+            return {
+                "spans": [
+                    {"name": name, **dict(labels), "count": c, "seconds": round(s, 6), "max_seconds": round(m, 6)}
+                    for (name, labels), (c, s, m) in self._spans.items()
+                ],
+                "counters": [
+                    {"name": name, **dict(labels), "value": value}
+                    for (name, labels), value in self._counters.items()
+                ],
+            }
+
+    def flush(self, **info) -> None:
+        """
+        現在のサイクルの値を書き出し、累計に加えてからリセットする
+
+        Args:
+            **info: JSON Lines の行に加える情報（例: mode="daemon", ok=True）
+        """
+        with self._lock:
+            for key, (c, s, m) in self._spans.items():
+                total = self._total_spans.setdefault(key, [0, 0.0, 0.0])
+                total[0] += c
+                total[1] += s
+                total[2] = max(total[2], m)
+            for key, value in self._counters.items():
+                self._total_counters[key] = self._total_counters.get(key, 0) + value
+            self.cycles += 1
+
+        if self.format == "jsonl":
+            line = {"time": datetime.now(timezone.utc).isoformat(), **info, **self.snapshot()}
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        else:
+            self._write_prometheus()
+
+        with self._lock:
+            self._spans = {}
+            self._counters = {}
+
+    def _write_prometheus(self) -> None:
+        """累計をPrometheusのテキスト形式で書き出す（node_exporterのtextfile collector向けに原子的に置き換える）"""
+        lines = [
+            f"# HELP {PREFIX}_span_seconds Time spent in each collection phase.",
+            f"# TYPE {PREFIX}_span_seconds summary",
+        ]
+        with self._lock:
+            spans = sorted(self._total_spans.items())
+            counters = sorted(self._total_counters.items())
+            cycles = self.cycles
+        for (name, labels), (c, s, _m) in spans:
+            label_text = _labels({"span": name, **dict(labels)})
+            lines.append(f"{PREFIX}_span_seconds_sum{label_text} {s:.6f}")
+            lines.append(f"{PREFIX}_span_seconds_count{label_text} {c}")
+        lines.append(f"# HELP {PREFIX}_span_max_seconds Slowest single occurrence of each phase.")
+        lines.append(f"# TYPE {PREFIX}_span_max_seconds gauge")
+        for (name, labels), (_c, _s, m) in spans:
+            lines.append(f"{PREFIX}_span_max_seconds{_labels({'span': name, **dict(labels)})} {m:.6f}")
+        for name in sorted({name for (name, _labels), _value in counters}):
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            for (counter, labels), value in counters:
+                if counter == name:
+                    lines.append(f"{PREFIX}_{name}_total{_labels(dict(labels))} {value:g}")
+        lines.append(f"# TYPE {PREFIX}_cycles_total counter")
+        lines.append(f"{PREFIX}_cycles_total {cycles}")
+        lines.append(f"# TYPE {PREFIX}_last_flush_timestamp_seconds gauge")
+        lines.append(f"{PREFIX}_last_flush_timestamp_seconds {time.time():.3f}")
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+_metrics: Metrics | NullMetrics = NullMetrics()
+
+
+def get_metrics() -> Metrics | NullMetrics:
+    """プロセス共有のメトリクスを返す（未設定なら何もしない NullMetrics）"""
+    return _metrics
+
+
+def configure_metrics(path: str | None, fmt: str = "auto") -> Metrics | NullMetrics:
+    """
+    プロセス共有のメトリクスの出力先を設定する
+
+    Args:
+        path: 出力先のパス（Noneで計測しない）
+        fmt: 出力形式（Metrics を参照）
+
+    Returns:
+        設定したメトリクス
+    """
+    global _metrics
+    _metrics = Metrics(path, fmt) if path else NullMetrics()
+    return _metrics
@@ -0,0 +1,345 @@
+"""
+モジュール: useCase/analytics.py
+保存済みの再生履歴から、READMEのSupabaseビュー（spotify_stats、track_ranking、artist_distribution）と
+同じ集計をプロセス内で計算する。
+文字列の列を整数コードに辞書エンコードし、バッチごとにNumPyでグループ集計するため、
+メモリ使用量は再生数ではなくバッチサイズと値の種類数に比例する。
+"""
+
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Dict, Iterator, List
+
+try:
+    import numpy as np
+except ImportError:  # numpyは集計を使う場合のみ必要
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+from LogRepository.aggregates import percentage
+from LogRepository.base_storage import BaseStorage
+from LogRepository.csv_storage import played_at_to_ms
+from LogRepository.parquet_storage import ParquetStorage
+
+
+# ビューの GROUP BY に対応するキー
+TRACK_KEY = ("track_name", "artist_name", "album_name", "external_urls")
+ARTIST_KEY = ("artist_name", "artist_id")
+STRING_COLUMNS = ("track_name", "artist_name", "album_name", "external_urls", "track_id", "artist_id", "album_id")
+NUMERIC_COLUMNS = ("played_at", "duration_ms", "popularity")
+
+INT64_MIN = -(2 ** 63)
+# この値の範囲までは表引きでコードを振り直す
+DENSE_LIMIT = 1 << 22
+
+
+class Dictionary:
+    """値を出現順の整数コードに対応付ける辞書"""
+
+    def __init__(self):
+        self.codes: Dict[Any, int] = {}
+        self.values: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def code(self, value: Any) -> int:
+        """値のコードを返す（初出の値には新しいコードを割り当てる）"""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def encode(self, column) -> "np.ndarray":
+        """
+        列をコードの配列に変換する
+
+        Arrowの列はバッチ内の辞書エンコードをC++側で行い、
+        辞書の値（種類数ぶん）だけをPythonで引く。
+
+        Args:
+            column: 値のシーケンス、またはArrowの配列
+
+        Returns:
+            int64のコード配列
+        """
+        if pa is not None and isinstance(column, (pa.Array, pa.ChunkedArray)):
+            if isinstance(column, pa.ChunkedArray):
+                column = column.combine_chunks()
+            if not pa.types.is_dictionary(column.type):
+                column = pc.dictionary_encode(column)
+            dictionary = column.dictionary.to_pylist()
+            mapping = np.fromiter((self.code(v) for v in dictionary), dtype=np.int64, count=len(dictionary))
+            return mapping[column.indices.to_numpy(zero_copy_only=False)]
+        return np.fromiter((self.code(v) for v in column), dtype=np.int64, count=len(column))
+
+    def encode_rows(self, *code_columns: "np.ndarray") -> "np.ndarray":
+        """
+        複数列のコードの組をひとつのコードに変換する
+
+        Args:
+            code_columns: 同じ長さのコード配列
+
+        Returns:
+            組ごとのコード配列
+        """
+        # 1次元の整数に詰めてから種類ごとのコードに振り直す（毎回詰め直すためオーバーフローしない）
+        packed, first = _densify(code_columns[0])
+        for column in code_columns[1:]:
+            packed, first = _densify(packed * (int(column.max()) + 1) + column)
+
+        keys = zip(*(column[first].tolist() for column in code_columns))
+        mapping = np.fromiter((self.code(key) for key in keys), dtype=np.int64, count=len(first))
+        return mapping[packed]
+
+
+def _densify(values: "np.ndarray") -> tuple:
+    """
+    非負整数の配列を 0 から始まる連番のコードに振り直す
+
+    Returns:
+        (コードの配列, 各コードの値が現れる位置の配列)
+    """
+    size = int(values.max()) + 1
+    if size > DENSE_LIMIT:
+        _, first, inverse = np.unique(values, return_index=True, return_inverse=True)
+        return inverse.reshape(-1), first
+    # 値の範囲が小さい場合はソートせずに表引きで振り直す
+    present = np.zeros(size, dtype=bool)
+    present[values] = True
+    position = np.empty(size, dtype=np.int32)
+    position[values] = np.arange(len(values), dtype=np.int32)
+    return (np.cumsum(present, dtype=np.int32) - 1)[values].astype(np.int64), position[present]
+
+
+def _grow(values: "np.ndarray", size: int, fill: int = 0) -> "np.ndarray":
+    """配列を size まで fill で伸ばす"""
+    if len(values) >= size:
+        return values
+    return np.concatenate([values, np.full(size - len(values), fill, dtype=values.dtype)])
+
+
+def _sum_by(codes: "np.ndarray", values: "np.ndarray", size: int) -> "np.ndarray":
+    totals = np.zeros(size, dtype=np.int64)
+    np.add.at(totals, codes, values)
+    return totals
+
+
+def _iso(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).isoformat()
+
+
+class PlayAnalytics:
+    """再生履歴をバッチ単位で取り込み、ビューと同じ集計を保持する"""
+
+    def __init__(self):
+        if np is None:
+            raise ImportError("集計には numpy が必要です（pip install numpy）")
+
+        self.columns = {name: Dictionary() for name in STRING_COLUMNS}
+        self.tracks = Dictionary()
+        self.artists = Dictionary()
+
+        self.total_plays = 0
+        self.total_duration_ms = 0
+        self.popularity_sum = 0
+        self.popularity_count = 0
+
+        self.track_plays = np.zeros(0, dtype=np.int64)
+        self.track_duration = np.zeros(0, dtype=np.int64)
+        self.track_popularity_sum = np.zeros(0, dtype=np.int64)
+        self.track_popularity_count = np.zeros(0, dtype=np.int64)
+        self.track_last_played = np.zeros(0, dtype=np.int64)
+        self.artist_plays = np.zeros(0, dtype=np.int64)
+        self.artist_duration = np.zeros(0, dtype=np.int64)
+        # (アーティストのコード << 32 | track_id のコード) の重複なし配列
+        self.artist_track_pairs = np.zeros(0, dtype=np.int64)
+
+    def add_batch(self, batch: Dict[str, Any]) -> None:
+        """
+        1バッチ分の列を取り込む
+
+        Args:
+            batch: STRING_COLUMNS の各列と、played_at（ミリ秒）、duration_ms、
+                popularity（欠損はNaN）の数値配列を持つ辞書
+        """
+        played = np.asarray(batch["played_at"], dtype=np.int64)
+        if len(played) == 0:
+            return
+        duration = np.asarray(batch["duration_ms"], dtype=np.int64)
+        popularity = np.asarray(batch["popularity"], dtype=np.float64)
+        has_popularity = ~np.isnan(popularity)
+        popularity = np.where(has_popularity, popularity, 0).astype(np.int64)
+
+        codes = {name: self.columns[name].encode(batch[name]) for name in STRING_COLUMNS}
+        track = self.tracks.encode_rows(*(codes[name] for name in TRACK_KEY))
+        artist = self.artists.encode_rows(*(codes[name] for name in ARTIST_KEY))
+        n_tracks, n_artists = len(self.tracks), len(self.artists)
+
+        self.total_plays += len(played)
+        self.total_duration_ms += int(duration.sum())
+        self.popularity_sum += int(popularity.sum())
+        self.popularity_count += int(has_popularity.sum())
+
+        self.track_plays = _grow(self.track_plays, n_tracks) + np.bincount(track, minlength=n_tracks)
+        self.track_duration = _grow(self.track_duration, n_tracks) + _sum_by(track, duration, n_tracks)
+        self.track_popularity_sum = _grow(self.track_popularity_sum, n_tracks) + _sum_by(track, popularity, n_tracks)
+        self.track_popularity_count = (
+            _grow(self.track_popularity_count, n_tracks) + np.bincount(track, weights=has_popularity, minlength=n_tracks).astype(np.int64)
+        )
+        self.track_last_played = _grow(self.track_last_played, n_tracks, INT64_MIN)
+        np.maximum.at(self.track_last_played, track, played)
+
+        self.artist_plays = _grow(self.artist_plays, n_artists) + np.bincount(artist, minlength=n_artists)
+        self.artist_duration = _grow(self.artist_duration, n_artists) + _sum_by(artist, duration, n_artists)
+        pairs = (artist << 32) | codes["track_id"]
+        self.artist_track_pairs = np.union1d(self.artist_track_pairs, pairs)
+
+    def spotify_stats(self) -> Dict[str, Any]:
+        """
+        spotify_stats ビューと同じ集計を返す
+
+        Returns:
+            total_plays、unique_tracks、unique_artists、unique_albums、total_duration_ms、avg_popularity
+        """
+        return {
+            "total_plays": self.total_plays,
+            "unique_tracks": len(self.columns["track_id"]),
+            "unique_artists": len(self.columns["artist_id"]),
+            "unique_albums": len(self.columns["album_id"]),
+            "total_duration_ms": self.total_duration_ms if self.total_plays else None,
+            "avg_popularity": self.popularity_sum / self.popularity_count if self.popularity_count else None,
+        }
+
+    def track_ranking(self, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        track_ranking ビューと同じ集計を再生数の多い順に返す（同数の順序はビューと同様に不定）
+
+        Args:
+            limit: 返す最大件数（省略時はすべて）
+
+        Returns:
+            トラックごとの集計のリスト
+        """
+        order = np.argsort(-self.track_plays, kind="stable")[:limit]
+        names = {name: self.columns[name].values for name in TRACK_KEY}
+        ranking = []
+        for index in order.tolist():
+            key = self.tracks.values[index]
+            count = int(self.track_popularity_count[index])
+            ranking.append({
+                "track_name": names["track_name"][key[0]],
+                "artist_name": names["artist_name"][key[1]],
+                "album_name": names["album_name"][key[2]],
+                "play_count": int(self.track_plays[index]),
+                "avg_popularity": int(self.track_popularity_sum[index]) / count if count else None,
+                "total_duration_ms": int(self.track_duration[index]),
+                "last_played": _iso(int(self.track_last_played[index])),
+                "external_urls": names["external_urls"][key[3]],
+            })
+        return ranking
+
+    def artist_distribution(self, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        artist_distribution ビューと同じ集計を再生数の多い順に返す
+
+        percentage はSQLの ROUND(numeric, 2) と同じく四捨五入（0から遠い方へ丸める）で計算する。
+
+        Args:
+            limit: 返す最大件数（省略時はすべて）
+
+        Returns:
+            アーティストごとの集計のリスト
+        """
+        unique_tracks = np.bincount(self.artist_track_pairs >> 32, minlength=len(self.artists))
+        order = np.argsort(-self.artist_plays, kind="stable")[:limit]
+        names = {name: self.columns[name].values for name in ARTIST_KEY}
+        distribution = []
+        for index in order.tolist():
+            key = self.artists.values[index]
+            plays = int(self.artist_plays[index])
+            distribution.append({
+                "artist_name": names["artist_name"][key[0]],
+                "artist_id": names["artist_id"][key[1]],
+                "play_count": plays,
+                "percentage": percentage(plays, self.total_plays),
+                "unique_tracks": int(unique_tracks[index]),
+                "total_duration_ms": int(self.artist_duration[index]),
+            })
+        return distribution
+
+
+def iter_batches(
+    storage: BaseStorage,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    batch_size: int = 100_000,
+) -> Iterator[Dict[str, Any]]:
+    """
+    ストレージの行を PlayAnalytics.add_batch の形式のバッチで読み出す
+
+    ParquetStorageは必要な列だけをArrowのまま読み、それ以外は query() の行をまとめる。
+
+    Args:
+        storage: 読み出すストレージ
+        start: 範囲の開始（含む）
+        end: 範囲の終了（含まない）
+        batch_size: バッチあたりの最大行数
+
+    Yields:
+        列名をキーに持つバッチ
+    """
+    if isinstance(storage, ParquetStorage):
+        columns = list(STRING_COLUMNS + NUMERIC_COLUMNS)
+        for record_batch in storage.iter_batches(columns, start, end, batch_size):
+            batch = {name: record_batch.column(name) for name in STRING_COLUMNS}
+            batch["played_at"] = record_batch.column("played_at").cast(pa.int64()).to_numpy()
+            batch["duration_ms"] = record_batch.column("duration_ms").to_numpy(zero_copy_only=False)
+            batch["popularity"] = record_batch.column("popularity").cast(pa.float64()).fill_null(float("nan")).to_numpy()
+            yield batch
+        return
+
+    rows = storage.query(start, end)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            return
+        batch = {name: [row[name] for row in chunk] for name in STRING_COLUMNS}
+        batch["played_at"] = np.fromiter((played_at_to_ms(row["played_at"]) for row in chunk), dtype=np.int64, count=len(chunk))
+        batch["duration_ms"] = np.fromiter((int(row["duration_ms"]) for row in chunk), dtype=np.int64, count=len(chunk))
+        batch["popularity"] = np.fromiter(
+            (float(row["popularity"]) if row["popularity"] not in ("", None) else np.nan for row in chunk),
+            dtype=np.float64,
+            count=len(chunk),
+        )
+        yield batch
+
+
+def analyze(
+    storage: BaseStorage,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    batch_size: int = 100_000,
+) -> PlayAnalytics:
+    """
+    ストレージの再生履歴を集計する
+
+    Args:
+        storage: 読み出すストレージ
+        start: 範囲の開始（含む、省略時は最初から）
+        end: 範囲の終了（含まない、省略時は最後まで）
+        batch_size: バッチあたりの最大行数
+
+    Returns:
+        集計済みの PlayAnalytics
+    """
+    analytics = PlayAnalytics()
+    for batch in iter_batches(storage, start, end, batch_size):
+        analytics.add_batch(batch)
+    return analytics
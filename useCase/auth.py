@@ -4,26 +4,50 @@
 アクセストークンの期限切れ時に自動的にリフレッシュする。
 """
 
+import time
 from base64 import b64encode
-import requests
+from typing import Dict
 from config.config import config_manager
+from metrics.metrics import get_metrics
+from useCase.http_client import HttpClient, get_http_client
+from useCase.token_cache import TokenCache, is_fresh
 
 
 class SpotifyAuth:
     """Spotify認証を処理するクラス"""
 
-    def __init__(self):
-        """設定から認証情報を読み込み、初期化する"""
-        spotify_config = config_manager.get_spotify_config()
+    def __init__(
+        self,
+        http_client: HttpClient | None = None,
+        token_cache: TokenCache | None = None,
+        credentials: Dict[str, str] | None = None,
+    ):
+        """
+        設定から認証情報を読み込み、初期化する
+
+        Args:
+            http_client: 使用するHTTPクライアント（省略時はプロセス共有のクライアント）
+            token_cache: アクセストークンの永続キャッシュ（省略時は設定のパスを使用）
+            credentials: client_id / client_secret / refresh_token の辞書
+                （省略時は環境変数の認証情報を使用）
+        """
+        self.http = http_client or get_http_client()
+        spotify_config = {**config_manager.get_spotify_config(), **(credentials or {})}
         self.client_id = spotify_config["client_id"]
         self.client_secret = spotify_config["client_secret"]
         self.refresh_token = spotify_config["refresh_token"]
+        self.token_url = spotify_config["token_url"]
+        self.refresh_margin = config_manager.config.token_refresh_margin
         self._access_token = None
+        self._expires_at = 0.0
+
+        if token_cache is None and config_manager.config.token_cache_path:
+            token_cache = TokenCache(config_manager.config.token_cache_path)
+        self.token_cache = token_cache
+        self._cache_key = TokenCache.key_for(self.refresh_token or "")
 
     def refresh_access_token(self) -> str:
         """リフレッシュトークンを使用してアクセストークンを要求・リフレッシュする"""
-        url = "https://accounts.spotify.com/api/token"
-
         auth_str = f"{self.client_id}:{self.client_secret}"
         headers = {
             "Authorization": "Basic " + b64encode(auth_str.encode()).decode(),
@@ -35,19 +59,56 @@ class SpotifyAuth:
             "refresh_token": self.refresh_token,
         }
 
-        res = requests.post(url, headers=headers, data=data, timeout=10)
+        with get_metrics().span("token_refresh"):
+            res = self.http.post(self.token_url, headers=headers, data=data)
         res.raise_for_status()
 
-        self._access_token = res.json()["access_token"]
+        body = res.json()
+        self._access_token = body["access_token"]
+        self._expires_at = time.time() + body.get("expires_in", 3600)
+        if self.token_cache is not None:
+            self.token_cache.save(self._cache_key, self._access_token, self._expires_at)
+
         print("✅ : Access token refreshed")
         return self._access_token
 
     @property
     def token(self) -> str:
-        """現在のアクセストークンを返す（利用できない場合はリフレッシュ）"""
-        if not self._access_token:
+        """
+        現在のアクセストークンを返す
+
+        有効期限の refresh_margin 秒前からはリフレッシュする。永続キャッシュがある場合は
+        リフレッシュトークンごとのロックを取ってから再確認するため、同時に起動したプロセスのリフレッシュは1回で済み、
+        別のアカウントのリフレッシュは待たない。
+        """
+        if self._access_token and is_fresh(self._expires_at, self.refresh_margin):
+            return self._access_token
+
+        if self.token_cache is None:
             return self.refresh_access_token()
-        return self._access_token
+
+        with self.token_cache.lock(self._cache_key):
+            cached = self.token_cache.load(self._cache_key)
+            if cached and is_fresh(cached["expires_at"], self.refresh_margin):
+                self._access_token = cached["access_token"]
+                self._expires_at = cached["expires_at"]
+                return self._access_token
+            return self.refresh_access_token()
+
+    def invalidate(self, access_token: str | None = None) -> None:
+        """
+        拒否されたアクセストークンを破棄し、次回の token 参照でリフレッシュさせる
+
+        Args:
+            access_token: 401を受けたトークン（他プロセスが更新済みの新しいトークンは残す）
+        """
+        access_token = access_token or self._access_token
+        if access_token == self._access_token:
+            self._access_token = None
+            self._expires_at = 0.0
+        if self.token_cache is not None:
+            with self.token_cache.lock(self._cache_key):
+                self.token_cache.delete(self._cache_key, access_token)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+"""
+モジュール: cursor_cache.py
+ストレージごとの最後に保存した played_at（ミリ秒Unixタイムスタンプ）をローカルファイルに記録する。
+新しい再生がないサイクルで、ストレージのクライアントを作らずにSpotifyへ問い合わせるために使う。
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Any
+
+# 複数アカウントモードでは同じファイルを複数のスレッドが読み書きする
+_lock = threading.Lock()
+
+
+class CursorCache:
+    """ストレージの識別子ごとに最後に保存した played_at を保存するファイルキャッシュ"""
+
+    def __init__(self, path: str = ".spotify_cursor.json"):
+        """
+        カーソルキャッシュを初期化する
+
+        Args:
+            path: キャッシュファイルのパス
+        """
+        self.path = path
+
+    @staticmethod
+    def key_for(storage_config: Dict[str, Any], account: str | None = None) -> str:
+        """
+        ストレージ設定から、認証情報を含まない識別子を返す
+
+        Args:
+            storage_config: ストレージ設定
+            account: アカウント名（複数アカウントモードでアカウントごとのカーソルを分ける）
+        """
+        location = (
+            storage_config.get("file_path")
+            or storage_config.get("directory")
+            or storage_config.get("path")
+            or storage_config.get("url")
+        )
+        key = f"{storage_config['type']}:{location}"
+        return f"{key}#{account}" if account is not None else key
+
+    def _read_all(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write_all(self, data: Dict[str, Any]) -> None:
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self, key: str) -> int | None:
+        """
+        記録されたカーソルを取得する
+
+        Returns:
+            最後に保存した played_at のミリ秒Unixタイムスタンプ、またはNone
+        """
+        value = self._read_all().get(key)
+        return value if isinstance(value, int) else None
+
+    def save(self, key: str, played_at_ms: int) -> None:
+        """
+        カーソルを原子的に書き込む
+
+        Args:
+            key: ストレージの識別子
+            played_at_ms: 最後に保存した played_at のミリ秒Unixタイムスタンプ
+        """
+        with _lock:
+            data = self._read_all()
+            data[key] = played_at_ms
+            self._write_all(data)
+
+    def delete(self, key: str) -> None:
+        """カーソルを削除する（ストレージの状態と食い違った場合に使う）"""
+        with _lock:
+            data = self._read_all()
+            if data.pop(key, None) is not None:
+                self._write_all(data)
@@ -3,17 +3,37 @@
 Spotify APIからSpotifyリスニング履歴の取得を処理する。
 """
 
-import requests
-from typing import List, Dict, Any
+from typing import Iterator, List, Dict, Any
+from urllib.parse import urlencode
+from config.config import config_manager
+from metrics.metrics import get_metrics
 from useCase.auth import SpotifyAuth
+from useCase.http_client import HttpClient
 
 
 class SpotifyDataFetcher:
     """Spotifyリスニング履歴を取得するクラス"""
 
-    def __init__(self, spotify_auth: SpotifyAuth):
-        """Spotify認証で初期化する"""
+    def __init__(
+        self,
+        spotify_auth: SpotifyAuth,
+        http_client: HttpClient | None = None,
+        api_base_url: str | None = None,
+    ):
+        """
+        Spotify認証で初期化する
+
+        Args:
+            spotify_auth: Spotify認証
+            http_client: 使用するHTTPクライアント（省略時は認証と同じクライアントを共有）
+            api_base_url: Web APIのベースURL（省略時は設定値）
+        """
+        spotify_config = config_manager.get_spotify_config()
         self.spotify_auth = spotify_auth
+        self.http = http_client or spotify_auth.http
+        self.api_base_url = (api_base_url or spotify_config["api_base_url"]).rstrip("/")
+        self.max_pages = spotify_config["fetch_max_pages"]
+        self.max_items = spotify_config["fetch_max_items"]
 
     def fetch_recent_tracks(self, limit: int = 50) -> List[Dict[str, Any]]:
         """
@@ -25,27 +45,128 @@ class SpotifyDataFetcher:
         Returns:
             Spotify APIからのトラックアイテムのリスト
         """
-        url = f"https://api.spotify.com/v1/me/player/recently-played?limit={limit}"
-        headers = {"Authorization": f"Bearer {self.spotify_auth.token}"}
-        res = requests.get(url, headers=headers, timeout=10)
+        return list(self.iter_recent_tracks(limit=limit, max_pages=1))
 
-        res.raise_for_status()
-        return res.json()["items"]
-
-    def fetch_recent_tracks_since(self, since_timestamp: str, limit: int = 50) -> List[Dict[str, Any]]:
+    def fetch_recent_tracks_since(
+        self,
+        since_timestamp: str,
+        limit: int = 50,
+        max_pages: int | None = None,
+    ) -> List[Dict[str, Any]]:
         """
-        特定のタイムスタンプ以降の最近再生されたトラックを取得する
+        特定のタイムスタンプ以降の最近再生されたトラックを、カーソルをたどってすべて取得する
 
         Args:
             since_timestamp: このタイムスタンプ以降のトラックを取得するUnixタイムスタンプ
-            limit: 取得するトラック数（最大50）
+            limit: 1ページあたりのトラック数（最大50）
+            max_pages: 取得する最大ページ数（省略時は設定値）
 
         Returns:
             Spotify APIからのトラックアイテムのリスト
         """
-        url = f"https://api.spotify.com/v1/me/player/recently-played?after={since_timestamp}&limit={limit}"
-        headers = {"Authorization": f"Bearer {self.spotify_auth.token}"}
-        res = requests.get(url, headers=headers, timeout=10)
+        return list(self.iter_recent_tracks(after=since_timestamp, limit=limit, max_pages=max_pages))
+
+    def iter_recent_tracks(self, **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        iter_recent_track_pages のページを1アイテムずつ展開して返すジェネレータ
+
+        Args:
+            **kwargs: iter_recent_track_pages に渡す引数
+        """
+        for page in self.iter_recent_track_pages(**kwargs):
+            yield from page
+
+    def iter_recent_track_pages(
+        self,
+        after: str | None = None,
+        limit: int = 50,
+        max_pages: int | None = None,
+        max_items: int | None = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        最近再生されたトラックをページ単位で取得するジェネレータ
+
+        after を指定した場合はその時刻から新しい方へ cursors.after を、省略した場合は
+        最新から古い方へ next をたどり、期間を取り切るまで取得する。
+        ページを受け取るたびに返すため、呼び出し側は最後のページを待たずに保存を始められる。
+
+        Args:
+            after: このミリ秒Unixタイムスタンプより後の再生のみ取得する
+            limit: 1ページあたりのトラック数（最大50）
+            max_pages: 取得する最大ページ数（省略時は設定値、Noneで無制限）
+            max_items: 取得する最大アイテム数（省略時は設定値、Noneで無制限）
+
+        Yields:
+            Spotify APIからのトラックアイテムのリスト（1ページ分）
+        """
+        max_pages = self.max_pages if max_pages is None else max_pages
+        max_items = self.max_items if max_items is None else max_items
+
+        params: Dict[str, Any] = {"limit": limit}
+        if after is not None:
+            params["after"] = after
+        url = f"{self.api_base_url}/me/player/recently-played?{urlencode(params)}"
+
+        metrics = get_metrics()
+        pages = 0
+        items = 0
+        visited = set()
+        while url and url not in visited:
+            visited.add(url)
+            with metrics.span("fetch_page"):
+                body = self._get(url)
+
+            page = body.get("items") or []
+            if max_items is not None:
+                page = page[:max_items - items]
+            if not page:
+                return
+
+            metrics.count("pages_fetched")
+            metrics.count("items_fetched", len(page))
+            yield page
+            pages += 1
+            items += len(page)
+            if max_pages is not None and pages >= max_pages:
+                return
+            if max_items is not None and items >= max_items:
+                return
+
+            url = self._next_page_url(body, after is not None, limit)
+
+    def _next_page_url(self, body: Dict[str, Any], forward: bool, limit: int) -> str | None:
+        """
+        レスポンスの next / cursors から次ページのURLを決める
+
+        Args:
+            body: recently-playedのレスポンス
+            forward: after で新しい方向へたどっている場合はTrue
+            limit: 1ページあたりのトラック数
+        """
+        if not forward:
+            return body.get("next")
+
+        # 満杯でないページは期間の終端
+        cursors = body.get("cursors") or {}
+        if not cursors.get("after") or len(body.get("items") or []) < limit:
+            return None
+        query = urlencode({"after": cursors["after"], "limit": limit})
+        return f"{self.api_base_url}/me/player/recently-played?{query}"
+
+    def _get(self, url: str) -> Dict[str, Any]:
+        """
+        認証付きでGETし、JSONを返す
+
+        401の場合はアクセストークンを破棄してリフレッシュし、同じリクエストを1回だけ再送する。
+        """
+        token = self.spotify_auth.token
+        res = self.http.get(url, headers={"Authorization": f"Bearer {token}"})
+
+        if res.status_code == 401:
+            print("⚠️ : Access token rejected, refreshing and retrying")
+            self.spotify_auth.invalidate(token)
+            token = self.spotify_auth.token
+            res = self.http.get(url, headers={"Authorization": f"Bearer {token}"})
 
         res.raise_for_status()
-        return res.json()["items"]
+        return res.json()
@@ -0,0 +1,332 @@
+"""
+モジュール: history_import.py
+Spotifyのデータエクスポート（StreamingHistory*.json / endsong_*.json / Streaming_History_Audio_*.json）を
+ストレージに取り込む。
+ファイル全体を読み込まずにJSON配列を要素ごとに逐次解析し、複数のファイルをプロセスプールで並列に解析する。
+既存の再生と (track_id, played_at の秒) が重複する再生は保存しない。
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from multiprocessing import Manager
+from queue import Empty
+from typing import Any, Dict, Iterator, List, Set, Tuple
+
+from LogRepository.base_storage import BaseStorage
+from LogRepository.play_record import PlayRecord, dump_external_urls, parse_played_at
+
+# ディレクトリを指定した場合に取り込むファイル名の接頭辞
+EXPORT_PREFIXES = ("StreamingHistory", "endsong_", "Streaming_History_Audio_")
+
+# Spotifyが「再生」として数える最短の再生時間（ミリ秒）
+MIN_MS_PLAYED = 30_000
+
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_array(path: str, chunk_size: int = 1024 * 1024) -> Iterator[Dict[str, Any]]:
+    """
+    JSON配列のファイルを、全体を読み込まずに要素ごとに返す
+
+    Args:
+        path: JSON配列のファイル
+        chunk_size: 一度に読み込む文字数
+
+    Yields:
+        配列の各要素（オブジェクト）
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8-sig") as f:
+        buf = ""
+        pos = 0
+        started = False
+        eof = False
+        while True:
+            # 区切り（空白・カンマ）を読み飛ばし、必要なら続きを読み込む
+            while pos < len(buf) and (buf[pos] in _WHITESPACE or (started and buf[pos] == ",")):
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    raise ValueError(f"{path}: unexpected end of file")
+                more = f.read(chunk_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"{path}: expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+
+            try:
+                entry, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # 要素の途中でバッファが終わっている
+                more = "" if eof else f.read(chunk_size)
+                if not more:
+                    raise
+                buf, pos = buf[pos:] + more, 0
+                continue
+            if not isinstance(entry, dict):
+                raise ValueError(f"{path}: expected an array of objects")
+            yield entry
+            pos = end
+            if pos >= chunk_size:
+                buf, pos = buf[pos:], 0
+
+
+def _legacy_track_id(artist_name: str, track_name: str) -> str:
+    """トラックIDを含まない旧形式のエクスポート用に、アーティスト名と曲名から安定したIDを作る"""
+    digest = hashlib.sha1(f"{artist_name}\x1f{track_name}".encode("utf-8")).hexdigest()
+    return f"legacy:{digest[:22]}"
+
+
+def record_from_export(entry: Dict[str, Any], min_ms_played: int = MIN_MS_PLAYED) -> PlayRecord | None:
+    """
+    エクスポートの1要素を再生レコードに変換する
+
+    拡張版（endsong_*.json など）は ts を played_at、spotify_track_uri をトラックIDとして使う。
+    旧形式（StreamingHistory*.json）は分単位の endTime しかなく、IDもないため名前から作る。
+    どちらも曲の長さを含まないため、duration_ms には実際に再生した時間（ms_played）を入れる。
+
+    Args:
+        entry: エクスポートの1要素
+        min_ms_played: これより短い再生は取り込まない
+
+    Returns:
+        再生レコード。ポッドキャスト・ローカルファイル・短い再生の場合はNone
+    """
+    if "ts" in entry:
+        uri = entry.get("spotify_track_uri")
+        ms_played = entry.get("ms_played") or 0
+        if not uri or not uri.startswith("spotify:track:") or ms_played < min_ms_played:
+            return None
+        track_id = uri.rsplit(":", 1)[1]
+        played_at, played_at_ms = parse_played_at(entry["ts"])
+        return PlayRecord(
+            entry.get("master_metadata_track_name") or "",
+            entry.get("master_metadata_album_artist_name") or "",
+            played_at,
+            played_at_ms,
+            track_id,
+            "",
+            entry.get("master_metadata_album_album_name") or "",
+            "",
+            ms_played,
+            None,
+            dump_external_urls({"spotify": f"https://open.spotify.com/track/{track_id}"}),
+        )
+
+    if "endTime" in entry:
+        ms_played = entry.get("msPlayed") or 0
+        if ms_played < min_ms_played:
+            return None
+        artist_name = entry.get("artistName") or ""
+        track_name = entry.get("trackName") or ""
+        # "2019-01-01 12:34"（UTC）
+        played_at, played_at_ms = parse_played_at(entry["endTime"].replace(" ", "T") + ":00Z")
+        return PlayRecord(
+            track_name,
+            artist_name,
+            played_at,
+            played_at_ms,
+            _legacy_track_id(artist_name, track_name),
+            "",
+            "",
+            "",
+            ms_played,
+            None,
+            "{}",
+        )
+    return None
+
+
+def parse_export_file(
+    path: str, min_ms_played: int = MIN_MS_PLAYED, chunk_size: int = 5000
+) -> Iterator[Dict[str, Any]]:
+    """
+    エクスポートファイル1つを解析し、chunk_size 件ずつのチャンクに分けて返す
+
+    Args:
+        path: エクスポートファイル
+        min_ms_played: これより短い再生は取り込まない
+        chunk_size: 1チャンクに含めるレコード数の上限
+
+    Yields:
+        path、played_at 順のレコード、そのチャンクで読んだ要素数、取り込まなかった要素数
+    """
+    records: List[PlayRecord] = []
+    entries = 0
+    for entry in iter_json_array(path):
+        entries += 1
+        record = record_from_export(entry, min_ms_played)
+        if record is not None:
+            records.append(record)
+        if len(records) >= chunk_size:
+            records.sort(key=lambda record: record.played_at_ms)
+            yield {"path": path, "records": records, "entries": entries, "skipped": entries - len(records)}
+            records, entries = [], 0
+    if entries:
+        records.sort(key=lambda record: record.played_at_ms)
+        yield {"path": path, "records": records, "entries": entries, "skipped": entries - len(records)}
+
+
+def _parse_into_queue(path: str, min_ms_played: int, chunk_size: int, queue: Any) -> None:
+    """
+    エクスポートファイルを解析し、チャンクをキューに送る（プロセスプールのワーカーで実行される）
+
+    キューの上限で解析を待たせるため、ファイル全体のレコードを一度に保持しない。
+    例外が発生しても、終了を知らせる {"path": path, "done": True} を必ず送る。
+    """
+    try:
+        for chunk in parse_export_file(path, min_ms_played, chunk_size):
+            queue.put(chunk)
+    finally:
+        queue.put({"path": path, "done": True})
+
+
+def find_export_files(paths: List[str]) -> List[str]:
+    """
+    指定されたファイルと、ディレクトリ内のエクスポートファイルを返す
+
+    Args:
+        paths: ファイルまたはディレクトリ
+
+    Returns:
+        大きい順のファイルパス（大きいファイルから解析を始めて並列度を保つ）
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in os.listdir(path):
+                if name.endswith(".json") and name.startswith(EXPORT_PREFIXES):
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return sorted(set(files), key=os.path.getsize, reverse=True)
+
+
+def _play_key(track_id: str, played_at_ms: int) -> Tuple[str, int]:
+    """
+    重複判定のキー (track_id, played_at の秒) を返す
+
+    エクスポートの ts は秒単位、APIの played_at はミリ秒単位のため、両方を秒に切り捨てて比較する。
+    """
+    return track_id, played_at_ms // 1000
+
+
+def _existing_keys(storage: BaseStorage, records: List[PlayRecord]) -> Set[Tuple[str, int]]:
+    """レコードの期間（秒単位）に保存済みの再生のキーを返す"""
+    start = datetime.fromtimestamp(records[0].played_at_ms // 1000, tz=timezone.utc)
+    end = datetime.fromtimestamp(records[-1].played_at_ms // 1000, tz=timezone.utc) + timedelta(seconds=1)
+    return {
+        _play_key(row["track_id"], parse_played_at(row["played_at"])[1])
+        for row in storage.query(start, end)
+    }
+
+
+def import_history(
+    paths: List[str],
+    storage: BaseStorage,
+    workers: int | None = None,
+    batch_size: int = 5000,
+    min_ms_played: int = MIN_MS_PLAYED,
+) -> Dict[str, Any]:
+    """
+    エクスポートファイルを並列に解析し、重複を除いてストレージに一括保存する
+
+    ワーカーは各ファイルを batch_size 件ずつのチャンクに分けて送り、親プロセスはチャンクごとに
+    その期間の保存済みの行と照合して保存するため、解析と保存が並行して進み、
+    ファイルの大きさに関わらずメモリ使用量が一定に保たれる（前のチャンクは保存済みなので、
+    チャンクをまたぐ重複も保存済みの行との照合で見つかる）。
+    ストレージを読めないバックエンドでは、取り込んだすべてのキーをメモリに保持して重複を除く。
+    重複はエクスポートの ts に合わせて (track_id, played_at の秒) で判定する。
+
+    Args:
+        paths: エクスポートファイルまたはそれを含むディレクトリ
+        storage: 保存先のストレージ
+        workers: 解析に使うプロセス数（省略時はCPU数）
+        batch_size: 1チャンクの件数（1回の save_tracks で保存する件数の上限）
+        min_ms_played: これより短い再生は取り込まない
+
+    Returns:
+        ファイル数、要素数、取り込まなかった要素数、重複数、保存数、所要時間
+    """
+    files = find_export_files(paths)
+    stats = {"files": len(files), "entries": 0, "skipped": 0, "duplicates": 0, "imported": 0}
+    per_file = {path: {"imported": 0, "duplicates": 0, "skipped": 0} for path in files}
+    # ストレージを読めない場合だけ使う、取り込み全体のキー
+    imported_keys: Set[Tuple[str, int]] = set()
+    dedupe_with_storage = True
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, Manager() as manager:
+        # 上限付きのキューで、解析が保存より先に進みすぎないようにする
+        queue = manager.Queue(maxsize=2 * (workers or os.cpu_count() or 1))
+        futures = [pool.submit(_parse_into_queue, path, min_ms_played, batch_size, queue) for path in files]
+        remaining = len(files)
+        while remaining:
+            try:
+                chunk = queue.get(timeout=1)
+            except Empty:
+                # ワーカーのプロセスが異常終了した場合に待ち続けない
+                for future in futures:
+                    if future.done() and future.exception() is not None:
+                        raise future.exception()
+                continue
+
+            path = chunk["path"]
+            if chunk.get("done"):
+                remaining -= 1
+                counts = per_file[path]
+                print(
+                    f"📊 {os.path.basename(path)}: {counts['imported']} imported, "
+                    f"{counts['duplicates']} duplicates, {counts['skipped']} skipped"
+                )
+                continue
+
+            records = chunk["records"]
+            stats["entries"] += chunk["entries"]
+            stats["skipped"] += chunk["skipped"]
+            per_file[path]["skipped"] += chunk["skipped"]
+
+            existing: Set[Tuple[str, int]] = set()
+            if records and dedupe_with_storage:
+                try:
+                    existing = _existing_keys(storage, records)
+                except NotImplementedError:
+                    print(f"⚠️ : {storage.__class__.__name__} cannot be read, relying on the backend to drop duplicates")
+                    dedupe_with_storage = False
+
+            # 照合できるならチャンク内の重複だけを覚えておけばよい
+            seen = imported_keys if not dedupe_with_storage else set()
+            new_records = []
+            for record in records:
+                key = _play_key(record.track_id, record.played_at_ms)
+                if key in seen or key in existing:
+                    stats["duplicates"] += 1
+                    per_file[path]["duplicates"] += 1
+                    continue
+                seen.add(key)
+                new_records.append(record)
+
+            if new_records:
+                storage.save_tracks(new_records)
+            stats["imported"] += len(new_records)
+            per_file[path]["imported"] += len(new_records)
+
+        # 解析中の例外を呼び出し元に伝える
+        for future in futures:
+            future.result()
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["entries_per_second"] = round(stats["entries"] / stats["seconds"]) if stats["seconds"] else 0
+    return stats
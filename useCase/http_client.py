@@ -0,0 +1,153 @@
+"""
+モジュール: http_client.py
+SpotifyAuthとSpotifyDataFetcherが共有するHTTPトランスポート。
+keep-aliveのコネクションプールを再利用し、429 (Retry-After) をバックオフ付きでリトライする。
+"""
+
+import random
+import time
+from collections import deque
+from typing import Dict, Any
+
+import requests
+from requests.adapters import HTTPAdapter
+from config.config import config_manager
+
+
+class HttpClient:
+    """プール済みのrequests.Sessionをラップし、遅延と接続再利用を計測するクライアント"""
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        """
+        HTTPクライアントを初期化する
+
+        Args:
+            pool_size: ホストごとに保持するkeep-alive接続の最大数
+            timeout: リクエストごとのデフォルトタイムアウト秒数
+            max_retries: 429応答時の最大リトライ回数
+            backoff: Retry-Afterがない場合の初回待機秒数（試行ごとに倍増）
+            max_backoff: 1回の待機秒数の上限
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+        self.session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        })
+
+        self.request_count = 0
+        self.retry_count = 0
+        self.total_latency = 0.0
+        self.latencies: deque = deque(maxlen=1000)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        HTTPリクエストを送信する（429の場合はバックオフしてリトライ）
+
+        Args:
+            method: HTTPメソッド
+            url: リクエストURL
+            **kwargs: requests.Session.requestに渡す引数
+
+        Returns:
+            最後の試行のレスポンス
+        """
+        kwargs.setdefault("timeout", self.timeout)
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            res = self.session.request(method, url, **kwargs)
+            elapsed = time.perf_counter() - started
+
+            self.request_count += 1
+            self.total_latency += elapsed
+            self.latencies.append(elapsed)
+
+            if res.status_code != 429 or attempt >= self.max_retries:
+                return res
+
+            wait = self._retry_delay(res, attempt)
+            print(f"⚠️ : Rate limited by {url.split('?')[0]}, retrying in {wait:.1f}s")
+            res.close()
+            time.sleep(wait)
+            attempt += 1
+            self.retry_count += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GETリクエストを送信する"""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """POSTリクエストを送信する"""
+        return self.request("POST", url, **kwargs)
+
+    def _retry_delay(self, res: requests.Response, attempt: int) -> float:
+        """Retry-Afterヘッダーと指数バックオフから待機秒数（ジッター付き）を決める"""
+        delay = self.backoff * (2 ** attempt)
+        retry_after = res.headers.get("Retry-After")
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return min(delay, self.max_backoff) + random.uniform(0, self.backoff)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        リクエスト数、遅延、接続再利用のカウンタを返す
+
+        Returns:
+            統計情報の辞書
+        """
+        connections = 0
+        pooled_requests = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                pooled_requests += pool.num_requests
+
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.request_count,
+            "retries": self.retry_count,
+            "new_connections": connections,
+            "reused_connections": max(0, pooled_requests - connections),
+            "avg_latency_ms": round(self.total_latency / self.request_count * 1000, 2) if self.request_count else 0.0,
+            "max_latency_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        }
+
+    def close(self) -> None:
+        """プール内の接続を閉じる"""
+        self.session.close()
+
+
+_default_client: HttpClient | None = None
+
+
+def get_http_client() -> HttpClient:
+    """設定に基づくプロセス共有のHTTPクライアントを返す"""
+    global _default_client
+    if _default_client is None:
+        _default_client = HttpClient(
+            pool_size=config_manager.config.http_pool_size,
+            timeout=config_manager.config.http_timeout,
+            max_retries=config_manager.config.http_max_retries,
+        )
+    return _default_client
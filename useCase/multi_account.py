@@ -0,0 +1,165 @@
+"""
+モジュール: multi_account.py
+複数のSpotifyアカウントの収集パイプラインをasyncioで並行実行する。
+アカウントごとに認証・取得・保存を分離し、1つの失敗が他のアカウントを止めないようにする。
+"""
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Dict, Any
+
+
+@dataclass
+class AccountConfig:
+    """1アカウント分の認証情報とストレージ設定"""
+
+    name: str
+    client_id: str
+    client_secret: str
+    refresh_token: str
+    storage: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def credentials(self) -> Dict[str, str]:
+        """SpotifyAuthに渡す認証情報"""
+        return {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "refresh_token": self.refresh_token,
+        }
+
+
+@dataclass
+class AccountResult:
+    """1アカウント分の収集結果"""
+
+    name: str
+    ok: bool
+    tracks: int
+    seconds: float
+    error: str | None = None
+
+
+def _resolve(entry: Dict[str, Any], key: str) -> str | None:
+    """値を直接、または "<key>_env" で指定された環境変数から取得する"""
+    if entry.get(key):
+        return entry[key]
+    env_name = entry.get(f"{key}_env")
+    return os.getenv(env_name) if env_name else None
+
+
+def load_accounts(path: str) -> List[AccountConfig]:
+    """
+    アカウント設定ファイルを読み込む
+
+    ファイルはJSON配列で、各要素は name と client_id / client_secret / refresh_token
+    （または環境変数名を指定する client_id_env などのキー）、任意の storage を持つ。
+
+    Args:
+        path: 設定ファイルのパス
+
+    Returns:
+        アカウント設定のリスト
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+
+    accounts = []
+    for index, entry in enumerate(entries):
+        name = entry.get("name") or f"account{index}"
+        values = {key: _resolve(entry, key) for key in ("client_id", "client_secret", "refresh_token")}
+        missing = [key for key, value in values.items() if not value]
+        if missing:
+            raise ValueError(f"Account '{name}' is missing {', '.join(missing)}")
+        accounts.append(AccountConfig(name=name, storage=entry.get("storage") or {}, **values))
+
+    names = [a.name for a in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError("Account names must be unique")
+    return accounts
+
+
+async def _collect_all(
+    accounts: List[AccountConfig],
+    collect: Callable[[AccountConfig], int],
+    concurrency: int,
+) -> List[AccountResult]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(account: AccountConfig) -> AccountResult:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                tracks = await asyncio.to_thread(collect, account)
+                return AccountResult(account.name, True, tracks, time.perf_counter() - started)
+            except Exception as e:
+                return AccountResult(account.name, False, 0, time.perf_counter() - started, str(e))
+
+    return await asyncio.gather(*(run_one(account) for account in accounts))
+
+
+def collect_accounts(
+    accounts: List[AccountConfig],
+    collect: Callable[[AccountConfig], int],
+    concurrency: int = 10,
+) -> List[AccountResult]:
+    """
+    全アカウントの収集を同時実行数 concurrency までで並行実行する
+
+    Args:
+        accounts: アカウント設定のリスト
+        collect: 1アカウント分の収集を行い保存したトラック数を返す関数（ブロッキング可）
+        concurrency: 同時に実行するアカウント数の上限
+
+    Returns:
+        アカウント順の収集結果のリスト
+    """
+    if concurrency < 1:
+        raise ValueError("concurrencyは1以上である必要があります")
+
+    async def runner():
+        # asyncio.to_thread の既定スレッド数ではなく concurrency を上限にする
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+        return await _collect_all(accounts, collect, concurrency)
+
+    return asyncio.run(runner())
+
+
+def summarize(results: List[AccountResult], wall_seconds: float) -> Dict[str, Any]:
+    """
+    アカウントごとと全体のスループットを集計する
+
+    Args:
+        results: 収集結果のリスト
+        wall_seconds: 全体の経過秒数
+
+    Returns:
+        集計結果の辞書
+    """
+    tracks = sum(r.tracks for r in results)
+    failed = [r for r in results if not r.ok]
+    return {
+        "accounts": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "tracks": tracks,
+        "wall_seconds": round(wall_seconds, 3),
+        "accounts_per_second": round(len(results) / wall_seconds, 2) if wall_seconds else 0.0,
+        "tracks_per_second": round(tracks / wall_seconds, 2) if wall_seconds else 0.0,
+        "per_account": [
+            {
+                "name": r.name,
+                "ok": r.ok,
+                "tracks": r.tracks,
+                "seconds": round(r.seconds, 3),
+                "tracks_per_second": round(r.tracks / r.seconds, 2) if r.seconds else 0.0,
+                **({"error": r.error} if r.error else {}),
+            }
+            for r in results
+        ],
+    }
@@ -0,0 +1,40 @@
+"""
+モジュール: useCase/normalizer.py
+SpotifyDataFetcher とストレージ層の間の正規化ステージ。
+APIのアイテムをページ単位で PlayRecord に一度だけ変換し、そのままストレージへ流す。
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List
+from LogRepository.play_record import PlayRecord
+from metrics.metrics import get_metrics
+
+
+def normalize_items(items: Iterable[Dict[str, Any]]) -> List[PlayRecord]:
+    """
+    recently-playedのアイテムを再生レコードに変換する
+
+    Args:
+        items: recently-playedのアイテム
+
+    Returns:
+        再生レコードのリスト
+    """
+    metrics = get_metrics()
+    with metrics.span("normalize"):
+        records = [PlayRecord.from_item(item) for item in items]
+    metrics.count("records_normalized", len(records))
+    return records
+
+
+def normalize_pages(pages: Iterable[List[Dict[str, Any]]]) -> Iterator[List[PlayRecord]]:
+    """
+    ページごとに取得したアイテムを、ページ単位のまま再生レコードに変換して流す
+
+    Args:
+        pages: SpotifyDataFetcher.iter_recent_track_pages などが返すページ
+
+    Yields:
+        ページごとの再生レコードのリスト
+    """
+    for page in pages:
+        yield normalize_items(page)
@@ -0,0 +1,56 @@
+"""
+モジュール: scheduler.py
+デーモンモード用の適応的なポーリング間隔スケジューラ。
+再生が続いている間は間隔を縮め、アイドル時やエラー時は間隔を広げる。
+"""
+
+
+class AdaptivePollScheduler:
+    """直近のサイクルで保存した再生数に応じてポーリング間隔を調整するスケジューラ"""
+
+    def __init__(self, min_interval: float = 300.0, max_interval: float = 3600.0, factor: float = 2.0):
+        """
+        スケジューラを初期化する
+
+        Args:
+            min_interval: 再生が続いている間の最短間隔（秒）
+            max_interval: アイドル時の最長間隔（秒）。Spotifyは直近50曲しか保持しないため、
+                その再生時間より十分短くする
+            factor: アイドルが続くたびに間隔を伸ばす倍率
+        """
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("0 < min_interval <= max_interval である必要があります")
+        if factor <= 1:
+            raise ValueError("factorは1より大きい必要があります")
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.interval = min_interval
+
+    def record(self, new_plays: int) -> float:
+        """
+        サイクルの結果を記録し、次のポーリングまでの秒数を返す
+
+        Args:
+            new_plays: このサイクルで保存した再生数
+
+        Returns:
+            次のポーリングまでの秒数
+        """
+        if new_plays > 0:
+            # 再生中は最短間隔に戻す
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.factor)
+        return self.interval
+
+    def record_failure(self) -> float:
+        """
+        失敗したサイクルを記録し、次のポーリングまでの秒数を返す
+
+        Returns:
+            次のポーリングまでの秒数
+        """
+        self.interval = min(self.max_interval, self.interval * self.factor)
+        return self.interval
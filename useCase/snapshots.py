@@ -0,0 +1,234 @@
+"""
+モジュール: useCase/snapshots.py
+ダッシュボード用の集計済みJSONスナップショット（上位トラック、アーティスト分布、合計、日別の再生数）を書き出す。
+GitHub Pagesから静的ファイルとして配信すれば、ページを開くたびにデータベースで集計しなくて済む。
+各シャードは gzip（brotli があれば .br も）で圧縮し、保存した再生の影響を受け、内容が変わったシャードだけを書き直す。
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Set
+
+try:
+    import brotli
+except ImportError:  # brotliがない環境ではgzipだけを書き出す
+    brotli = None
+
+from LogRepository.base_storage import BaseStorage
+from LogRepository.play_record import PlayRecord, parse_played_at
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _month_key(played_ms: int) -> str:
+    """ミリ秒Unixタイムスタンプが属する月（YYYY-MM、UTC）を返す"""
+    return datetime.fromtimestamp(played_ms / 1000, tz=timezone.utc).strftime("%Y-%m")
+
+
+def _month_range(month: str) -> tuple:
+    """月の開始と翌月の開始（UTC）を返す"""
+    year, number = (int(part) for part in month.split("-"))
+    start = datetime(year, number, 1, tzinfo=timezone.utc)
+    end = datetime(year + number // 12, number % 12 + 1, 1, tzinfo=timezone.utc)
+    return start, end
+
+
+def _months_between(first: datetime, last: datetime) -> List[str]:
+    """first から last までの月（YYYY-MM）を古い順に返す"""
+    months = []
+    year, number = first.year, first.month
+    while (year, number) <= (last.year, last.month):
+        months.append(f"{year:04d}-{number:02d}")
+        year, number = year + number // 12, number % 12 + 1
+    return months
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class SnapshotWriter:
+    """保存された再生に応じてダッシュボード用のJSONシャードを書き直す"""
+
+    def __init__(self, directory: str, top_limit: int = 100):
+        """
+        スナップショットの出力先を設定する
+
+        Args:
+            directory: シャードとマニフェストを書き出すディレクトリ
+            top_limit: 上位トラック・アーティストの件数
+        """
+        self.directory = directory
+        self.top_limit = top_limit
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        # 前回の書き出し以降に再生が保存された月
+        self.dirty_months: Set[str] = set()
+        self.dirty = False
+        self._full = False
+
+    def touch(self, records: Iterable[PlayRecord]) -> None:
+        """
+        保存したレコードの月を、次の書き出しで作り直す対象に加える
+
+        Args:
+            records: ストレージに保存したレコード
+        """
+        for record in records:
+            self.dirty_months.add(_month_key(record.played_at_ms))
+            self.dirty = True
+
+    def rebuild(self, storage: BaseStorage) -> Dict[str, Any]:
+        """
+        すべての月のシャードを作り直す（初回の書き出しや、過去のデータを取り込んだ後に使う）
+
+        Args:
+            storage: 集計元のストレージ
+
+        Returns:
+            publish() と同じ結果
+        """
+        self._full = True
+        self.dirty = True
+        return self.publish(storage)
+
+    def publish(self, storage: BaseStorage) -> Dict[str, Any] | None:
+        """
+        変更のあったシャードを書き出す
+
+        日別のシャードは再生が保存された月だけをストレージから期間指定で読み直し、
+        上位トラック・アーティストは保存のたびに更新される集計から読む（集計を持たないバックエンドは全件を集計する）。
+        合計は月ごとの合計をマニフェストに持ち、そこから求める。
+        内容のハッシュが前回と同じシャードはファイルを書き換えない。
+
+        Args:
+            storage: 集計元のストレージ
+
+        Returns:
+            書き直したシャード名と変わらなかったシャード名。保存された再生がない場合はNone
+        """
+        if not self.dirty:
+            return None
+
+        os.makedirs(os.path.join(self.directory, "daily"), exist_ok=True)
+        manifest = self._read_manifest()
+        first = storage.get_first_saved_timestamp()
+        last = storage.get_last_saved_timestamp()
+
+        months = set(self.dirty_months)
+        if self._full or "months" not in manifest:
+            # マニフェストがない場合は全期間を作り直す
+            manifest["months"] = {}
+            if first is not None and last is not None:
+                months.update(_months_between(first, last))
+
+        shards: Dict[str, Any] = {}
+        for month in sorted(months):
+            shard = self._daily_shard(storage, month)
+            if shard["plays"]:
+                manifest["months"][month] = {
+                    "plays": shard["plays"],
+                    "duration_ms": shard["duration_ms"],
+                    "days": len(shard["dates"]),
+                }
+                shards[f"daily/{month}"] = shard
+            else:
+                manifest["months"].pop(month, None)
+
+        month_totals = manifest["months"].values()
+        shards["totals"] = {
+            "total_plays": sum(m["plays"] for m in month_totals),
+            "total_duration_ms": sum(m["duration_ms"] for m in month_totals),
+            "active_days": sum(m["days"] for m in month_totals),
+            "first_played_at": first.isoformat() if first else None,
+            "last_played_at": last.isoformat() if last else None,
+            "months": sorted(manifest["months"]),
+        }
+        shards.update(self._ranking_shards(storage))
+
+        result = {"written": [], "unchanged": []}
+        for name, payload in shards.items():
+            written = self._write_shard(manifest, name, payload)
+            result["written" if written else "unchanged"].append(name)
+
+        manifest["generated_at"] = datetime.now(timezone.utc).isoformat()
+        _write_atomic(self.manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+
+        self.dirty_months.clear()
+        self.dirty = False
+        self._full = False
+        print(
+            f"✅ : Snapshots written to {self.directory} "
+            f"({len(result['written'])} updated, {len(result['unchanged'])} unchanged)"
+        )
+        return result
+
+    def _daily_shard(self, storage: BaseStorage, month: str) -> Dict[str, Any]:
+        """1か月分の日別の再生数と再生時間（UTC）を集計する"""
+        start, end = _month_range(month)
+        days: Dict[str, List[int]] = {}
+        for row in storage.query(start, end):
+            _, played_ms = parse_played_at(row["played_at"])
+            day = datetime.fromtimestamp(played_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+            totals = days.setdefault(day, [0, 0])
+            totals[0] += 1
+            totals[1] += int(row["duration_ms"] or 0)
+
+        dates = sorted(days)
+        return {
+            "month": month,
+            "plays": sum(days[d][0] for d in dates),
+            "duration_ms": sum(days[d][1] for d in dates),
+            # 列ごとの配列にしてキーの繰り返しを省く
+            "dates": dates,
+            "daily_plays": [days[d][0] for d in dates],
+            "daily_duration_ms": [days[d][1] for d in dates],
+        }
+
+    def _ranking_shards(self, storage: BaseStorage) -> Dict[str, Any]:
+        """上位トラックとアーティスト分布のシャードを返す"""
+        try:
+            tracks = storage.track_ranking(self.top_limit)
+            artists = storage.artist_distribution(self.top_limit)
+        except NotImplementedError:
+            from useCase.analytics import analyze
+            print(f"⚠️ : {storage.__class__.__name__} has no aggregates, scanning the whole log for snapshots")
+            analytics = analyze(storage)
+            tracks = analytics.track_ranking(self.top_limit)
+            artists = analytics.artist_distribution(self.top_limit)
+        return {"top_tracks": {"tracks": tracks}, "artists": {"artists": artists}}
+
+    def _write_shard(self, manifest: Dict[str, Any], name: str, payload: Dict[str, Any]) -> bool:
+        """シャードを .json / .json.gz / .json.br として書き出す（内容が前回と同じなら書かない）"""
+        data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.directory, f"{name}.json")
+        previous = manifest.setdefault("shards", {}).get(name)
+        if previous is not None and previous["sha256"] == digest and os.path.exists(path):
+            return False
+
+        _write_atomic(path, data)
+        # mtime を固定して同じ内容なら同じバイト列にする
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        _write_atomic(f"{path}.gz", compressed)
+        entry = {"sha256": digest, "bytes": len(data), "gzip_bytes": len(compressed)}
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=11)
+            _write_atomic(f"{path}.br", compressed)
+            entry["brotli_bytes"] = len(compressed)
+        entry["updated_at"] = datetime.now(timezone.utc).isoformat()
+        manifest["shards"][name] = entry
+        return True
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        """マニフェストを読み込む（存在しないか壊れている場合は空のマニフェスト）"""
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"version": 1, "shards": {}}
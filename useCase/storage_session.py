@@ -0,0 +1,100 @@
+"""
+モジュール: storage_session.py
+ストレージへの接続を書き込みが必要になるまで遅らせるセッション。
+最後に保存した played_at はカーソルキャッシュから返し、キャッシュにない場合だけストレージに問い合わせる。
+"""
+
+from typing import Callable
+from LogRepository.base_storage import BaseStorage
+from useCase.cursor_cache import CursorCache
+from metrics.metrics import get_metrics
+
+
+class StorageSession:
+    """ストレージの作成・ヘルスチェック・カーソルの読み書きをまとめたセッション"""
+
+    def __init__(
+        self,
+        factory: Callable[[], BaseStorage],
+        cursors: CursorCache | None = None,
+        cursor_key: str | None = None,
+    ):
+        """
+        セッションを初期化する（この時点ではストレージを作らない）
+
+        Args:
+            factory: ストレージを作成する関数
+            cursors: カーソルキャッシュ（省略時は常にストレージに問い合わせる）
+            cursor_key: カーソルキャッシュのキー
+        """
+        self.factory = factory
+        self.cursors = cursors if cursor_key is not None else None
+        self.cursor_key = cursor_key
+        self.available: bool | None = None
+        self._storage: BaseStorage | None = None
+
+    @property
+    def backend(self) -> str:
+        """メトリクスのラベルに使うバックエンド名（作成前は空文字）"""
+        return self._storage.__class__.__name__ if self._storage is not None else ""
+
+    @property
+    def opened(self) -> bool:
+        """ストレージを作成済みならTrue"""
+        return self._storage is not None
+
+    def storage(self) -> BaseStorage:
+        """
+        ストレージを返す（初回に作成し、利用できなかった場合は呼ばれるたびにヘルスチェックをやり直す）
+
+        Returns:
+            ストレージ。利用できるかどうかは available に入る
+        """
+        metrics = get_metrics()
+        if self._storage is None:
+            with metrics.span("storage_open"):
+                self._storage = self.factory()
+        if not self.available:
+            with metrics.span("storage_health", backend=self.backend):
+                self.available = self._storage.is_available()
+            if not self.available:
+                print(f"⚠️ : Storage backend '{self._storage.__class__.__name__}' is not available")
+        return self._storage
+
+    def last_saved_ms(self) -> int | None:
+        """
+        最後に保存した played_at を返す（カーソルキャッシュにない場合はストレージに問い合わせる）
+
+        Returns:
+            ミリ秒Unixタイムスタンプ、または保存されたトラックがない場合はNone
+        """
+        if self.cursors is not None:
+            cached = self.cursors.load(self.cursor_key)
+            if cached is not None:
+                return cached
+        storage = self.storage()
+        with get_metrics().span("storage_last_saved", backend=self.backend):
+            last_saved = storage.get_last_saved_timestamp()
+        if last_saved is None:
+            return None
+        played_at_ms = int(last_saved.timestamp() * 1000)
+        self.remember(played_at_ms)
+        return played_at_ms
+
+    def remember(self, played_at_ms: int) -> None:
+        """
+        保存に成功した played_at をカーソルキャッシュに記録する（古い値では上書きしない）
+
+        Args:
+            played_at_ms: ストレージにコミットされた played_at の最大値（ミリ秒）
+        """
+        if self.cursors is None:
+            return
+        cached = self.cursors.load(self.cursor_key)
+        if cached is None or played_at_ms > cached:
+            self.cursors.save(self.cursor_key, played_at_ms)
+
+    def close(self) -> None:
+        """作成済みのストレージを閉じる"""
+        if self._storage is not None:
+            self._storage.close()
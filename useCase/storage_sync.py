@@ -0,0 +1,106 @@
+"""
+モジュール: storage_sync.py
+あるストレージの再生履歴を別のストレージへ同期する（CSV→Supabaseの移行など）。
+played_at の期間ごとに、移行先にない (track_id, played_at) の行だけを一括で書き込み、
+書き終えた期間をチェックポイントに記録して、中断した場合も続きから再開する。
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+from typing import Any, Dict, Set, Tuple
+
+from LogRepository.base_storage import BaseStorage
+from LogRepository.play_record import PlayRecord, parse_played_at
+from useCase.cursor_cache import CursorCache
+
+
+def _to_datetime(played_at_ms: int) -> datetime:
+    return datetime.fromtimestamp(played_at_ms / 1000, tz=timezone.utc)
+
+
+def sync_storage(
+    source: BaseStorage,
+    dest: BaseStorage,
+    batch_size: int = 5000,
+    window: timedelta = timedelta(days=30),
+    checkpoint: CursorCache | None = None,
+    checkpoint_key: str | None = None,
+    full: bool = False,
+) -> Dict[str, Any]:
+    """
+    移行元の行のうち、移行先にないものを期間ごとに書き込む
+
+    メモリに載るのは1期間分の移行先のキーと1バッチ分の行だけなので、履歴の長さによらず一定に収まる。
+    チェックポイントには書き終えた期間の終わりを記録し、次回はその期間から再開する
+    （最後の期間は毎回照合し直すため、その後に追加された再生も転送される）。
+
+    Args:
+        source: 移行元のストレージ
+        dest: 移行先のストレージ
+        batch_size: 1回の save_tracks で書き込む行数
+        window: 一度に照合する played_at の期間
+        checkpoint: チェックポイントを記録するファイルキャッシュ
+        checkpoint_key: チェックポイントのキー（移行元と移行先の組み合わせ）
+        full: チェックポイントを無視して全期間を照合する
+
+    Returns:
+        照合した期間数、読んだ行数、既にあった行数、転送した行数、所要時間
+    """
+    stats = {"windows": 0, "scanned": 0, "existing": 0, "transferred": 0}
+    started = time.perf_counter()
+
+    last = source.get_last_saved_timestamp()
+    resume_ms = None
+    if checkpoint is not None and checkpoint_key is not None and not full:
+        resume_ms = checkpoint.load(checkpoint_key)
+
+    if resume_ms is not None:
+        window_start = _to_datetime(resume_ms)
+        print(f"🔁 Resuming from {window_start.isoformat()}")
+    else:
+        window_start = source.get_first_saved_timestamp()
+
+    if window_start is None or last is None:
+        print("✅ : Source storage is empty")
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        return stats
+
+    while window_start <= last:
+        window_end = window_start + window
+        rows = iter(source.query(window_start, window_end))
+        head = next(rows, None)
+        if head is not None:
+            # 移行元に行がある期間だけ移行先を読む
+            existing: Set[Tuple[str, int]] = {
+                (row["track_id"], parse_played_at(row["played_at"])[1])
+                for row in dest.query(window_start, window_end)
+            }
+            batch = []
+            for row in chain((head,), rows):
+                stats["scanned"] += 1
+                record = PlayRecord.from_row(row)
+                key = (record.track_id, record.played_at_ms)
+                if key in existing:
+                    stats["existing"] += 1
+                    continue
+                # 移行元の重複は1行だけ転送する
+                existing.add(key)
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    dest.save_tracks(batch)
+                    stats["transferred"] += len(batch)
+                    batch = []
+            if batch:
+                dest.save_tracks(batch)
+                stats["transferred"] += len(batch)
+        stats["windows"] += 1
+
+        if checkpoint is not None and checkpoint_key is not None:
+            # 次に照合する期間の開始を記録する（最後の期間は次回も照合し直す）
+            resume_at = window_end if window_end <= last else window_start
+            checkpoint.save(checkpoint_key, int(resume_at.timestamp() * 1000))
+        window_start = window_end
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
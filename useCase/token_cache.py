@@ -0,0 +1,130 @@
+"""
+モジュール: token_cache.py
+Spotifyアクセストークンを有効期限付きでローカルファイルに永続化する。
+リフレッシュトークンごとのファイルロックで、同じアカウントの複数プロセスのリフレッシュを1回にまとめる。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+
+try:
+    import fcntl
+except ImportError:  # Windowsではプロセス間ロックなしで動作する
+    fcntl = None
+
+
+@contextmanager
+def _flock(path: str):
+    """path のファイルを排他ロックする（fcntlがない環境では何もしない）"""
+    if fcntl is None:
+        yield
+        return
+
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class TokenCache:
+    """リフレッシュトークンごとにアクセストークンと有効期限を保存するファイルキャッシュ"""
+
+    def __init__(self, path: str = ".spotify_token_cache.json"):
+        """
+        トークンキャッシュを初期化する
+
+        Args:
+            path: キャッシュファイルのパス
+        """
+        self.path = path
+        # キャッシュファイル全体の読み書きだけを守るロック（HTTPリクエストの間は保持しない）
+        self.lock_path = f"{path}.lock"
+
+    @staticmethod
+    def key_for(refresh_token: str) -> str:
+        """リフレッシュトークンを平文で保存しないためのキャッシュキーを返す"""
+        return hashlib.sha256(refresh_token.encode()).hexdigest()[:16]
+
+    def _read_all(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write_all(self, data: Dict[str, Any]) -> None:
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self, key: str) -> Dict[str, Any] | None:
+        """
+        キャッシュされたトークンを取得する
+
+        Returns:
+            {"access_token": ..., "expires_at": ...} 形式の辞書、またはNone
+        """
+        entry = self._read_all().get(key)
+        if not entry or "access_token" not in entry or "expires_at" not in entry:
+            return None
+        return entry
+
+    def save(self, key: str, access_token: str, expires_at: float) -> None:
+        """
+        トークンを原子的に書き込む（所有者のみ読み書き可能）
+
+        Args:
+            key: キャッシュキー
+            access_token: アクセストークン
+            expires_at: 有効期限のUnix時刻（秒）
+        """
+        with _flock(self.lock_path):
+            data = self._read_all()
+            data[key] = {"access_token": access_token, "expires_at": expires_at}
+            self._write_all(data)
+
+    def delete(self, key: str, access_token: str | None = None) -> None:
+        """
+        キャッシュからトークンを削除する
+
+        Args:
+            key: キャッシュキー
+            access_token: 指定した場合、このトークンがまだ保存されているときのみ削除する
+        """
+        with _flock(self.lock_path):
+            data = self._read_all()
+            entry = data.get(key)
+            if entry is None:
+                return
+            if access_token is not None and entry.get("access_token") != access_token:
+                return
+            del data[key]
+            self._write_all(data)
+
+    @contextmanager
+    def lock(self, key: str):
+        """
+        キーのトークンを排他ロックする（ロック待ちの間に他プロセスがリフレッシュを完了できる）
+
+        ロックはキーごとのファイルで取るため、別のアカウントのリフレッシュは並行して進む。
+
+        Args:
+            key: キャッシュキー
+        """
+        with _flock(f"{self.path}.{key}.lock"):
+            yield
+
+
+def is_fresh(expires_at: float, margin: float) -> bool:
+    """有効期限まで margin 秒以上残っているかを返す"""
+    return time.time() < expires_at - margin